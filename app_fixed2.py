@@ -1,7 +1,22 @@
-from flask import Flask, render_template, request, Response, redirect, url_for
+from flask import Flask, render_template, request, Response, redirect, url_for, g, jsonify, has_request_context
 from datetime import date, datetime, timedelta
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, deque
+from contextlib import ExitStack, contextmanager, nullcontext
+from bisect import bisect_left, bisect_right, insort
+from concurrent.futures import ThreadPoolExecutor
+import cProfile
+import functools
+import io
+import itertools
+import re
+import sqlite3
+import csv
+import hashlib
+import json
+import pstats
 import requests
+from urllib.parse import urlencode
+import numpy as np
 from bs4 import BeautifulSoup  # harmless if not used
 
 # ---------------------------
@@ -23,6 +38,8 @@ from flask_login import (
     logout_user,
     current_user,
 )
+from flask.cli import AppGroup
+import click
 from werkzeug.security import generate_password_hash, check_password_hash
 
 
@@ -30,6 +47,8 @@ from werkzeug.security import generate_password_hash, check_password_hash
 # NEW: MySQL CONFIG + LOAD/SAVE HELPERS
 # ---------------------------------------------------
 import os
+import threading
+import time
 
 DB_CONFIG = {
     "host": os.getenv("DB_HOST", "localhost"),
@@ -39,6 +58,13 @@ DB_CONFIG = {
     "port": int(os.getenv("DB_PORT", 3306))
 }
 
+# Storage backend: "mysql" (managed instance above) or "sqlite" (a local file
+# in WAL mode, for field-office copies, tests and offline benchmarks)
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql").lower()
+SQLITE_CONFIG = {
+    "path": os.getenv("SQLITE_PATH", "agric_monitor.db"),
+}
+
 
 
 from flask import Flask, render_template, request, redirect, url_for, Response
@@ -48,1015 +74,4268 @@ app.secret_key = "greenfuel-agric-monitor"
 
 
 # ---------------------------------------------------
-# GLOBAL DATA STRUCTURES (in-memory, synced with MySQL)
+# INSTRUMENTATION (timers -> /metrics histograms + Server-Timing)
 # ---------------------------------------------------
 
-# 30 blocks: 1–21, A1–A3, B1–B3, Mac 1–Mac 14
-BLOCK_NAMES = (
-    [f"Block {i}" for i in range(1, 22)]
-    + [f"A{i}" for i in range(1, 4)]
-    + [f"B{i}" for i in range(1, 4)]
-    + [f"Mac {i}" for i in range(1, 15)]
-)
-NUM_BLOCKS = len(BLOCK_NAMES)
+# Hot paths are timed per family (request, forecast, DB helper, dashboard
+# section, template render). METRICS_ENABLED=0 leaves the decorated
+# functions unwrapped; SERVER_TIMING=1 also sends a per-request breakdown
+# in the Server-Timing header (browser devtools, Network > Timing).
+METRICS_CONFIG = {
+    "enabled": os.getenv("METRICS_ENABLED", "1") == "1",
+    "server_timing": os.getenv("SERVER_TIMING", "0") == "1",
+    "buckets": tuple(sorted(float(b) for b in os.getenv(
+        "METRICS_BUCKETS", "0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10").split(","))),
+}
 
-# Weekly irrigation data per block (52 rows for a full year)
-blocks_data = {i: [] for i in range(1, NUM_BLOCKS + 1)}
+# family -> (HELP text, label name); exported as agric_<family>_seconds
+METRIC_FAMILIES = {
+    "request": ("Request handling time per endpoint.", "endpoint"),
+    "forecast": ("Forecast time: cache read in the request, yr.no fetch in the refresher.", "step"),
+    "db": ("DB helper time per function.", "helper"),
+    "section": ("Dashboard section time in index(), cache hit or build.", "section"),
+    "section_build": ("Dashboard section build time (cache misses, any caller).", "section"),
+    "render": ("Jinja render time per template.", "template"),
+}
 
-# Agronomy weekly data (growth, fertigation, chemigation)
-agronomy_data = {i: [] for i in range(1, NUM_BLOCKS + 1)}
 
-# Block metadata (cut/plant date + Kc + variety)
-block_meta = {
-    i: {"cut_date": "", "kc": "", "variety": ""}
-    for i in range(1, NUM_BLOCKS + 1)
-}
+class Histogram:
+    """Latency histogram in seconds; counts[i] holds values <= buckets[i], the last slot the rest."""
 
-# Daily weather data for the estate
-weather_data = []
+    __slots__ = ("counts", "sum")
 
-# Soil-moisture manual inputs per block
-soil_manual = {i: {"start_balance": 120.0, "by_date": {}} for i in range(1, NUM_BLOCKS + 1)}
+    def __init__(self, size):
+        self.counts = [0] * (size + 1)
+        self.sum = 0.0
 
-# NDVI / biomass records
-ndvi_data = []
 
-# Pest & disease records
-pests_data = []
+class Metrics:
+    """
+    Timing histograms for this worker. Each gunicorn worker keeps its own,
+    so a scrape of /metrics reports the worker that served it.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self._hists = {}
+        self._lock = threading.Lock()
+
+    def observe(self, family, label, seconds):
+        i = bisect_left(self.buckets, seconds)
+        with self._lock:
+            hist = self._hists.get((family, label))
+            if hist is None:
+                hist = self._hists[(family, label)] = Histogram(len(self.buckets))
+            hist.counts[i] += 1
+            hist.sum += seconds
+
+    def exposition(self):
+        """Prometheus text format (version 0.0.4)."""
+        with self._lock:
+            items = sorted((key, list(h.counts), h.sum) for key, h in self._hists.items())
+        lines = []
+        for family, (help_text, label_name) in METRIC_FAMILIES.items():
+            name = f"agric_{family}_seconds"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for (fam, label), counts, total in items:
+                if fam != family:
+                    continue
+                value = str(label).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+                labels = f'{label_name}="{value}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+                cumulative += counts[-1]
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+                lines.append(f"{name}_sum{{{labels}}} {total:.6f}")
+                lines.append(f"{name}_count{{{labels}}} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics(METRICS_CONFIG["buckets"])
+
+
+def record_timing(family, label, seconds):
+    metrics.observe(family, label, seconds)
+    if METRICS_CONFIG["server_timing"] and has_request_context():
+        timings = g.get("timings")
+        if timings is not None:
+            key = f"{family}.{label}"
+            timings[key] = timings.get(key, 0.0) + seconds
+
+
+class _Timer:
+    __slots__ = ("family", "label", "started")
+
+    def __init__(self, family, label):
+        self.family = family
+        self.label = label
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        record_timing(self.family, self.label, time.perf_counter() - self.started)
+        return False
+
+
+_NO_TIMER = nullcontext()
+
+
+def timer(family, label):
+    """Context manager timing a block into family/label (no-op when metrics are off)."""
+    if not METRICS_CONFIG["enabled"]:
+        return _NO_TIMER
+    return _Timer(family, label)
+
+
+def timed(family, label=None):
+    """Decorator form of timer(); the label defaults to the function name."""
+    def decorate(fn):
+        if not METRICS_CONFIG["enabled"]:
+            return fn
+        name = label or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Timer(family, name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+_flask_render_template = render_template
+
+
+def render_template(template_name, **context):
+    """flask.render_template, timed per template."""
+    with timer("render", template_name):
+        return _flask_render_template(template_name, **context)
+
+
+# Server-Timing metric names are HTTP tokens
+_TIMING_NAME = re.compile(r"[^\w.-]")
+
+
+@app.before_request
+def start_request_timer():
+    if METRICS_CONFIG["enabled"]:
+        g.request_started = time.perf_counter()
+        if METRICS_CONFIG["server_timing"]:
+            g.timings = {}
+
+
+@app.after_request
+def finish_request_timer(response):
+    started = g.pop("request_started", None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    metrics.observe("request", request.endpoint or "unknown", elapsed)
+    timings = g.pop("timings", None)
+    if timings is not None:
+        parts = [f"{_TIMING_NAME.sub('_', name)};dur={sec * 1000:.1f}" for name, sec in timings.items()]
+        parts.append(f"total;dur={elapsed * 1000:.1f}")
+        response.headers["Server-Timing"] = ", ".join(parts)
+    return response
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Timing histograms of this worker in Prometheus text format."""
+    return Response(metrics.exposition(), mimetype="text/plain; version=0.0.4")
 
-DEFAULT_ROWS = 52
-MAX_DEFICIT_BALANCE = 120.0  # mm, cap for soil-moisture P&L
 
 # ---------------------------------------------------
-# HELPER FUNCTIONS
+# ON-DEMAND PROFILING (cProfile per request -> PROFILE_DIR)
 # ---------------------------------------------------
 
+# A request is profiled when it carries ?profile=<PROFILE_TOKEN> (or the
+# X-Profile-Token header), or when its endpoint is listed in
+# PROFILE_ENDPOINTS (e.g. "index,block_view"). Results are pstats files
+# plus a small JSON sidecar; only the newest PROFILE_KEEP are kept.
+PROFILE_CONFIG = {
+    "token": os.getenv("PROFILE_TOKEN", ""),          # empty: the query flag is off
+    "endpoints": {e.strip() for e in os.getenv("PROFILE_ENDPOINTS", "").split(",") if e.strip()},
+    "min_ms": float(os.getenv("PROFILE_MIN_MS", 0)),  # drop faster runs (endpoint profiling)
+    "dir": os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")),
+    "keep": int(os.getenv("PROFILE_KEEP", 50)),
+}
 
-def init_block_rows(block_id: int):
-    """Create default weekly rows for a block if empty."""
-    if not blocks_data[block_id]:
-        rows = []
-        for i in range(1, DEFAULT_ROWS + 1):
-            rows.append(
-                {
-                    "week": f"Week {i}",
-                    "scheduled": "",
-                    "actual": "",
-                    "eff_rain": "",
-                    "percent": "",
-                    "comment": "",
-                }
-            )
-        blocks_data[block_id] = rows
+# cProfile allows one active profiler per process; concurrent requests
+# asking for a profile run unprofiled instead of waiting.
+_profile_lock = threading.Lock()
+profile_stats = {"saved": 0, "busy": 0, "dropped_fast": 0, "failures": 0}
 
 
-def init_agronomy_rows(block_id: int):
-    """Create default weekly agronomy rows for a block if empty."""
-    if not agronomy_data[block_id]:
-        rows = []
-        for i in range(1, DEFAULT_ROWS + 1):
-            rows.append(
-                {
-                    "week": f"Week {i}",
-                    "standard_gain":"",
-                    "gain": "",
-                    "cumulative": "",
-                    "fertigation": "",
-                    "chemigation": "",
-                }
-            )
-        agronomy_data[block_id] = rows
+def has_profile_token():
+    """True if the request carries PROFILE_TOKEN (query flag or header)."""
+    token = PROFILE_CONFIG["token"]
+    return bool(token) and token in (request.args.get("profile"), request.headers.get("X-Profile-Token"))
 
 
-def safe_float(x):
-    try:
-        return float(x)
-    except (TypeError, ValueError):
-        return None
+def profile_reason():
+    """"token" for an explicit profile request, "endpoint" for PROFILE_ENDPOINTS, else None."""
+    if request.endpoint in ("profiles_page", "profile_detail"):
+        return None   # the token opens these pages; viewing them shouldn't rotate real profiles out
+    if has_profile_token():
+        return "token"
+    if request.endpoint in PROFILE_CONFIG["endpoints"]:
+        return "endpoint"
+    return None
+
+
+def rotate_profiles(directory, keep):
+    profiles = sorted(f for f in os.listdir(directory) if f.endswith(".prof"))
+    for name in profiles[:max(len(profiles) - keep, 0)]:
+        for path in (name, name[:-len(".prof")] + ".json"):
+            try:
+                os.remove(os.path.join(directory, path))
+            except OSError:
+                pass
+
 
+def save_profile(profiler, meta):
+    """Dump the stats + sidecar, then trim the directory. Returns the profile name."""
+    directory = PROFILE_CONFIG["dir"]
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    name = f"{stamp}-{os.getpid()}-{meta['endpoint']}"
+    profiler.dump_stats(os.path.join(directory, name + ".prof"))
+    with open(os.path.join(directory, name + ".json"), "w") as f:
+        json.dump(meta, f)
+    rotate_profiles(directory, PROFILE_CONFIG["keep"])
+    return name
 
-def current_week_index(cut_str: str, today: date):
-    """Return (week_index, cut_dt, first_monday) from cut_date; Monday-based weeks."""
-    if not cut_str:
+
+def finish_profile(status):
+    profiler = g.pop("profiler", None)
+    if profiler is None:
         return None
     try:
-        cut_dt = datetime.strptime(cut_str, "%Y-%m-%d").date()
-    except ValueError:
+        profiler.disable()
+        elapsed_ms = (time.perf_counter() - g.pop("profile_started")) * 1000.0
+    finally:
+        _profile_lock.release()
+
+    forced = g.pop("profile_forced", False)
+    if not forced and elapsed_ms < PROFILE_CONFIG["min_ms"]:
+        profile_stats["dropped_fast"] += 1
         return None
-    if today < cut_dt:
+    # The profile flag carries PROFILE_TOKEN: keep it out of the saved URL
+    query = urlencode([(k, v) for k, v in request.args.items(multi=True) if k != "profile"])
+    meta = {
+        "endpoint": request.endpoint or "unknown",
+        "method": request.method,
+        "url": request.path + ("?" + query if query else ""),
+        "status": status,
+        "duration_ms": round(elapsed_ms, 1),
+        "pid": os.getpid(),
+        "at": datetime.now().isoformat(timespec="seconds"),
+    }
+    try:
+        name = save_profile(profiler, meta)
+    except Exception as e:
+        profile_stats["failures"] += 1
+        print("Failed to save profile:", e)
         return None
+    profile_stats["saved"] += 1
+    return name
 
-    first_monday = cut_dt - timedelta(days=cut_dt.weekday())  # Monday = 0
-    week_index = (today - first_monday).days // 7
-    return week_index, cut_dt, first_monday
 
+@app.before_request
+def start_profile():
+    if not (PROFILE_CONFIG["token"] or PROFILE_CONFIG["endpoints"]):
+        return
+    reason = profile_reason()
+    if reason is None:
+        return
+    if not _profile_lock.acquire(blocking=False):
+        profile_stats["busy"] += 1
+        return
+    g.profile_forced = reason == "token"
+    g.profile_started = time.perf_counter()
+    g.profiler = cProfile.Profile()
+    try:
+        g.profiler.enable()
+    except ValueError:
+        # another profiler/tracer already owns the process
+        g.pop("profiler")
+        _profile_lock.release()
+        profile_stats["busy"] += 1
 
-def current_week_percent(block_id: int, today: date):
-    """Return % for the current week only, using Monday-based weeks from cut date."""
-    meta = block_meta[block_id]
-    res = current_week_index(meta.get("cut_date"), today)
-    if res is None:
-        return None
-    week_index, _, _ = res
 
-    rows = blocks_data[block_id]
-    if week_index < 0 or week_index >= len(rows):
-        return None
+@app.after_request
+def stop_profile(response):
+    name = finish_profile(response.status_code)
+    if name:
+        response.headers["X-Profile"] = url_for("profile_detail", name=name)
+    return response
 
-    val = safe_float(rows[week_index].get("percent"))
-    return round(val, 1) if val is not None else None
 
+@app.teardown_request
+def stop_profile_on_error(exc):
+    # after_request is skipped when the view raised
+    if "profiler" in g:
+        finish_profile(500)
 
-def season_total_mm(block_id: int):
-    """Total season water applied (Actual + Effective Rain) in mm."""
-    rows = blocks_data[block_id]
-    total = 0.0
-    has_data = False
-    for r in rows:
-        a = safe_float(r.get("actual"))
-        e = safe_float(r.get("eff_rain"))
-        if a is not None:
-            total += a
-            has_data = True
-        if e is not None:
-            total += e
-            has_data = True
-    return round(total, 1) if has_data else None
 
-def agronomy_weekly_and_cum(block_id: int, today: date):
-    """Return (standard_gain, weekly_gain, cumulative_growth) for current week for a block."""
-    init_agronomy_rows(block_id)
-    meta = block_meta[block_id]
-    res = current_week_index(meta.get("cut_date"), today)
-    if res is None:
-        return None, None, None          # ← 3 values
-    week_index, _, _ = res
+def list_profiles(limit=None):
+    directory = PROFILE_CONFIG["dir"]
+    if not os.path.isdir(directory):
+        return []
+    out = []
+    for f in sorted((f for f in os.listdir(directory) if f.endswith(".json")), reverse=True)[:limit]:
+        try:
+            with open(os.path.join(directory, f)) as fh:
+                meta = json.load(fh)
+        except (OSError, ValueError):
+            continue
+        meta["name"] = f[:-len(".json")]
+        out.append(meta)
+    return out
 
-    rows = agronomy_data[block_id]
-    if week_index < 0 or week_index >= len(rows):
-        return None, None, None          # ← 3 values
 
-    row = rows[week_index]
-    std = safe_float(row.get("standard_gain"))
-    g = safe_float(row.get("gain"))
-    c = safe_float(row.get("cumulative"))
+def profile_path(name):
+    """Path of a saved profile, or None for unknown / unsafe names."""
+    if not re.fullmatch(r"[\w.-]+", name):
+        return None
+    path = os.path.join(PROFILE_CONFIG["dir"], name + ".prof")
+    return path if os.path.isfile(path) else None
+
 
-    return (
-        round(std, 1) if std is not None else None,
-        round(g, 1) if g is not None else None,
-        round(c, 1) if c is not None else None,
+def profile_token_required():
+    """403 response unless the request carries PROFILE_TOKEN (profiles show URLs and code paths)."""
+    if has_profile_token():
+        return None
+    return Response("PROFILE_TOKEN required (?profile= or X-Profile-Token)\n", status=403, mimetype="text/plain")
+
+
+@app.route("/admin/profiles")
+def profiles_page():
+    """Recent request profiles (newest first)."""
+    denied = profile_token_required()
+    if denied:
+        return denied
+    return render_template(
+        "profiles.html",
+        token_arg=request.args.get("profile"),
+        profiles=list_profiles(PROFILE_CONFIG["keep"]),
+        profile_dir=PROFILE_CONFIG["dir"],
+        endpoints=sorted(PROFILE_CONFIG["endpoints"]),
+        min_ms=PROFILE_CONFIG["min_ms"],
+        token_set=bool(PROFILE_CONFIG["token"]),
+        stats=profile_stats,
     )
 
-def pct_color(pct):
-    """Colour for percentage bar (current week view)."""
-    if pct is None:
-        return "#bdbdbd"  # grey for missing
-    try:
-        p = float(pct)
-    except Exception:
-        return "#bdbdbd"
 
-    # Blue 90–110%, Green 70–90 & 110–130, Red <50 or >150, amber for mid
-    if 90 <= p <= 110:
-        return "#1565c0"  # blue
-    if (70 <= p < 90) or (110 < p <= 130):
-        return "#2e7d32"  # green
-    if p < 50 or p > 150:
-        return "#c62828"  # red
-    return "#f9a825"     # amber for 50–70 and 130–150
+@app.route("/admin/profiles/<name>")
+def profile_detail(name):
+    """Top functions of one profile as text (?sort=cumulative|tottime|ncalls, ?limit=); ?download=1 for the pstats file."""
+    denied = profile_token_required()
+    if denied:
+        return denied
+    path = profile_path(name)
+    if path is None:
+        return Response("unknown profile\n", status=404, mimetype="text/plain")
+    if request.args.get("download") == "1":
+        with open(path, "rb") as f:
+            resp = Response(f.read(), mimetype="application/octet-stream")
+        resp.headers["Content-Disposition"] = f"attachment; filename={name}.prof"
+        return resp
+
+    sort = request.args.get("sort", "cumulative")
+    if sort not in ("cumulative", "tottime", "ncalls"):
+        sort = "cumulative"
+    try:
+        limit = min(max(int(request.args.get("limit", 60)), 1), 500)
+    except ValueError:
+        limit = 60
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+    return Response(out.getvalue(), mimetype="text/plain")
 
 
 # ---------------------------------------------------
-# PREVIOUS WEEK CALCULATIONS (CALENDAR-BASED)
+# ROW RECORDS (typed: floats / None, formatted only in templates)
 # ---------------------------------------------------
 
-def get_current_week_window(today):
-    """Return Monday–Sunday window for the current calendar week."""
-    start = today - timedelta(days=today.weekday())   # Monday
-    end = start + timedelta(days=6)                   # Sunday
-    return start, end
+def format_num(v):
+    """Number → form string: "" for None, no trailing ".0" on whole numbers."""
+    if v is None:
+        return ""
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v)
 
 
-def get_previous_week_window(today):
-    """Return Monday–Sunday for the previous calendar week."""
-    curr_mon, _ = get_current_week_window(today)
-    prev_mon = curr_mon - timedelta(days=7)
-    prev_sun = prev_mon + timedelta(days=6)
-    return prev_mon, prev_sun
+@app.template_filter("num")
+def num_filter(v):
+    return format_num(v)
 
 
-def extract_weather_range(start, end):
-    """Extract daily weather rows inside a specific date window."""
-    rows = []
-    for r in weather_data:
-        d = r["date"]
-        if start <= d <= end:
-            rows.append(r)
-    rows = sorted(rows, key=lambda x: x["date"])
-    return rows
+class Record:
+    """Base for the __slots__ row types: equality and repr over all slots."""
 
+    __slots__ = ()
 
-def extract_irrigation_previous_week(today):
-    """
-    For each block, compute previous-week irrigation performance:
-    % = (Actual + EffRain sum) / (Scheduled sum) × 100
-    Only for calendar previous Monday–Sunday.
-    """
-    prev_mon, prev_sun = get_previous_week_window(today)
+    def values(self):
+        return tuple(getattr(self, f) for f in self.__slots__)
 
-    results_labels = []
-    results_values = []
-    results_colors = []
+    def as_dict(self):
+        return {f: getattr(self, f) for f in self.__slots__}
 
-    for block_id in range(1, NUM_BLOCKS + 1):
-        block_name = BLOCK_NAMES[block_id - 1]
-        rows = blocks_data[block_id]
+    def __eq__(self, other):
+        return type(self) is type(other) and self.values() == other.values()
 
-        sched_sum = 0.0
-        actual_sum = 0.0
+    def __repr__(self):
+        fields = ", ".join(f"{f}={getattr(self, f)!r}" for f in self.__slots__)
+        return f"{type(self).__name__}({fields})"
 
-        # Weekly rows like: "Week 3 (10 Feb–16 Feb)"
-        for r in rows:
-            week_label = r["week"]
-            if "(" in week_label and "–" in week_label:
-                try:
-                    inside = week_label.split("(")[1].split(")")[0]
-                    d1_str, d2_str = inside.split("–")
-                    d1 = datetime.strptime(d1_str.strip() + f" {today.year}", "%d %b %Y").date()
-                    d2 = datetime.strptime(d2_str.strip() + f" {today.year}", "%d %b %Y").date()
-                except Exception:
-                    continue
-            else:
-                continue
 
-            # Skip weeks outside the previous-week window
-            if d2 < prev_mon or d1 > prev_sun:
-                continue
+class IrrigationWeek(Record):
+    __slots__ = ("week", "scheduled", "actual", "eff_rain", "percent", "comment")
 
-            s = safe_float(r.get("scheduled"))
-            a = safe_float(r.get("actual"))
-            e = safe_float(r.get("eff_rain"))
+    def __init__(self, week, scheduled=None, actual=None, eff_rain=None, percent=None, comment=""):
+        self.week = week
+        self.scheduled = scheduled
+        self.actual = actual
+        self.eff_rain = eff_rain
+        self.percent = percent
+        self.comment = comment
 
-            if s is not None:
-                sched_sum += s
-            if a is not None:
-                actual_sum += a
-            if e is not None:
-                actual_sum += e
 
-        if sched_sum > 0:
-            pct = round((actual_sum / sched_sum) * 100, 1)
-        else:
-            pct = None
+class AgronomyWeek(Record):
+    __slots__ = ("week", "standard_gain", "gain", "cumulative", "fertigation", "chemigation")
 
-        if pct is None:
-            continue
+    def __init__(self, week, standard_gain=None, gain=None, cumulative=None, fertigation="", chemigation=""):
+        self.week = week
+        self.standard_gain = standard_gain
+        self.gain = gain
+        self.cumulative = cumulative
+        self.fertigation = fertigation
+        self.chemigation = chemigation
 
-        results_labels.append(block_name)
-        results_values.append(pct)
-        results_colors.append(pct_color(pct))
 
-    return results_labels, results_values, results_colors
+class WeatherDay(Record):
+    __slots__ = ("date", "tmax", "tmin", "rain", "et0")
 
+    def __init__(self, d, tmax=None, tmin=None, rain=None, et0=None):
+        self.date = d
+        self.tmax = tmax
+        self.tmin = tmin
+        self.rain = rain
+        self.et0 = et0
 
-def extract_agronomy_previous_week(today):
-    """
-    Extract previous-week agronomy: gain + cumulative.
-    Uses calendar previous week (Mon–Sun) to pick the row.
-    """
-    prev_mon, prev_sun = get_previous_week_window(today)
+    @property
+    def date_str(self):
+        return self.date.isoformat()
 
-    labels = []
-    weekly = []
-    cum = []
 
-    for block_id in range(1, NUM_BLOCKS + 1):
-        block_name = BLOCK_NAMES[block_id - 1]
-        init_agronomy_rows(block_id)
-        rows = agronomy_data[block_id]
+# ---------------------------------------------------
+# WEATHER STORE (sorted + indexed by date)
+# ---------------------------------------------------
 
-        selected_gain = None
-        selected_cum = None
+WEATHER_FIELDS = ("tmax", "tmin", "rain", "et0")
+WEATHER_SUM_SCALE = 1_000_000   # running sums are kept as integer micro-units (no float drift)
 
-        for r in rows:
-            week_label = r["week"]
-            if "(" in week_label and "–" in week_label:
-                try:
-                    inside = week_label.split("(")[1].split(")")[0]
-                    d1_str, d2_str = inside.split("–")
-                    d1 = datetime.strptime(d1_str.strip() + f" {today.year}", "%d %b %Y").date()
-                    d2 = datetime.strptime(d2_str.strip() + f" {today.year}", "%d %b %Y").date()
-                except Exception:
-                    continue
-            else:
-                continue
 
-            if d2 < prev_mon or d1 > prev_sun:
-                continue
+def format_month_stats(label, agg):
+    """Turn per-field [sum, count] totals into a monthly summary row."""
+    tmax_s, tmax_n = agg["tmax"]
+    tmin_s, tmin_n = agg["tmin"]
+    rain_s, rain_n = agg["rain"]
+    et0_s, et0_n = agg["et0"]
+    tmax_s, tmin_s, rain_s, et0_s = (
+        v / WEATHER_SUM_SCALE for v in (tmax_s, tmin_s, rain_s, et0_s)
+    )
+    return {
+        "label": label,
+        "avg_tmax": round(tmax_s / tmax_n, 1) if tmax_n else None,
+        "avg_tmin": round(tmin_s / tmin_n, 1) if tmin_n else None,
+        "sum_rain": round(rain_s, 1) if rain_n else None,
+        "avg_et0": round(et0_s / et0_n, 2) if et0_n else None,
+        "cum_et0": round(et0_s, 2) if et0_n else None,
+    }
 
-            selected_gain = safe_float(r.get("gain"))
-            selected_cum = safe_float(r.get("cumulative"))
-            break
 
-        labels.append(block_name)
-        weekly.append(selected_gain if selected_gain is not None else 0)
-        cum.append(selected_cum if selected_cum is not None else 0)
+class WeatherColumns:
+    """
+    Column view of the weather store for vectorised aggregation:
+    date ordinals (sorted) plus one float64 array per field, NaN = missing.
+    """
 
-    return labels, weekly, cum
+    def __init__(self, rows):
+        n = len(rows)
+        self.ordinals = np.fromiter((r.date.toordinal() for r in rows), dtype=np.int64, count=n)
+        self.values = {
+            f: np.array([getattr(r, f) for r in rows], dtype=np.float64)
+            for f in WEATHER_FIELDS
+        }
 
+    def bounds(self, start=None, end=None):
+        lo = int(np.searchsorted(self.ordinals, start.toordinal(), "left")) if start is not None else 0
+        hi = int(np.searchsorted(self.ordinals, end.toordinal(), "right")) if end is not None else len(self.ordinals)
+        return lo, hi
 
-def fetch_forecast():
+    def aggregate(self, start=None, end=None):
+        """Per-field [sum in WEATHER_SUM_SCALE units, count] over [start, end]."""
+        lo, hi = self.bounds(start, end)
+        agg = {}
+        for f, arr in self.values.items():
+            vals = arr[lo:hi]
+            present = vals[~np.isnan(vals)]
+            agg[f] = [int(np.rint(present * WEATHER_SUM_SCALE).astype(np.int64).sum()), int(present.size)]
+        return agg
+
+
+class WeatherStore:
     """
-    Advanced 7-day forecast from yr.no JSON API for Chisumbanje Business Centre.
+    Daily weather rows, one per date, kept sorted.
+
+    Dates live in a sorted list (bisect for ranges and "last N days"),
+    rows in a dict keyed by date, and per-month [sum, count] totals for
+    each field are updated as rows are added, edited or deleted, so the
+    monthly summary never rescans the history. Sums are integers in
+    WEATHER_SUM_SCALE units so repeated edits cannot drift.
     """
-    url = "https://www.yr.no/api/v0/locations/2-893332/forecast"
 
-    empty = {
-        "headers": ["Date", "Symbol", "Temp (°C)", "Rain (mm)"],
-        "rows": [],
-        "days": [],
-        "chart_labels": [],
-        "chart_temp": [],
-        "chart_rain": [],
-    }
+    def __init__(self):
+        self._dates = []
+        self._rows = {}
+        self._months = {}
+        self._columns = None
+        self.version = 0   # bumped on every change
 
-    try:
-        resp = requests.get(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=10)
-        resp.raise_for_status()
-    except Exception as e:
-        print("Forecast fetch failed:", e)
-        return empty
+    # ---- reads ----
 
-    try:
-        data = resp.json()
-    except Exception as e:
-        print("Forecast JSON parse failed:", e)
-        return empty
+    def __len__(self):
+        return len(self._dates)
 
-    raw_days = data.get("days") or data.get("dayIntervals") or []
-    if not isinstance(raw_days, list):
-        return empty
+    def __iter__(self):
+        rows = self._rows
+        return (rows[d] for d in list(self._dates))
 
-    from datetime import datetime as _dt
+    def __contains__(self, d):
+        return d in self._rows
 
-    days = []
-    table_rows = []
-    chart_labels = []
-    chart_temp = []
-    chart_rain = []
+    def get(self, d):
+        return self._rows.get(d)
 
-    for d in raw_days[:7]:
-        date_str = d.get("date") or d.get("time") or ""
-        if len(date_str) >= 10:
-            iso = date_str[:10]
-        else:
-            iso = date_str
+    def range(self, start=None, end=None):
+        """Rows with start <= date <= end (either bound optional), oldest first."""
+        lo = bisect_left(self._dates, start) if start is not None else 0
+        hi = bisect_right(self._dates, end) if end is not None else len(self._dates)
+        rows = self._rows
+        return [rows[d] for d in self._dates[lo:hi]]
 
-        weekday = ""
-        short_date = iso
-        try:
-            dt_obj = _dt.strptime(iso, "%Y-%m-%d").date()
-            weekday = dt_obj.strftime("%a")
-            short_date = dt_obj.strftime("%d %b")
-        except Exception:
-            pass
+    def count(self, start=None, end=None):
+        lo = bisect_left(self._dates, start) if start is not None else 0
+        hi = bisect_right(self._dates, end) if end is not None else len(self._dates)
+        return max(hi - lo, 0)
 
-        temp_val = None
-        temp_info = d.get("temperature") or {}
+    def page(self, limit, start=None, end=None, before=None, after=None):
+        """
+        Keyset page of up to `limit` rows within start..end, newest first:
+        the rows just older than `before`, just newer than `after`, or the
+        latest ones. Returns (rows, has_older, has_newer).
+        """
+        dates = self._dates
+        lo = bisect_left(dates, start) if start is not None else 0
+        hi = bisect_right(dates, end) if end is not None else len(dates)
+        if after is not None:
+            a = max(lo, bisect_right(dates, after))
+            b = min(a + limit, hi)
+        else:
+            b = min(hi, bisect_left(dates, before)) if before is not None else hi
+            a = max(lo, b - limit)
+        rows = self._rows
+        return [rows[d] for d in reversed(dates[a:b])], a > lo, b < hi
+
+    def last(self, n):
+        """The latest n rows, oldest first."""
+        rows = self._rows
+        return [rows[d] for d in self._dates[-n:]] if n > 0 else []
+
+    def columns(self):
+        """WeatherColumns for the current rows, rebuilt only after a change."""
+        cols = self._columns
+        if cols is None or cols[0] != self.version:
+            version = self.version
+            cols = (version, WeatherColumns(list(self)))
+            self._columns = cols
+        return cols[1]
+
+    def month_summary(self, year, month):
+        """Summary dict for one month, or None if it has no values."""
+        agg = self._months.get((year, month))
+        if agg is None or not any(n for _, n in agg.values()):
+            return None
+        return format_month_stats(f"{year}-{month:02d}", agg)
+
+    def monthly_stats(self, start=None, end=None):
+        """
+        Monthly summaries for rows inside [start, end], sorted by month.
+        Months fully inside the range come from the running totals; only
+        the partial months at the edges are summed, on the column arrays.
+        """
+        if not self._dates:
+            return []
+        first = start if start is not None and start > self._dates[0] else self._dates[0]
+        last = end if end is not None and end < self._dates[-1] else self._dates[-1]
+        if first > last:
+            return []
+
+        stats = []
+        for key in sorted(self._months):
+            y, m = key
+            month_start = date(y, m, 1)
+            month_end = date(y + (m == 12), m % 12 + 1, 1) - timedelta(days=1)
+            if month_end < first or month_start > last:
+                continue
+            if first <= month_start and month_end <= last:
+                agg = self._months[key]
+            else:
+                agg = self.columns().aggregate(max(first, month_start), min(last, month_end))
+            if any(n for _, n in agg.values()):
+                stats.append(format_month_stats(f"{y}-{m:02d}", agg))
+        return stats
+
+    # ---- writes ----
+
+    def upsert(self, row):
+        d = row.date
+        old = self._rows.get(d)
+        if old is not None:
+            self._account(old, -1)
+        else:
+            insort(self._dates, d)
+        self._rows[d] = row
+        self._account(row, +1)
+        self.version += 1
+
+    def delete(self, d):
+        old = self._rows.pop(d, None)
+        if old is None:
+            return None
+        self._dates.pop(bisect_left(self._dates, d))
+        self._account(old, -1)
+        self.version += 1
+        return old
+
+    def replace_all(self, rows):
+        self._dates = []
+        self._rows = {}
+        self._months = {}
+        for row in rows:
+            self._rows[row.date] = row
+        self._dates = sorted(self._rows)
+        for row in self._rows.values():
+            self._account(row, +1)
+        self.version += 1
+
+    def clear(self):
+        self.replace_all([])
+
+    # ---- internals ----
+
+    def _account(self, row, sign):
+        d = row.date
+        key = (d.year, d.month)
+        agg = self._months.get(key)
+        if agg is None:
+            agg = self._months[key] = {f: [0, 0] for f in WEATHER_FIELDS}
+        for f in WEATHER_FIELDS:
+            v = getattr(row, f)
+            if v is not None:
+                agg[f][0] += sign * round(v * WEATHER_SUM_SCALE)
+                agg[f][1] += sign
+
+
+# ---------------------------------------------------
+# GLOBAL DATA STRUCTURES (in-memory, synced with MySQL)
+# ---------------------------------------------------
+
+# 30 blocks: 1–21, A1–A3, B1–B3, Mac 1–Mac 14
+BLOCK_NAMES = (
+    [f"Block {i}" for i in range(1, 22)]
+    + [f"A{i}" for i in range(1, 4)]
+    + [f"B{i}" for i in range(1, 4)]
+    + [f"Mac {i}" for i in range(1, 15)]
+)
+NUM_BLOCKS = len(BLOCK_NAMES)
+DEFAULT_ROWS = 52
+
+# Weekly irrigation data per block (52 rows for a full year). Created up
+# front so no page has to add rows while it only holds the read lock.
+blocks_data = {i: [IrrigationWeek(f"Week {w}") for w in range(1, DEFAULT_ROWS + 1)] for i in range(1, NUM_BLOCKS + 1)}
+
+# Agronomy weekly data (growth, fertigation, chemigation)
+agronomy_data = {i: [AgronomyWeek(f"Week {w}") for w in range(1, DEFAULT_ROWS + 1)] for i in range(1, NUM_BLOCKS + 1)}
+
+# Block metadata (cut/plant date + Kc + variety)
+block_meta = {
+    i: {"cut_date": "", "kc": "", "variety": ""}
+    for i in range(1, NUM_BLOCKS + 1)
+}
+
+# Daily weather data for the estate
+weather_data = WeatherStore()
+
+# Soil-moisture manual inputs per block
+soil_manual = {i: {"start_balance": 120.0, "by_date": {}} for i in range(1, NUM_BLOCKS + 1)}
+
+# NDVI / biomass records
+ndvi_data = []
+
+# Pest & disease records
+pests_data = []
+
+MAX_DEFICIT_BALANCE = 120.0  # mm, cap for soil-moisture P&L
+
+
+class ChangeTracker:
+    """
+    Keys of rows changed in memory but not yet written to MySQL.
+
+    Routes call touch() for inserted/updated rows and remove() for deleted
+    ones; the save helpers take() the pending keys and write only those.
+    If a save fails the keys are restored so the next save retries them.
+    """
+
+    def __init__(self):
+        self.upserts = set()
+        self.deletes = set()
+
+    def touch(self, key):
+        self.upserts.add(key)
+        self.deletes.discard(key)
+
+    def remove(self, key):
+        self.upserts.discard(key)
+        self.deletes.add(key)
+
+    def discard(self, key):
+        """The row was written directly (row API): nothing left pending for it."""
+        self.upserts.discard(key)
+        self.deletes.discard(key)
+
+    def take(self, match=None):
+        """Pop pending (upserts, deletes), optionally only keys where match(key) is true."""
+        if match is None:
+            upserts, deletes = self.upserts, self.deletes
+            self.upserts, self.deletes = set(), set()
+        else:
+            upserts = {k for k in self.upserts if match(k)}
+            deletes = {k for k in self.deletes if match(k)}
+            self.upserts -= upserts
+            self.deletes -= deletes
+        return upserts, deletes
+
+    def restore(self, upserts, deletes):
+        # Anything changed again since take() already carries the newer intent
+        for k in upserts:
+            if k not in self.deletes:
+                self.upserts.add(k)
+        for k in deletes:
+            if k not in self.upserts:
+                self.deletes.add(k)
+
+
+# Pending writes per domain. Keys:
+#   weather      date
+#   blocks       (block_id, week_index)   irrigation weeks
+#   agronomy     (block_id, week_index)
+#   soil_manual  (block_id, "YYYY-MM-DD")
+#   pests        pests_records.id (negative = not inserted yet)
+changes = {
+    "weather": ChangeTracker(),
+    "blocks": ChangeTracker(),
+    "agronomy": ChangeTracker(),
+    "soil_manual": ChangeTracker(),
+    "pests": ChangeTracker(),
+}
+
+_temp_pest_ids = itertools.count(-1, -1)
+
+# Bumped whenever a domain's data changes in memory; derived views (block
+# grids, dashboard sections) compare against these to know when to rebuild.
+data_versions = {"weather": 0, "blocks": 0, "agronomy": 0, "block_meta": 0, "ndvi": 0, "pests": 0}
+
+
+def bump_version(domain):
+    data_versions[domain] += 1
+    # Push clients hear about it once per request (see announce_changes)
+    if has_request_context():
+        g.setdefault("changed_domains", set()).add(domain)
+    else:
+        event_bus.publish({domain})
+
+# ---------------------------------------------------
+# SHARED STATE LOCKS (one reader/writer lock per data domain)
+# ---------------------------------------------------
+
+
+class RWLock:
+    """
+    Many readers or one writer.
+
+    A waiting writer holds back new readers so page loads cannot starve a
+    save. Re-entrant per thread: nested reads, and reads while holding the
+    write side, pass straight through. A reader must not ask for the write
+    side of the same lock (no upgrades).
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writers_waiting = 0
+        self._local = threading.local()
+
+    @contextmanager
+    def read(self):
+        depth = getattr(self._local, "depth", 0)
+        if depth or self._writer == threading.get_ident():
+            self._local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.depth = depth
+            return
+        with self._cond:
+            while self._writer is not None or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        self._local.depth = 1
+        try:
+            yield
+        finally:
+            self._local.depth = 0
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        if self._writer == me:
+            yield
+            return
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = me
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = None
+                self._cond.notify_all()
+
+
+# Soil manual entries live under block_meta (same pages, same versions).
+# Locks are always taken in this order so two multi-domain holders cannot deadlock.
+STATE_DOMAINS = ("weather", "blocks", "agronomy", "block_meta", "ndvi", "pests")
+state_locks = {d: RWLock() for d in STATE_DOMAINS}
+
+
+@contextmanager
+def _holding(mode, domains):
+    with ExitStack() as stack:
+        for d in sorted(set(domains), key=STATE_DOMAINS.index):
+            stack.enter_context(getattr(state_locks[d], mode)())
+        yield
+
+
+def reading(*domains):
+    """Hold the read side of each domain's lock (e.g. while building a page)."""
+    return _holding("read", domains)
+
+
+def writing(*domains):
+    """Hold the write side of each domain's lock while changing and saving it."""
+    return _holding("write", domains)
+
+# ---------------------------------------------------
+# HELPER FUNCTIONS
+# ---------------------------------------------------
+
+
+def init_block_rows(block_id: int):
+    """Create default weekly rows for a block if empty (must not be called under a read lock)."""
+    if blocks_data[block_id]:
+        return
+    with writing("blocks"):
+        if not blocks_data[block_id]:
+            blocks_data[block_id] = [IrrigationWeek(f"Week {i}") for i in range(1, DEFAULT_ROWS + 1)]
+            bump_version("blocks")
+
+
+def init_agronomy_rows(block_id: int):
+    """Create default weekly agronomy rows for a block if empty (must not be called under a read lock)."""
+    if agronomy_data[block_id]:
+        return
+    with writing("agronomy"):
+        if not agronomy_data[block_id]:
+            agronomy_data[block_id] = [AgronomyWeek(f"Week {i}") for i in range(1, DEFAULT_ROWS + 1)]
+            bump_version("agronomy")
+
+
+def safe_float(x):
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return None
+
+
+def _blank_none(v):
+    return None if v == "" else v
+
+
+def row_changed(old: dict, new: dict, fields):
+    """True if any of `fields` differs between two dict rows, compared as typed values ("" and None are both empty)."""
+    return any(_blank_none(old.get(f)) != _blank_none(new.get(f)) for f in fields)
+
+
+class BlockWeeks:
+    """
+    Monday-based week windows of a block's season: week i runs from
+    first_monday + 7*i to the following Sunday, first_monday being the
+    Monday on or before the cut date.
+    """
+
+    __slots__ = ("cut_date", "first_monday")
+
+    def __init__(self, cut_date: date):
+        self.cut_date = cut_date
+        self.first_monday = cut_date - timedelta(days=cut_date.weekday())  # Monday = 0
+
+    def index_of(self, d: date):
+        """Index of the week containing d, or None outside the DEFAULT_ROWS weeks."""
+        i = (d - self.first_monday).days // 7
+        return i if 0 <= i < DEFAULT_ROWS else None
+
+    def window(self, i: int):
+        start = self.first_monday + timedelta(days=7 * i)
+        return start, start + timedelta(days=6)
+
+    def label(self, i: int):
+        ws, we = self.window(i)
+        return f"Week {i+1} ({ws.strftime('%d %b')}–{we.strftime('%d %b')})"
+
+
+# block_id -> (cut_date string it was built from, BlockWeeks or None)
+_week_index = {}
+
+
+def block_weeks(block_id: int):
+    """BlockWeeks for the block's cut date (None if unset/invalid); rebuilt when the cut date changes."""
+    cut_str = block_meta[block_id].get("cut_date") or ""
+    cached = _week_index.get(block_id)
+    if cached is None or cached[0] != cut_str:
+        try:
+            weeks = BlockWeeks(datetime.strptime(cut_str, "%Y-%m-%d").date()) if cut_str else None
+        except ValueError:
+            weeks = None
+        cached = _week_index[block_id] = (cut_str, weeks)
+    return cached[1]
+
+
+def current_week_index(block_id: int, today: date):
+    """Index of the week containing today, or None before the cut date / outside the season."""
+    weeks = block_weeks(block_id)
+    if weeks is None or today < weeks.cut_date:
+        return None
+    return weeks.index_of(today)
+
+
+def current_week_percent(block_id: int, today: date):
+    """Return % for the current week only, using Monday-based weeks from cut date."""
+    week_index = current_week_index(block_id, today)
+    if week_index is None:
+        return None
+
+    rows = blocks_data[block_id]
+    if week_index >= len(rows):
+        return None
+
+    val = rows[week_index].percent
+    return round(val, 1) if val is not None else None
+
+
+# ---------------------------------------------------
+# BLOCK GRIDS (NUM_BLOCKS × 52 arrays for vectorised stats)
+# ---------------------------------------------------
+
+IRRIGATION_GRID_FIELDS = ("scheduled", "actual", "eff_rain", "percent")
+AGRONOMY_GRID_FIELDS = ("standard_gain", "gain", "cumulative")
+
+
+class BlockGrid:
+    """
+    One NUM_BLOCKS × DEFAULT_ROWS float64 array per weekly field (NaN =
+    empty cell), built from blocks_data / agronomy_data. Rebuilt lazily
+    when data_versions[domain] moves; derived vectors are cached per build.
+    """
+
+    def __init__(self, source, fields, domain):
+        self.source = source
+        self.fields = fields
+        self.domain = domain
+        self._version = None
+        self._arrays = {}
+        self._derived = {}
+
+    def arrays(self):
+        if self._version != data_versions[self.domain]:
+            self._rebuild()
+        return self._arrays
+
+    def derived(self, name, fn):
+        """fn(arrays) computed once per rebuild."""
+        arrays = self.arrays()
+        if name not in self._derived:
+            self._derived[name] = fn(arrays)
+        return self._derived[name]
+
+    def _rebuild(self):
+        version = data_versions[self.domain]
+        arrays = {f: np.full((NUM_BLOCKS, DEFAULT_ROWS), np.nan) for f in self.fields}
+        for block_id in range(1, NUM_BLOCKS + 1):
+            for i, r in enumerate(self.source[block_id][:DEFAULT_ROWS]):
+                for f in self.fields:
+                    v = getattr(r, f)
+                    if v is not None:
+                        arrays[f][block_id - 1, i] = v
+        self._arrays = arrays
+        self._derived = {}
+        self._version = version
+
+
+irrigation_grid = BlockGrid(blocks_data, IRRIGATION_GRID_FIELDS, "blocks")
+agronomy_grid = BlockGrid(agronomy_data, AGRONOMY_GRID_FIELDS, "agronomy")
+
+
+def _season_totals(arrays):
+    actual, eff = arrays["actual"], arrays["eff_rain"]
+    total = np.nansum(actual, axis=1) + np.nansum(eff, axis=1)
+    has_data = ~(np.isnan(actual).all(axis=1) & np.isnan(eff).all(axis=1))
+    return np.where(has_data, total, np.nan)
+
+
+def _percent_stats(arrays):
+    pct = arrays["percent"]
+    count = (~np.isnan(pct)).sum(axis=1)
+    safe = np.where(count > 0, count, 1)
+    avg = np.where(count > 0, np.nansum(pct, axis=1) / safe, np.nan)
+    filled = np.where(np.isnan(pct), np.inf, pct)
+    low = np.where(count > 0, filled.min(axis=1), np.nan)
+    filled = np.where(np.isnan(pct), -np.inf, pct)
+    high = np.where(count > 0, filled.max(axis=1), np.nan)
+    return avg, low, high
+
+
+def _round_or_none(v, digits=1):
+    return None if np.isnan(v) else round(float(v), digits)
+
+
+def season_total_mm(block_id: int):
+    """Total season water applied (Actual + Effective Rain) in mm."""
+    totals = irrigation_grid.derived("season_totals", _season_totals)
+    return _round_or_none(totals[block_id - 1])
+
+
+def percent_stats(block_id: int):
+    """(avg, min, max) of the weekly % of schedule for a block, None when empty."""
+    avg, low, high = irrigation_grid.derived("percent_stats", _percent_stats)
+    i = block_id - 1
+    return _round_or_none(avg[i]), _round_or_none(low[i]), _round_or_none(high[i])
+
+def agronomy_weekly_and_cum(block_id: int, today: date):
+    """Return (standard_gain, weekly_gain, cumulative_growth) for current week for a block."""
+    week_index = current_week_index(block_id, today)
+    if week_index is None:
+        return None, None, None          # ← 3 values
+
+    grid = agronomy_grid.arrays()
+    i = block_id - 1
+    return (
+        _round_or_none(grid["standard_gain"][i, week_index]),
+        _round_or_none(grid["gain"][i, week_index]),
+        _round_or_none(grid["cumulative"][i, week_index]),
+    )
+
+def pct_color(pct):
+    """Colour for percentage bar (current week view)."""
+    if pct is None:
+        return "#bdbdbd"  # grey for missing
+    try:
+        p = float(pct)
+    except Exception:
+        return "#bdbdbd"
+
+    # Blue 90–110%, Green 70–90 & 110–130, Red <50 or >150, amber for mid
+    if 90 <= p <= 110:
+        return "#1565c0"  # blue
+    if (70 <= p < 90) or (110 < p <= 130):
+        return "#2e7d32"  # green
+    if p < 50 or p > 150:
+        return "#c62828"  # red
+    return "#f9a825"     # amber for 50–70 and 130–150
+
+
+# ---------------------------------------------------
+# PREVIOUS WEEK CALCULATIONS (CALENDAR-BASED)
+# ---------------------------------------------------
+
+def get_current_week_window(today):
+    """Return Monday–Sunday window for the current calendar week."""
+    start = today - timedelta(days=today.weekday())   # Monday
+    end = start + timedelta(days=6)                   # Sunday
+    return start, end
+
+
+def get_previous_week_window(today):
+    """Return Monday–Sunday for the previous calendar week."""
+    curr_mon, _ = get_current_week_window(today)
+    prev_mon = curr_mon - timedelta(days=7)
+    prev_sun = prev_mon + timedelta(days=6)
+    return prev_mon, prev_sun
+
+
+def extract_weather_range(start, end):
+    """Extract daily weather rows inside a specific date window."""
+    return weather_data.range(start, end)
+
+
+def extract_irrigation_previous_week(today):
+    """
+    For each block, compute previous-week irrigation performance:
+    % = (Actual + EffRain) / Scheduled × 100
+    for the block week covering the calendar previous Monday–Sunday.
+    """
+    prev_mon, _ = get_previous_week_window(today)
+
+    results_labels = []
+    results_values = []
+    results_colors = []
+
+    for block_id in range(1, NUM_BLOCKS + 1):
+        block_name = BLOCK_NAMES[block_id - 1]
+        weeks = block_weeks(block_id)
+        if weeks is None:
+            continue
+        # Block weeks are Monday-aligned, so exactly one covers last week
+        week_index = weeks.index_of(prev_mon)
+        rows = blocks_data[block_id]
+        if week_index is None or week_index >= len(rows):
+            continue
+
+        r = rows[week_index]
+        sched_sum = r.scheduled or 0.0
+        actual_sum = (r.actual or 0.0) + (r.eff_rain or 0.0)
+
+        if sched_sum > 0:
+            pct = round((actual_sum / sched_sum) * 100, 1)
+        else:
+            pct = None
+
+        if pct is None:
+            continue
+
+        results_labels.append(block_name)
+        results_values.append(pct)
+        results_colors.append(pct_color(pct))
+
+    return results_labels, results_values, results_colors
+
+
+def extract_agronomy_previous_week(today):
+    """
+    Extract previous-week agronomy: gain + cumulative.
+    Uses calendar previous week (Mon–Sun) to pick the row.
+    """
+    prev_mon, _ = get_previous_week_window(today)
+
+    labels = []
+    weekly = []
+    cum = []
+
+    for block_id in range(1, NUM_BLOCKS + 1):
+        block_name = BLOCK_NAMES[block_id - 1]
+        rows = agronomy_data[block_id]
+
+        selected_gain = None
+        selected_cum = None
+
+        weeks = block_weeks(block_id)
+        week_index = weeks.index_of(prev_mon) if weeks is not None else None
+        if week_index is not None and week_index < len(rows):
+            selected_gain = rows[week_index].gain
+            selected_cum = rows[week_index].cumulative
+
+        labels.append(block_name)
+        weekly.append(selected_gain if selected_gain is not None else 0)
+        cum.append(selected_cum if selected_cum is not None else 0)
+
+    return labels, weekly, cum
+
+
+# ---------------------------------------------------
+# 7-DAY FORECAST (yr.no) – CACHED + BACKGROUND REFRESH
+# ---------------------------------------------------
+
+FORECAST_CONFIG = {
+    # Chisumbanje Business Centre; override FORECAST_URL to point at a stub server
+    "url": os.getenv("FORECAST_URL", "https://www.yr.no/api/v0/locations/2-893332/forecast"),
+    "ttl": float(os.getenv("FORECAST_TTL", 1800)),            # seconds a forecast counts as fresh
+    "timeout": float(os.getenv("FORECAST_TIMEOUT", 10)),      # HTTP timeout for the refresher
+    "retry": float(os.getenv("FORECAST_RETRY", 120)),         # wait after a failed refresh
+    "cold_wait": float(os.getenv("FORECAST_COLD_WAIT", 2)),   # max wait on an empty cache
+}
+
+
+def empty_forecast():
+    return {
+        "headers": ["Date", "Symbol", "Temp (°C)", "Rain (mm)"],
+        "rows": [],
+        "days": [],
+        "chart_labels": [],
+        "chart_temp": [],
+        "chart_rain": [],
+    }
+
+
+class ForecastCache:
+    """
+    Last good forecast, refreshed by a daemon thread.
+
+    Readers never touch the network: get() returns whatever is cached,
+    even if it is older than the TTL (stale-while-revalidate), and only
+    nudges the refresher. Refreshes are conditional requests
+    (If-None-Match / If-Modified-Since), so a 304 from yr.no just renews
+    the TTL without re-parsing.
+    """
+
+    def __init__(self, url, ttl=1800, timeout=10, retry=120, cold_wait=2):
+        self.url = url
+        self.ttl = ttl
+        self.timeout = timeout
+        self.retry = retry
+        self.cold_wait = cold_wait
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._ready = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._session = None
+
+        self._data = None
+        self._etag = None
+        self._last_modified = None
+        self._fetched_at = None   # time.monotonic() of last 200/304
+        self._retry_at = 0.0      # no new attempt before this after a failure
+        self.stats = {"refreshes": 0, "not_modified": 0, "failures": 0, "stale_reads": 0}
+
+    # ---- readers ----
+
+    def get(self):
+        """Return the cached forecast dict; never blocks on yr.no once warm."""
+        self._ensure_thread()
+        data = self._data
+        if data is None:
+            self._wake.set()
+            if time.monotonic() >= self._retry_at:
+                self._ready.wait(self.cold_wait)
+            data = self._data
+            if data is None:
+                return empty_forecast()
+        if self.is_stale():
+            self.stats["stale_reads"] += 1
+            self._wake.set()
+        return data
+
+    def age(self):
+        fetched_at = self._fetched_at
+        if fetched_at is None:
+            return None
+        return time.monotonic() - fetched_at
+
+    def is_stale(self):
+        age = self.age()
+        return age is None or age >= self.ttl
+
+    # ---- refresher ----
+
+    def refresh(self):
+        """One conditional fetch. Returns True if the cache holds fresh data afterwards."""
+        if self._session is None:
+            self._session = requests.Session()
+
+        headers = {"User-Agent": "Mozilla/5.0"}
+        # Validators only mean something while there is cached data a 304 can renew
+        if self._data is not None:
+            if self._etag:
+                headers["If-None-Match"] = self._etag
+            if self._last_modified:
+                headers["If-Modified-Since"] = self._last_modified
+
+        try:
+            with timer("forecast", "yr.no"):
+                resp = self._session.get(self.url, headers=headers, timeout=self.timeout)
+            if resp.status_code == 304:
+                if self._data is not None:
+                    with self._lock:
+                        self._fetched_at = time.monotonic()
+                    self.stats["not_modified"] += 1
+                    return True
+                # Nothing to renew: fetch the full body without validators
+                resp = self._session.get(self.url, headers={"User-Agent": "Mozilla/5.0"}, timeout=self.timeout)
+            resp.raise_for_status()
+            data = resp.json()
+        except Exception as e:
+            self.stats["failures"] += 1
+            self._retry_at = time.monotonic() + self.retry
+            print("Forecast fetch failed:", e)
+            return False
+
+        parsed = parse_forecast(data)
+        if not parsed["days"] and self._data is not None:
+            # Keep serving the last good forecast rather than an empty one
+            self.stats["failures"] += 1
+            self._retry_at = time.monotonic() + self.retry
+            print("Forecast payload had no days; keeping previous forecast.")
+            return False
+
+        with self._lock:
+            self._data = parsed
+            self._etag = resp.headers.get("ETag")
+            self._last_modified = resp.headers.get("Last-Modified")
+            self._fetched_at = time.monotonic()
+        self.stats["refreshes"] += 1
+        self._ready.set()
+        return True
+
+    def _ensure_thread(self):
+        # gunicorn forks after import, so each worker starts its own refresher
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._session = None
+            self._thread = threading.Thread(target=self._run, name="forecast-refresher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.clear()
+            if self.is_stale() and time.monotonic() >= self._retry_at:
+                self.refresh()
+            wait = self._retry_at - time.monotonic()
+            if wait <= 0:
+                wait = max(self.ttl - (self.age() or 0.0), 1.0)
+            self._wake.wait(wait)
+
+
+forecast_cache = ForecastCache(**FORECAST_CONFIG)
+
+
+@timed("forecast", "cache")
+def fetch_forecast():
+    """
+    Advanced 7-day forecast from yr.no for Chisumbanje Business Centre.
+    Served from forecast_cache; the network call happens in the refresher thread.
+    """
+    return forecast_cache.get()
+
+
+def parse_forecast(data):
+    """Turn the yr.no JSON payload into the dict used by the dashboard."""
+    empty = empty_forecast()
+    if not isinstance(data, dict):
+        return empty
+
+    raw_days = data.get("days") or data.get("dayIntervals") or []
+    if not isinstance(raw_days, list):
+        return empty
+
+    from datetime import datetime as _dt
+
+    days = []
+    table_rows = []
+    chart_labels = []
+    chart_temp = []
+    chart_rain = []
+
+    for d in raw_days[:7]:
+        date_str = d.get("date") or d.get("time") or ""
+        if len(date_str) >= 10:
+            iso = date_str[:10]
+        else:
+            iso = date_str
+
+        weekday = ""
+        short_date = iso
+        try:
+            dt_obj = _dt.strptime(iso, "%Y-%m-%d").date()
+            weekday = dt_obj.strftime("%a")
+            short_date = dt_obj.strftime("%d %b")
+        except Exception:
+            pass
+
+        temp_val = None
+        temp_info = d.get("temperature") or {}
         if isinstance(temp_info, dict):
             temp_val = (
                 temp_info.get("value")
                 or temp_info.get("max")
                 or temp_info.get("min")
             )
-        if temp_val is not None:
+        if temp_val is not None:
+            try:
+                temp_val = round(float(temp_val), 1)
+            except Exception:
+                pass
+
+        rain_val = None
+        precip = d.get("precipitation") or {}
+        if isinstance(precip, dict):
+            rain_val = (
+                precip.get("value")
+                or precip.get("max")
+                or precip.get("min")
+            )
+        if rain_val is not None:
+            try:
+                rain_val = round(float(rain_val), 1)
+            except Exception:
+                pass
+
+        symbol_code = None
+        symbol_info = d.get("symbol") or {}
+        if isinstance(symbol_info, dict):
+            symbol_code = symbol_info.get("code") or symbol_info.get("id")
+
+        emoji = "🌤"
+        text = symbol_code or ""
+        if symbol_code:
+            code_lower = symbol_code.lower()
+            if "thunder" in code_lower:
+                emoji = "⛈"
+            elif "rain" in code_lower or "shower" in code_lower:
+                emoji = "🌧"
+            elif "snow" in code_lower:
+                emoji = "❄️"
+            elif "cloud" in code_lower or "fog" in code_lower:
+                emoji = "☁️"
+            elif "sun" in code_lower or "clear" in code_lower:
+                emoji = "☀️"
+
+        days.append(
+            {
+                "iso_date": iso,
+                "weekday": weekday,
+                "date_short": short_date,
+                "temp": temp_val,
+                "temp_str": f"{temp_val}°C" if temp_val is not None else "-",
+                "rain": rain_val if rain_val is not None else 0,
+                "rain_str": f"{rain_val} mm" if rain_val is not None else "0 mm",
+                "symbol": symbol_code or "",
+                "emoji": emoji,
+                "symbol_text": text,
+            }
+        )
+
+        table_rows.append(
+            [
+                short_date,
+                text or "-",
+                f"{temp_val}°C" if temp_val is not None else "-",
+                rain_val if rain_val is not None else "0",
+            ]
+        )
+
+              # Show both weekday and date on the chart, e.g. "Mon 25 Nov"
+        label = ""
+        if weekday and short_date:
+            label = f"{weekday} {short_date}"
+        else:
+            label = short_date or iso
+        chart_labels.append(label)
+
+        chart_temp.append(temp_val if temp_val is not None else None)
+        chart_rain.append(rain_val if rain_val is not None else 0)
+
+    return {
+        "headers": ["Date", "Symbol", "Temp (°C)", "Rain (mm)"],
+        "rows": table_rows,
+        "days": days,
+        "chart_labels": chart_labels,
+        "chart_temp": chart_temp,
+        "chart_rain": chart_rain,
+    }
+
+# ---------------------------------------------------
+# SOIL-MOISTURE BALANCE ENGINE (incremental daily series)
+# ---------------------------------------------------
+
+class SoilSeries:
+    """One block's daily balances from `anchor`: balances[i] is the end-of-day balance on anchor + i."""
+
+    __slots__ = ("params", "anchor", "balances")
+
+    def __init__(self, params, anchor):
+        self.params = params
+        self.anchor = anchor
+        self.balances = []
+
+
+class SoilBalanceEngine:
+    """
+    Daily soil-moisture P&L per block, run forward from the season start
+    (cut date, else the first weather day) and kept between requests:
+
+      Balance_d = clamp(Balance_d-1 - ET0_d × Kc + Eff_d + Irr_d, 0, MAX_DEFICIT_BALANCE)
+
+    Days with no weather row carry the balance over. invalidate() drops
+    a series from a date on when weather or manual entries change; the
+    next read extends it forward again, so only the tail is recomputed
+    and repeat reads are O(1). A change of cut date, Kc or start balance
+    rebuilds the block's series.
+
+    Readers share the data locks, so the series themselves are guarded by
+    the engine's own lock.
+    """
+
+    def __init__(self):
+        self._series = {}
+        self._lock = threading.RLock()
+
+    def invalidate(self, block_id=None, since=None):
+        """Forget balances on/after `since` (all of them if None) for one block or all."""
+        with self._lock:
+            targets = list(self._series) if block_id is None else [block_id]
+            for bid in targets:
+                series = self._series.get(bid)
+                if series is None:
+                    continue
+                if since is None or since <= series.anchor:
+                    del self._series[bid]
+                else:
+                    del series.balances[(since - series.anchor).days:]
+
+    def balance_on(self, block_id: int, d: date):
+        """Balance at the end of day d (start balance before the season starts)."""
+        with self._lock:
+            series = self._series_for(block_id)
+            if series is None or d < series.anchor:
+                return series.params[2] if series else float(soil_manual[block_id].get("start_balance", 120.0))
+            i = (d - series.anchor).days
+            if i >= len(series.balances):
+                self._extend(block_id, series, d)
+            return series.balances[i]
+
+    # ---- internals ----
+
+    def _params(self, block_id):
+        weeks = block_weeks(block_id)
+        cut_dt = weeks.cut_date if weeks else None
+        kc_val = safe_float(block_meta[block_id].get("kc")) or 1.0
+        start_balance = float(soil_manual[block_id].get("start_balance", 120.0))
+        return cut_dt, kc_val, start_balance
+
+    def _series_for(self, block_id):
+        params = self._params(block_id)
+        series = self._series.get(block_id)
+        if series is None or series.params != params:
+            anchor = params[0]
+            if anchor is None:
+                first = weather_data.range(None, None)[:1]
+                if not first:
+                    return None
+                anchor = first[0].date
+            series = self._series[block_id] = SoilSeries(params, anchor)
+        return series
+
+    def _extend(self, block_id, series, until):
+        _, kc_val, start_balance = series.params
+        by_date = soil_manual[block_id].get("by_date", {})
+        balances = series.balances
+        balance = balances[-1] if balances else start_balance
+        d = series.anchor + timedelta(days=len(balances))
+        while d <= until:
+            r = weather_data.get(d)
+            if r is not None:
+                # Manual soil P&L entries from irrigation page
+                manual_date = by_date.get(r.date_str, {})
+                etc = round((r.et0 or 0.0) * kc_val, 2)
+                balance = round(balance - etc + (manual_date.get("eff") or 0.0) + (manual_date.get("irr") or 0.0), 1)
+                # Clamp within 0 – MAX_DEFICIT_BALANCE
+                if balance > MAX_DEFICIT_BALANCE:
+                    balance = MAX_DEFICIT_BALANCE
+                if balance < 0:
+                    balance = 0
+            balances.append(balance)
+            d += timedelta(days=1)
+
+
+soil_engine = SoilBalanceEngine()
+
+
+def weather_changed(since=None):
+    """Weather rows changed on/after `since` (any date if None)."""
+    bump_version("weather")
+    soil_engine.invalidate(since=since)
+
+
+def invalidate_soil_from(block_id: int, d_str: str):
+    """Drop a block's balances from a manual entry's date ("YYYY-MM-DD") on."""
+    try:
+        since = datetime.strptime(d_str, "%Y-%m-%d").date()
+    except ValueError:
+        since = None
+    soil_engine.invalidate(block_id, since)
+
+
+def compute_soil_balance(block_id: int):
+    """Today's soil-moisture balance for a block (see SoilBalanceEngine)."""
+    return round(soil_engine.balance_on(block_id, date.today()), 1)
+
+def soil_pct_color(balance, tam):
+    """
+    Return (pct, colour_hex) based on balance/TAM * 100.
+
+    Colour bands:
+      blue       95–100%
+      light blue 90–94%
+      green      70–89%
+      orange     50–69%
+      red        <50%
+    """
+    if balance is None or tam is None or tam <= 0:
+        return 0.0, "#bdbdbd"  # grey for missing
+
+    pct = (float(balance) / float(tam)) * 100.0
+
+    if pct >= 95:
+        colour = "#1565c0"   # blue
+    elif pct >= 90:
+        colour = "#42a5f5"   # light blue
+    elif pct >= 70:
+        colour = "#2e7d32"   # green
+    elif pct >= 50:
+        colour = "#fb8c00"   # orange
+    else:
+        colour = "#c62828"   # red
+
+    return pct, colour
+
+
+
+# ---------------------------------------------------
+# NEW: MySQL CONFIG + LOAD/SAVE HELPERS
+# ---------------------------------------------------
+DB_POOL_CONFIG = {
+    "size": int(os.getenv("DB_POOL_SIZE", 5)),                # connections per worker (max 32)
+    "timeout": float(os.getenv("DB_POOL_TIMEOUT", 10)),       # max wait for a free connection
+}
+
+
+def _gevent_patched():
+    """True under gunicorn's gevent worker (sockets monkey-patched)."""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("socket")
+
+
+def _db_connect_args():
+    """Connection settings shared by every pooled connection (Aiven SSL)."""
+    return {
+        "host": DB_CONFIG["host"],
+        "user": DB_CONFIG["user"],
+        "password": DB_CONFIG["password"],
+        "database": DB_CONFIG["database"],
+        "port": DB_CONFIG.get("port", 3306),
+        "ssl_ca": None,          # Aiven handles SSL internally
+        "ssl_disabled": False,   # Force SSL on
+        # The C extension does its own blocking I/O, which would stall every
+        # greenlet on the worker; the pure-Python driver yields to the hub
+        "use_pure": _gevent_patched(),
+    }
+
+
+class DBPool:
+    """
+    Per-worker MySQL connection pool (mysql.connector.pooling).
+
+    Connections are pinged on checkout and transparently reconnected if
+    the server dropped them. When the pool is exhausted, checkout waits
+    up to `timeout` seconds for a connection to come back.
+    """
+
+    def __init__(self, size=5, timeout=10):
+        self.size = size
+        self.timeout = timeout
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "failures": 0,
+            "reconnects": 0,
+            "in_use": 0,
+        }
+
+    def _get_pool(self):
+        # gunicorn forks after import; never share sockets across workers
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    self._pool = mysql.pooling.MySQLConnectionPool(
+                        pool_name=f"irrigation_{os.getpid()}",
+                        pool_size=self.size,
+                        pool_reset_session=True,
+                        **_db_connect_args(),
+                    )
+                    self._pid = os.getpid()
+        return self._pool
+
+    def checkout(self):
+        """Borrow a healthy connection; release() hands it back."""
+        try:
+            pool = self._get_pool()
+        except Exception:
+            self.stats["failures"] += 1
+            raise
+
+        started = time.monotonic()
+        waited = False
+        while True:
+            try:
+                conn = pool.get_connection()
+                break
+            except mysql.errors.PoolError:
+                if time.monotonic() - started >= self.timeout:
+                    self.stats["failures"] += 1
+                    raise
+                if not waited:
+                    self.stats["waits"] += 1
+                    waited = True
+                time.sleep(0.01)
+            except Exception:
+                self.stats["failures"] += 1
+                raise
+        if waited:
+            self.stats["wait_seconds"] += time.monotonic() - started
+
+        # Health check: a dropped socket is reconnected before use
+        try:
+            if not conn.is_connected():
+                self.stats["reconnects"] += 1
+                conn.reconnect(attempts=2, delay=0)
+        except Exception:
+            self.stats["failures"] += 1
+            try:
+                conn.close()
+            except Exception:
+                pass
+            raise
+
+        self.stats["checkouts"] += 1
+        self.stats["in_use"] += 1
+        return conn
+
+    def release(self, conn):
+        self.stats["in_use"] -= 1
+        try:
+            conn.close()
+        except Exception as e:
+            print("Failed to return DB connection to pool:", e)
+
+    def snapshot(self):
+        data = dict(self.stats)
+        data["size"] = self.size
+        data["wait_seconds"] = round(data["wait_seconds"], 3)
+        return data
+
+
+# ------------ SQLITE BACKEND ------------
+
+# Dates go in as ISO text and come back as date objects for DATE columns
+sqlite3.register_adapter(date, lambda d: d.isoformat())
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" "))
+sqlite3.register_converter("DATE", lambda b: date.fromisoformat(b.decode()))
+
+
+class SQLiteCursor:
+    """sqlite3 cursor that takes the %s placeholders the SQL helpers are written with."""
+
+    def __init__(self, cur):
+        self._cur = cur
+
+    def execute(self, sql, params=()):
+        self._cur.execute(sql.replace("%s", "?"), params)
+
+    def executemany(self, sql, seq):
+        self._cur.executemany(sql.replace("%s", "?"), seq)
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+
+class SQLiteConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return SQLiteCursor(self._conn.cursor())
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class SQLitePool:
+    """
+    Connections to a local SQLite file, with the same checkout/release
+    interface as DBPool.
+
+    WAL mode lets readers run alongside the single writer; a writer from
+    another worker waits up to `timeout` seconds for the file lock.
+    """
+
+    def __init__(self, path, size=5, timeout=10):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = []
+        self._slots = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "failures": 0,
+            "reconnects": 0,
+            "in_use": 0,
+        }
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,   # one thread at a time, via checkout()
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return SQLiteConnection(conn)
+
+    def checkout(self):
+        with self._lock:
+            # gunicorn forks after import; never share handles across workers
+            if self._pid != os.getpid():
+                self._idle = []
+                self._slots = threading.BoundedSemaphore(self.size)
+                self._pid = os.getpid()
+        started = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            self.stats["waits"] += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                self.stats["failures"] += 1
+                raise TimeoutError(f"no free SQLite connection after {self.timeout} s")
+            self.stats["wait_seconds"] += time.monotonic() - started
+        try:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            self._slots.release()
+            self.stats["failures"] += 1
+            raise
+        self.stats["checkouts"] += 1
+        self.stats["in_use"] += 1
+        return conn
+
+    def release(self, conn):
+        self.stats["in_use"] -= 1
+        try:
+            conn.rollback()   # never hand on an open transaction
+            with self._lock:
+                self._idle.append(conn)
+        except Exception as e:
+            print("Failed to return SQLite connection to pool:", e)
+        finally:
+            self._slots.release()
+
+    def snapshot(self):
+        data = dict(self.stats)
+        data["size"] = self.size
+        data["path"] = self.path
+        data["wait_seconds"] = round(data["wait_seconds"], 3)
+        return data
+
+
+# ------------ SQL DIALECTS ------------
+#
+# The load/save helpers are plain SQL with %s placeholders; the few
+# statements that differ between the backends go through `dialect`.
+
+
+class MySQLDialect:
+    name = "mysql"
+    max_params = 65535
+
+    def upsert_sql(self, table, columns, key_columns, row_count, bump_column=None):
+        placeholders = "(" + ",".join(["%s"] * len(columns)) + ")"
+        updates = ", ".join(f"{c}=VALUES({c})" for c in columns if c not in key_columns)
+        if updates and bump_column:
+            updates += f", {bump_column}={bump_column}+1"
+        return (
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+            + ",".join([placeholders] * row_count)
+            + (f" ON DUPLICATE KEY UPDATE {updates}" if updates else "")
+        )
+
+    def bump_version(self, cur, domain):
+        cur.execute(
+            "INSERT INTO data_versions (domain, version) VALUES (%s, LAST_INSERT_ID(1)) "
+            "ON DUPLICATE KEY UPDATE version = LAST_INSERT_ID(version + 1)",
+            (domain,),
+        )
+        return cur.lastrowid
+
+    @contextmanager
+    def migration_lock(self, cur):
+        # One runner at a time across processes (release phase vs. a manual run)
+        cur.execute("SELECT GET_LOCK('agric_monitor_migrate', 60)")
+        if cur.fetchone()[0] != 1:
+            raise RuntimeError("another migration run holds the lock")
+        try:
+            yield
+        finally:
+            cur.execute("SELECT RELEASE_LOCK('agric_monitor_migrate')")
+            cur.fetchone()
+
+    def week_start(self, cut_expr, index_expr):
+        """SQL for the Monday starting week `index_expr` of a season cut on `cut_expr` (see BlockWeeks)."""
+        return f"DATE_ADD({cut_expr}, INTERVAL (7 * {index_expr} - WEEKDAY({cut_expr})) DAY)"
+
+    def stream_cursor(self, conn):
+        # Unbuffered: rows are read off the socket as fetchmany() asks for them
+        return conn.cursor(buffered=False)
+
+    def close_stream(self, conn, cur):
+        # A client that disconnects mid-export leaves rows unread; drain them
+        # so the connection goes back to the pool usable
+        try:
+            if getattr(conn, "unread_result", False):
+                conn.consume_results()
+        finally:
+            cur.close()
+
+    def missing_table(self, e):
+        return getattr(e, "errno", None) == 1146
+
+    def duplicate_key(self, e):
+        return getattr(e, "errno", None) == 1062
+
+    def already_exists(self, e):
+        # 1050 table exists, 1060 duplicate column, 1061 duplicate key name
+        return getattr(e, "errno", None) in (1050, 1060, 1061)
+
+
+class SQLiteDialect:
+    name = "sqlite"
+    max_params = 32766
+
+    def upsert_sql(self, table, columns, key_columns, row_count, bump_column=None):
+        placeholders = "(" + ",".join(["%s"] * len(columns)) + ")"
+        updates = ", ".join(f"{c}=excluded.{c}" for c in columns if c not in key_columns)
+        if updates and bump_column:
+            updates += f", {bump_column}={bump_column}+1"
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES " + ",".join([placeholders] * row_count)
+        if key_columns:
+            sql += f" ON CONFLICT({', '.join(key_columns)}) DO " + (f"UPDATE SET {updates}" if updates else "NOTHING")
+        return sql
+
+    def bump_version(self, cur, domain):
+        cur.execute(
+            "INSERT INTO data_versions (domain, version) VALUES (%s, 1) "
+            "ON CONFLICT(domain) DO UPDATE SET version = version + 1 RETURNING version",
+            (domain,),
+        )
+        return cur.fetchone()[0]
+
+    @contextmanager
+    def migration_lock(self, cur):
+        # Local file, one host: the release step is the only runner
+        yield
+
+    def week_start(self, cut_expr, index_expr):
+        # strftime('%w') counts from Sunday = 0; BlockWeeks weeks start on Monday
+        monday_offset = f"(CAST(strftime('%w', {cut_expr}) AS INTEGER) + 6) % 7"
+        return f"date({cut_expr}, (7 * {index_expr} - {monday_offset}) || ' days')"
+
+    def stream_cursor(self, conn):
+        # sqlite3 steps the statement as rows are fetched
+        return conn.cursor()
+
+    def close_stream(self, conn, cur):
+        cur.close()
+
+    def missing_table(self, e):
+        return isinstance(e, sqlite3.OperationalError) and "no such table" in str(e)
+
+    def duplicate_key(self, e):
+        return isinstance(e, sqlite3.IntegrityError) and "UNIQUE constraint failed" in str(e)
+
+    def already_exists(self, e):
+        msg = str(e)
+        return isinstance(e, sqlite3.OperationalError) and ("already exists" in msg or "duplicate column" in msg)
+
+
+if DB_BACKEND == "sqlite":
+    db_pool = SQLitePool(SQLITE_CONFIG["path"], **DB_POOL_CONFIG)
+    dialect = SQLiteDialect()
+else:
+    db_pool = DBPool(**DB_POOL_CONFIG)
+    dialect = MySQLDialect()
+
+
+def get_db():
+    """
+    Return a pooled MySQL connection.
+
+    Inside a request the same connection is reused by every helper and
+    returned to the pool at teardown; outside a request (CLI, threads)
+    each call checks out its own connection.
+    """
+    if has_request_context():
+        conn = g.get("db_conn")
+        if conn is None:
+            conn = db_pool.checkout()
+            g.db_conn = conn
+        return conn
+    return db_pool.checkout()
+
+
+def release_db(conn):
+    """Give back a connection from get_db() (no-op for the request-scoped one)."""
+    if has_request_context() and g.get("db_conn") is conn:
+        return
+    db_pool.release(conn)
+
+
+@contextmanager
+def db_cursor(commit=False):
+    """Cursor on a pooled connection; commits on success, rolls back on error."""
+    conn = get_db()
+    cursor = conn.cursor()
+    try:
+        yield cursor
+        if commit:
+            conn.commit()
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        raise
+    finally:
+        cursor.close()
+        release_db(conn)
+
+
+@app.teardown_appcontext
+def release_request_db(exc):
+    conn = g.pop("db_conn", None)
+    if conn is not None:
+        if exc is not None:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        db_pool.release(conn)
+
+
+@app.route("/admin/db-pool")
+def db_pool_stats():
+    """Pool statistics for this worker (checkouts, waits, failures)."""
+    return jsonify(db_pool.snapshot())
+
+# ------------ SCHEMA MIGRATIONS ------------
+#
+# Ordered SQL files per backend in migrations/<mysql|sqlite>/
+# (NNNN_description.sql, same numbers in both). schema_version records the
+# ones applied; `flask --app app_fixed2 db upgrade` applies the rest.
+# Serving never runs DDL: a worker only checks the version at boot.
+#
+# Statements that fail only because their table, column or index is
+# already there count as applied: databases created by the old init_db()
+# adopt the migrations unchanged.
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations", dialect.name)
+
+
+def migration_files():
+    """[(version, name, path)] of the migration scripts, oldest first."""
+    found = []
+    for fname in sorted(os.listdir(MIGRATIONS_DIR)):
+        stem, ext = os.path.splitext(fname)
+        number, _, name = stem.partition("_")
+        if ext == ".sql" and number.isdigit():
+            found.append((int(number), name, os.path.join(MIGRATIONS_DIR, fname)))
+    return found
+
+
+def sql_statements(path):
+    """Statements of a migration file (split on ';' at line end, -- comments dropped)."""
+    with open(path, encoding="utf-8") as f:
+        lines = [ln for ln in f.read().splitlines() if not ln.strip().startswith("--")]
+    statements = (stmt.strip().rstrip(";").strip() for stmt in "\n".join(lines).split(";\n"))
+    return [stmt for stmt in statements if stmt]
+
+
+def current_schema_version(cur):
+    """Highest applied migration (0 for a database that has never been migrated)."""
+    try:
+        cur.execute("SELECT MAX(version) FROM schema_version")
+    except Exception as e:
+        if dialect.missing_table(e):   # no schema_version table yet
+            return 0
+        raise
+    row = cur.fetchone()
+    return int(row[0] or 0) if row else 0
+
+
+def upgrade_schema():
+    """Apply pending migrations in order; returns the versions applied."""
+    applied = []
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        with dialect.migration_lock(cur):
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INT PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL,
+                    applied_at DATETIME NOT NULL
+                )
+            """)
+            current = current_schema_version(cur)
+            for version, name, path in migration_files():
+                if version <= current:
+                    continue
+                t0 = time.perf_counter()
+                for stmt in sql_statements(path):
+                    try:
+                        cur.execute(stmt)
+                    except Exception as e:
+                        if not dialect.already_exists(e):
+                            raise
+                        print(f"  {version:04d}: already present, skipped: {e}")
+                cur.execute(
+                    "INSERT INTO schema_version (version, name, applied_at) VALUES (%s, %s, %s)",
+                    (version, name, datetime.now().replace(microsecond=0)),
+                )
+                conn.commit()
+                applied.append(version)
+                print(f"Applied migration {version:04d}_{name} in {time.perf_counter() - t0:.3f} s")
+    finally:
+        cur.close()
+        release_db(conn)
+    return applied
+
+
+@timed("db")
+def check_schema():
+    """Boot check (one query): warn when the database is behind the migration files."""
+    latest = max((v for v, _, _ in migration_files()), default=0)
+    with db_cursor() as cur:
+        current = current_schema_version(cur)
+    if current < latest:
+        print(f"Database schema is at {current}, migrations go to {latest}: run `flask --app app_fixed2 db upgrade`")
+    return current, latest
+
+
+# ------------ LOAD FROM DB INTO MEMORY ------------
+#
+# Daily tables are loaded from the start of the active seasons on
+# (hot_window_start, see SEASON ARCHIVE); older days are read on demand.
+
+def date_range_sql(column, start=None, end=None):
+    """(" WHERE ..." or "", params) limiting `column` to [start, end]."""
+    where, params = [], []
+    if start is not None:
+        where.append(f"{column} >= %s")
+        params.append(start)
+    if end is not None:
+        where.append(f"{column} <= %s")
+        params.append(end)
+    return (" WHERE " + " AND ".join(where) if where else ""), tuple(params)
+
+
+def read_weather_days(cur, start=None, end=None):
+    where, params = date_range_sql("date", start, end)
+    cur.execute(f"SELECT date, tmax, tmin, rain, et0 FROM weather{where} ORDER BY date", params)
+    return [
+        WeatherDay(d, safe_float(tmax), safe_float(tmin), safe_float(rain), safe_float(et0))
+        for d, tmax, tmin, rain, et0 in cur.fetchall()
+    ]
+
+
+def read_ndvi_records(cur, start=None, end=None):
+    where, params = date_range_sql("date", start, end)
+    cur.execute(f"SELECT date, block_id, ndvi, biomass FROM ndvi_records{where} ORDER BY date, block_id", params)
+    return [
+        {
+            "date": d,
+            "date_str": d.strftime("%Y-%m-%d"),
+            "block_id": block_id,
+            "ndvi": ndvi,
+            "biomass": biomass,
+        }
+        for d, block_id, ndvi, biomass in cur.fetchall()
+    ]
+
+
+def read_pest_records(cur, start=None, end=None, ids=None):
+    where, params = date_range_sql("date", start, end)
+    if ids:
+        where += (" AND " if where else " WHERE ") + f"id IN ({','.join(['%s'] * len(ids))})"
+        params += tuple(ids)
+    cur.execute(
+        f"SELECT id, date, block_id, pest, severity, area, action FROM pests_records{where} ORDER BY date, block_id",
+        params,
+    )
+    return [
+        {
+            "id": rec_id,
+            "date": d,
+            "date_str": d.strftime("%Y-%m-%d"),
+            "block_id": block_id,
+            "pest": pest,
+            "severity": severity,
+            "area": area,
+            "action": action,
+        }
+        for rec_id, d, block_id, pest, severity, area, action in cur.fetchall()
+    ]
+
+
+@timed("db")
+def load_weather_from_db():
+    with db_cursor() as cur:
+        rows = read_weather_days(cur, hot_window_start(cur))
+    with writing("weather"):
+        weather_data.replace_all(rows)
+        weather_changed()
+
+
+def load_blocks_from_db():
+    load_block_meta_from_db()
+    load_irrigation_from_db()
+    load_soil_manual_from_db()
+    load_agronomy_from_db()
+
+
+@timed("db")
+def load_block_meta_from_db():
+    with db_cursor() as cur:
+        cur.execute("SELECT block_id, name, cut_date, kc, variety, sm_start_balance FROM blocks_meta")
+        fetched = cur.fetchall()
+    with writing("block_meta"):
+        for block_id, name, cut_date, kc, variety, sm_start_balance in fetched:
+            if 1 <= block_id <= NUM_BLOCKS:
+                block_meta[block_id]["cut_date"] = cut_date.strftime("%Y-%m-%d") if cut_date else ""
+                block_meta[block_id]["kc"] = "" if kc is None else str(kc)
+                block_meta[block_id]["variety"] = variety or ""
+                if sm_start_balance is not None:
+                    soil_manual[block_id]["start_balance"] = float(sm_start_balance)
+        bump_version("block_meta")
+        soil_engine.invalidate()
+    widen_hot_window()
+
+
+@timed("db")
+def load_irrigation_from_db():
+    with db_cursor() as cur:
+        cur.execute("""
+            SELECT block_id, week_index, week_label, scheduled, actual, eff_rain, percent, comment
+            FROM irrigation_weeks
+        """)
+        fetched = cur.fetchall()
+    with writing("blocks"):
+        # New lists per block: pages holding the old list keep a consistent copy.
+        # Weeks start blank so a season rolled over by another worker is cleared here too.
+        for bid in range(1, NUM_BLOCKS + 1):
+            blocks_data[bid] = [IrrigationWeek(f"Week {i}") for i in range(1, DEFAULT_ROWS + 1)]
+        for block_id, week_index, week_label, scheduled, actual, eff_rain, percent, comment in fetched:
+            if 1 <= block_id <= NUM_BLOCKS and 0 <= week_index < DEFAULT_ROWS:
+                rows = blocks_data[block_id]
+                rows[week_index] = IrrigationWeek(
+                    week_label or rows[week_index].week,
+                    safe_float(scheduled),
+                    safe_float(actual),
+                    safe_float(eff_rain),
+                    safe_float(percent),
+                    comment or "",
+                )
+        bump_version("blocks")
+
+
+@timed("db")
+def load_soil_manual_from_db():
+    with db_cursor() as cur:
+        where, params = date_range_sql("date", hot_window_start(cur))
+        cur.execute(f"SELECT block_id, date, eff, irr FROM soil_manual_entries{where}", params)
+        fetched = cur.fetchall()
+    by_block = {bid: {} for bid in range(1, NUM_BLOCKS + 1)}
+    for block_id, d, eff, irr in fetched:
+        if 1 <= block_id <= NUM_BLOCKS:
+            by_block[block_id][d.strftime("%Y-%m-%d")] = {"eff": safe_float(eff), "irr": safe_float(irr)}
+    # Replace per block so entries deleted by another worker go away too
+    with writing("block_meta"):
+        for block_id, by_date in by_block.items():
+            soil_manual[block_id]["by_date"] = by_date
+        bump_version("block_meta")
+        soil_engine.invalidate()
+
+
+@timed("db")
+def load_agronomy_from_db():
+    with db_cursor() as cur:
+        cur.execute("""
+            SELECT block_id, week_index, week_label, standard_gain, gain, cumulative,
+                   fertigation, chemigation
+            FROM agronomy_weeks
+        """)
+        fetched = cur.fetchall()
+    with writing("agronomy"):
+        for bid in range(1, NUM_BLOCKS + 1):
+            agronomy_data[bid] = [AgronomyWeek(f"Week {i}") for i in range(1, DEFAULT_ROWS + 1)]
+        for block_id, week_index, week_label, std_gain, gain, cumulative, fert, chem in fetched:
+            if 1 <= block_id <= NUM_BLOCKS and 0 <= week_index < DEFAULT_ROWS:
+                rows = agronomy_data[block_id]
+                rows[week_index] = AgronomyWeek(
+                    week_label or rows[week_index].week,
+                    safe_float(std_gain),
+                    safe_float(gain),
+                    safe_float(cumulative),
+                    fert or "",
+                    chem or "",
+                )
+        bump_version("agronomy")
+
+
+@timed("db")
+def load_ndvi_from_db():
+    with db_cursor() as cur:
+        records = read_ndvi_records(cur, hot_window_start(cur))
+    # Swapped in whole: readers never see a half-filled list
+    with writing("ndvi"):
+        ndvi_data[:] = records
+        bump_version("ndvi")
+
+
+@timed("db")
+def load_pests_from_db():
+    with db_cursor() as cur:
+        records = read_pest_records(cur, hot_window_start(cur))
+    with writing("pests"):
+        pests_data[:] = records
+        bump_version("pests")
+
+
+# ------------ SAVE / UPSERT HELPERS ------------
+
+UPSERT_BATCH_SIZE = int(os.getenv("DB_UPSERT_BATCH", 500))  # rows per multi-row statement
+
+# Tables with a row_version column (migration 0005); updating upserts bump it
+# so row API clients holding an older version get a conflict.
+ROW_VERSIONED_TABLES = {"weather", "irrigation_weeks", "soil_manual_entries", "pests_records"}
+
+
+def upsert_rows(cur, table, columns, rows, key_columns=(), batch_size=None):
+    """
+    Write rows with a multi-row upsert (ON DUPLICATE KEY UPDATE on MySQL,
+    ON CONFLICT DO UPDATE on SQLite).
+
+    One statement (one round trip) per `batch_size` rows. Columns listed in
+    key_columns are part of the unique key and are not updated.
+    Returns the number of statements issued.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    batch_size = min(batch_size or UPSERT_BATCH_SIZE, dialect.max_params // len(columns))
+    statements = 0
+    for start in range(0, len(rows), batch_size):
+        chunk = rows[start:start + batch_size]
+        cur.execute(
+            dialect.upsert_sql(table, columns, key_columns, len(chunk),
+                               bump_column="row_version" if table in ROW_VERSIONED_TABLES else None),
+            [v for row in chunk for v in row],
+        )
+        statements += 1
+    return statements
+
+
+def delete_rows_in(cur, table, column, values, where="", params=(), batch_size=None):
+    """DELETE ... WHERE column IN (...) in batches. Returns the number of statements issued."""
+    values = list(values)
+    if not values:
+        return 0
+    batch_size = batch_size or UPSERT_BATCH_SIZE
+    statements = 0
+    for start in range(0, len(values), batch_size):
+        chunk = values[start:start + batch_size]
+        sql = f"DELETE FROM {table} WHERE {column} IN ({','.join(['%s'] * len(chunk))})"
+        if where:
+            sql += f" AND {where}"
+        cur.execute(sql, list(chunk) + list(params))
+        statements += 1
+    return statements
+
+
+@contextmanager
+def pending_changes(domain, match=None):
+    """Take pending keys for a domain; put them back if the write fails."""
+    tracker = changes[domain]
+    upserts, deletes = tracker.take(match)
+    try:
+        yield upserts, deletes
+    except Exception:
+        tracker.restore(upserts, deletes)
+        raise
+
+
+def weather_db_rows(rows):
+    for r in rows:
+        yield (r.date, r.tmax, r.tmin, r.rain, r.et0)
+
+
+@timed("db")
+def save_weather_to_db():
+    """Write only the weather days added, edited or deleted since the last save."""
+    with pending_changes("weather") as (upserts, deletes):
+        if not upserts and not deletes:
+            return
+        rows = [weather_data.get(d) for d in sorted(upserts) if d in weather_data]
+        with db_cursor(commit=True) as cur:
+            delete_rows_in(cur, "weather", "date", sorted(deletes))
+            upsert_rows(
+                cur,
+                "weather",
+                ("date", "tmax", "tmin", "rain", "et0"),
+                weather_db_rows(rows),
+                key_columns=("date",),
+            )
+            version = bump_shared_version(cur, "weather")
+        note_own_write("weather", version)
+
+
+@timed("db")
+def save_archived_weather(archived):
+    """
+    Write edits to days before the loaded window ({date: WeatherDay, or None
+    to delete}) straight to the DB. Only days that differ from the stored
+    copy are written; archived days never enter weather_data.
+    """
+    if not archived:
+        return
+    with db_cursor(commit=True) as cur:
+        stored = {r.date: r for r in read_weather_days(cur, min(archived), max(archived))}
+        rows = [r for d, r in sorted(archived.items()) if r is not None and stored.get(d) != r]
+        deletes = [d for d, r in sorted(archived.items()) if r is None and d in stored]
+        if not rows and not deletes:
+            return
+        delete_rows_in(cur, "weather", "date", deletes)
+        upsert_rows(cur, "weather", ("date", "tmax", "tmin", "rain", "et0"), weather_db_rows(rows), key_columns=("date",))
+        version = bump_shared_version(cur, "weather")
+    note_own_write("weather", version)
+    weather_changed(min(archived))
+
+
+@timed("db")
+def save_block_meta_to_db(block_id):
+    with db_cursor(commit=True) as cur:
+        meta = block_meta[block_id]
+        cut_date = meta["cut_date"] or None
+        if cut_date:
             try:
-                temp_val = round(float(temp_val), 1)
-            except Exception:
-                pass
+                cut_date = datetime.strptime(cut_date, "%Y-%m-%d").date()
+            except ValueError:
+                cut_date = None
+        kc_val = safe_float(meta["kc"])
+        variety = meta["variety"] or None
+        sm_start = soil_manual[block_id].get("start_balance", 120.0)
+        upsert_rows(
+            cur,
+            "blocks_meta",
+            ("block_id", "name", "cut_date", "kc", "variety", "sm_start_balance"),
+            [(block_id, BLOCK_NAMES[block_id - 1], cut_date, kc_val, variety, sm_start)],
+            key_columns=("block_id",),
+        )
+        version = bump_shared_version(cur, "block_meta")
+    note_own_write("block_meta", version)
 
-        rain_val = None
-        precip = d.get("precipitation") or {}
-        if isinstance(precip, dict):
-            rain_val = (
-                precip.get("value")
-                or precip.get("max")
-                or precip.get("min")
+
+def irrigation_db_rows(block_id, rows, week_indexes):
+    for i in sorted(week_indexes):
+        r = rows[i]
+        yield (block_id, i, r.week, r.scheduled, r.actual, r.eff_rain, r.percent, r.comment or None)
+
+
+@timed("db")
+def save_block_irrigation_to_db(block_id):
+    """Write the block's irrigation weeks that changed since the last save."""
+    with pending_changes("blocks", lambda k: k[0] == block_id) as (upserts, _):
+        if not upserts:
+            return
+        with db_cursor(commit=True) as cur:
+            upsert_rows(
+                cur,
+                "irrigation_weeks",
+                ("block_id", "week_index", "week_label", "scheduled", "actual", "eff_rain", "percent", "comment"),
+                irrigation_db_rows(block_id, blocks_data[block_id], {k[1] for k in upserts}),
+                key_columns=("block_id", "week_index"),
             )
-        if rain_val is not None:
-            try:
-                rain_val = round(float(rain_val), 1)
-            except Exception:
-                pass
+            version = bump_shared_version(cur, "blocks")
+        note_own_write("blocks", version)
 
-        symbol_code = None
-        symbol_info = d.get("symbol") or {}
-        if isinstance(symbol_info, dict):
-            symbol_code = symbol_info.get("code") or symbol_info.get("id")
 
-        emoji = "🌤"
-        text = symbol_code or ""
-        if symbol_code:
-            code_lower = symbol_code.lower()
-            if "thunder" in code_lower:
-                emoji = "⛈"
-            elif "rain" in code_lower or "shower" in code_lower:
-                emoji = "🌧"
-            elif "snow" in code_lower:
-                emoji = "❄️"
-            elif "cloud" in code_lower or "fog" in code_lower:
-                emoji = "☁️"
-            elif "sun" in code_lower or "clear" in code_lower:
-                emoji = "☀️"
+@timed("db")
+def save_soil_manual_block_to_db(block_id):
+    """Write the block's soil manual entries that were added, edited or cleared."""
+    with pending_changes("soil_manual", lambda k: k[0] == block_id) as (upserts, deletes):
+        if not upserts and not deletes:
+            return
+        by_date = soil_manual[block_id]["by_date"]
+        rows = []
+        for _, d_str in sorted(upserts):
+            vals = by_date.get(d_str)
+            try:
+                d = datetime.strptime(d_str, "%Y-%m-%d").date()
+            except ValueError:
+                continue
+            if vals is not None:
+                rows.append((block_id, d, vals.get("eff"), vals.get("irr")))
+        deleted = []
+        for _, d_str in sorted(deletes):
+            try:
+                deleted.append(datetime.strptime(d_str, "%Y-%m-%d").date())
+            except ValueError:
+                continue
+        with db_cursor(commit=True) as cur:
+            delete_rows_in(cur, "soil_manual_entries", "date", deleted, where="block_id=%s", params=(block_id,))
+            upsert_rows(
+                cur,
+                "soil_manual_entries",
+                ("block_id", "date", "eff", "irr"),
+                rows,
+                key_columns=("block_id", "date"),
+            )
+            version = bump_shared_version(cur, "soil_manual")
+        note_own_write("soil_manual", version)
 
-        days.append(
-            {
-                "iso_date": iso,
-                "weekday": weekday,
-                "date_short": short_date,
-                "temp": temp_val,
-                "temp_str": f"{temp_val}°C" if temp_val is not None else "-",
-                "rain": rain_val if rain_val is not None else 0,
-                "rain_str": f"{rain_val} mm" if rain_val is not None else "0 mm",
-                "symbol": symbol_code or "",
-                "emoji": emoji,
-                "symbol_text": text,
-            }
+
+def agronomy_db_rows(block_id, rows, week_indexes):
+    for i in sorted(week_indexes):
+        r = rows[i]
+        yield (
+            block_id, i, r.week, r.standard_gain, r.gain, r.cumulative,
+            r.fertigation or None, r.chemigation or None,
         )
 
-        table_rows.append(
-            [
-                short_date,
-                text or "-",
-                f"{temp_val}°C" if temp_val is not None else "-",
-                rain_val if rain_val is not None else "0",
-            ]
+
+@timed("db")
+def save_agronomy_block_to_db(block_id):
+    """Write the block's agronomy weeks that changed since the last save."""
+    with pending_changes("agronomy", lambda k: k[0] == block_id) as (upserts, _):
+        if not upserts:
+            return
+        with db_cursor(commit=True) as cur:
+            upsert_rows(
+                cur,
+                "agronomy_weeks",
+                ("block_id", "week_index", "week_label", "standard_gain", "gain", "cumulative",
+                 "fertigation", "chemigation"),
+                agronomy_db_rows(block_id, agronomy_data[block_id], {k[1] for k in upserts}),
+                key_columns=("block_id", "week_index"),
+            )
+            version = bump_shared_version(cur, "agronomy")
+        note_own_write("agronomy", version)
+
+
+@timed("db")
+def save_pests_to_db():
+    """Write pest records edited or deleted since the last save; insert ones still pending."""
+    with pending_changes("pests") as (upserts, deletes):
+        if not upserts and not deletes:
+            return
+        by_id = {r["id"]: r for r in pests_data if r.get("id") in upserts}
+        with db_cursor(commit=True) as cur:
+            delete_rows_in(cur, "pests_records", "id", sorted(k for k in deletes if k > 0))
+            upsert_rows(
+                cur,
+                "pests_records",
+                ("id", "date", "block_id", "pest", "severity", "area", "action"),
+                [
+                    (r["id"], r["date"], r["block_id"], r["pest"], r["severity"], r["area"], r["action"])
+                    for k, r in sorted(by_id.items()) if k > 0
+                ],
+                key_columns=("id",),
+            )
+            # Records whose first insert failed still carry a temporary id
+            for k, r in sorted(by_id.items()):
+                if k < 0:
+                    insert_pest_record_to_db(r, cur)
+            version = bump_shared_version(cur, "pests")
+        note_own_write("pests", version)
+
+
+@timed("db")
+def insert_ndvi_record_to_db(rec):
+    with db_cursor(commit=True) as cur:
+        cur.execute(
+            """
+            INSERT INTO ndvi_records (date, block_id, ndvi, biomass)
+            VALUES (%s,%s,%s,%s)
+            """,
+            (rec["date"], rec["block_id"], rec["ndvi"], rec["biomass"]),
         )
+        version = bump_shared_version(cur, "ndvi")
+    note_own_write("ndvi", version)
+
+
+@timed("db")
+def insert_pest_record_to_db(rec, cur=None):
+    """Insert a new pest record and store its database id on rec."""
+    if cur is None:
+        with db_cursor(commit=True) as cur:
+            insert_pest_record_to_db(rec, cur)
+            version = bump_shared_version(cur, "pests")
+        note_own_write("pests", version)
+        return
+    cur.execute(
+        """
+        INSERT INTO pests_records (date, block_id, pest, severity, area, action)
+        VALUES (%s,%s,%s,%s,%s,%s)
+        """,
+        (rec["date"], rec["block_id"], rec["pest"], rec["severity"], rec["area"], rec["action"]),
+    )
+    rec["id"] = cur.lastrowid
 
-              # Show both weekday and date on the chart, e.g. "Mon 25 Nov"
-        label = ""
-        if weekday and short_date:
-            label = f"{weekday} {short_date}"
-        else:
-            label = short_date or iso
-        chart_labels.append(label)
 
-        chart_temp.append(temp_val if temp_val is not None else None)
-        chart_rain.append(rain_val if rain_val is not None else 0)
+# ---------------------------------------------------
+# MULTI-WORKER SYNC (shared data versions in MySQL)
+# ---------------------------------------------------
+#
+# Each gunicorn worker holds its own copy of the data. Every save bumps the
+# domain's row in the data_versions table in the same transaction; workers
+# compare those rows with the versions they last loaded (at most once per
+# DATA_SYNC_INTERVAL seconds, at request start) and reload only the domains
+# another worker has written since.
+
+DATA_SYNC_CONFIG = {
+    "interval": float(os.getenv("DATA_SYNC_INTERVAL", 1.0)),   # seconds between version checks
+}
 
-    return {
-        "headers": ["Date", "Symbol", "Temp (°C)", "Rain (mm)"],
-        "rows": table_rows,
-        "days": days,
-        "chart_labels": chart_labels,
-        "chart_temp": chart_temp,
-        "chart_rain": chart_rain,
-    }
+SHARED_DOMAINS = ("weather", "blocks", "agronomy", "block_meta", "soil_manual", "ndvi", "pests")
+
+SHARED_LOADERS = {
+    "weather": load_weather_from_db,
+    "blocks": load_irrigation_from_db,
+    "agronomy": load_agronomy_from_db,
+    "block_meta": load_block_meta_from_db,
+    "soil_manual": load_soil_manual_from_db,
+    "ndvi": load_ndvi_from_db,
+    "pests": load_pests_from_db,
+}
 
-from datetime import date, datetime, timedelta  # you already have these near the top
+# domain -> shared version this worker's memory reflects
+_synced_versions = {}
+_versions_lock = threading.Lock()
+# One sync at a time; never held while a request waits for it
+_sync_lock = threading.Lock()
+_next_sync = 0.0
+sync_stats = {"checks": 0, "reloads": 0, "failures": 0}
 
-def compute_soil_balance(block_id: int):
+
+def bump_shared_version(cur, domain):
+    """Increment a domain's shared version inside the caller's transaction; returns the new value."""
+    return dialect.bump_version(cur, domain)
+
+
+def note_own_write(domain, version):
+    """
+    After a committed save: memory already holds this write, so skip the
+    reload for it - unless another worker wrote in between (version jumped).
     """
-    Compute current soil-moisture balance for a block using the SAME
-    7-day (or from cut date) window logic as the block page:
+    with _versions_lock:
+        if version and _synced_versions.get(domain) == version - 1:
+            _synced_versions[domain] = version
+
+
+@timed("db")
+def read_shared_versions():
+    with db_cursor() as cur:
+        cur.execute("SELECT domain, version FROM data_versions")
+        return {domain: int(version) for domain, version in cur.fetchall()}
+
+
+def sync_data_versions(force=False):
+    """Reload the domains other workers changed. Cheap when nothing did: one SELECT per interval."""
+    global _next_sync
+    if not _loaded_domains:
+        return []
+    now = time.monotonic()
+    if not force and now < _next_sync:
+        return []
+    # Another request is already syncing: serve what we have
+    if not _sync_lock.acquire(blocking=False):
+        return []
+    reloaded = []
+    try:
+        _next_sync = now + DATA_SYNC_CONFIG["interval"]
+        sync_stats["checks"] += 1
+        shared = read_shared_versions()
+        for domain in SHARED_DOMAINS:
+            if domain not in _loaded_domains:
+                continue   # not needed yet; its first load reads the current data
+            version = shared.get(domain, 0)
+            with _versions_lock:
+                if version <= _synced_versions.get(domain, 0):
+                    continue
+            tracker = changes.get(domain)
+            if tracker is not None and (tracker.upserts or tracker.deletes):
+                # Unsaved local edits would be overwritten; the next save retries them
+                continue
+            SHARED_LOADERS[domain]()
+            with _versions_lock:
+                _synced_versions[domain] = max(version, _synced_versions.get(domain, 0))
+            reloaded.append(domain)
+        if reloaded:
+            sync_stats["reloads"] += len(reloaded)
+            print("Reloaded from MySQL (changed by another worker):", ", ".join(reloaded))
+    except Exception as e:
+        sync_stats["failures"] += 1
+        print("Failed to sync data versions:", e)
+    finally:
+        _sync_lock.release()
+    return reloaded
+
+
+@app.route("/admin/data-sync")
+def data_sync_stats():
+    """Shared versions this worker has loaded, and its sync counters."""
+    with _versions_lock:
+        versions = dict(_synced_versions)
+    return jsonify({"pid": os.getpid(), "versions": versions, **sync_stats})
+
+
+# ---------------------------------------------------
+# LOADING (boot preload + lazy per-domain loads)
+# ---------------------------------------------------
+#
+# Schema changes are not part of serving: `flask --app app_fixed2 db upgrade`
+# runs them once per deploy (Procfile release phase). When a gunicorn worker
+# boots, preload_data() checks the schema version and loads PRELOAD_DOMAINS
+# in parallel (gunicorn.conf.py); any other domain is loaded by the first
+# request that needs it.
+
+PRELOAD_CONFIG = {
+    "domains": [
+        d.strip()
+        for d in os.getenv("PRELOAD_DOMAINS", "weather,blocks,agronomy,block_meta,soil_manual").split(",")
+        if d.strip()
+    ],
+    "threads": int(os.getenv("PRELOAD_THREADS", 4)),   # parallel loads (one pooled connection each)
+}
+
+# Loaded together: soil entries share block_meta's lock and version
+_LOAD_WITH = {"block_meta": ("soil_manual",)}
+
+_loaded_domains = set()
+_load_locks = {d: threading.Lock() for d in SHARED_DOMAINS}
+load_timings = {}   # phase -> seconds
+
+
+def load_domain(domain):
+    t0 = time.perf_counter()
+    # Version first: a write landing during the load is picked up by the next sync
+    version = read_shared_versions().get(domain, 0)
+    SHARED_LOADERS[domain]()
+    with _versions_lock:
+        _synced_versions[domain] = version
+    _loaded_domains.add(domain)
+    load_timings[domain] = round(time.perf_counter() - t0, 3)
+    print(f"Loaded {domain} in {load_timings[domain]:.3f} s")
+
+
+def ensure_loaded(*domains):
+    """Load the domains this worker hasn't loaded yet; False if one of them failed."""
+    ok = True
+    for domain in domains:
+        for d in (domain,) + _LOAD_WITH.get(domain, ()):
+            if d in _loaded_domains:
+                continue
+            # Concurrent requests for the same domain wait for one load
+            with _load_locks[d]:
+                if d in _loaded_domains:
+                    continue
+                try:
+                    load_domain(d)
+                except Exception as e:
+                    ok = False
+                    print(f"Failed to load {d} from MySQL:", e)
+    return ok
+
+
+def preload_data(domains=None):
+    """Load domains in parallel at worker boot, logging each phase."""
+    domains = [d for d in (domains or PRELOAD_CONFIG["domains"]) if d in SHARED_LOADERS]
+    t0 = time.perf_counter()
+    try:
+        check_schema()
+    except Exception as e:
+        print("Failed to check schema version:", e)
+    load_timings["schema_check"] = round(time.perf_counter() - t0, 3)
+    threads = max(1, min(PRELOAD_CONFIG["threads"], len(domains)))
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="preload") as pool:
+        results = list(pool.map(ensure_loaded, domains))
+    load_timings["preload"] = round(time.perf_counter() - t0, 3)
+    status = "" if all(results) else " (some domains failed; retried on first use)"
+    print(f"Preloaded {', '.join(domains)} in {load_timings['preload']:.3f} s{status}")
+
+
+db_cli = AppGroup("db", help="Database schema migrations and bulk imports.")
+
+
+@db_cli.command("upgrade")
+def db_upgrade_command():
+    """Apply pending migrations (once per deploy)."""
+    applied = upgrade_schema()
+    print(f"Schema at {max(applied)}." if applied else "Schema already up to date.")
+
+
+@db_cli.command("status")
+def db_status_command():
+    """Show the applied and latest migration versions."""
+    current, latest = check_schema()
+    print(f"Applied: {current}, latest: {latest}")
+
+
+app.cli.add_command(db_cli)
+
+
+@app.before_request
+def check_data_versions():
+    sync_data_versions()
+    # Hand the sync's connection back now rather than at teardown: the pool is
+    # smaller than the thread count, and a long poll would hold it for 30 s.
+    release_request_db(None)
+
+
+@app.route("/admin/boot")
+def boot_stats():
+    """Which domains this worker has loaded and how long each phase took."""
+    return jsonify({"pid": os.getpid(), "loaded": sorted(_loaded_domains), "timings": load_timings})
+
+# ---------------------------------------------------
+# SEASON ARCHIVE (active seasons in memory, history on demand)
+# ---------------------------------------------------
+#
+# A season (plant crop or ratoon) of a block starts at its cut date and
+# runs for DEFAULT_ROWS weeks; blocks_data / agronomy_data hold the active
+# season only. Rolling a block over to a new cut date copies its weeks into
+# the *_archive tables under the old cut date, records the season in
+# `seasons` and starts empty weeks (migration 0006).
+#
+# Daily data (weather, soil entries, NDVI, pests) is loaded from the start
+# of the earliest active season (hot_window["since"]); pages asking for
+# older days read them from the DB by date range through history_cache.
+# Memory and boot time follow the active seasons rather than the history.
+
+ARCHIVE_CONFIG = {
+    "hot_window": os.getenv("ARCHIVE_HOT_WINDOW", "1") == "1",    # 0 = load all history
+    "min_days": int(os.getenv("ARCHIVE_MIN_HOT_DAYS", 42)),       # always loaded (dashboards look back weeks)
+    # Cut dates older than this are seasons nobody rolled over; they don't hold the window open
+    "max_days": int(os.getenv("ARCHIVE_MAX_HOT_DAYS", 7 * (DEFAULT_ROWS + 8))),
+    "history_entries": int(os.getenv("ARCHIVE_HISTORY_ENTRIES", 32)),
+}
+
+HOT_DOMAINS = ("weather", "soil_manual", "ndvi", "pests")
+
+# First day held in memory (None = all of it); set by each daily load
+hot_window = {"since": None}
+
+
+def hot_window_start(cur, today=None):
+    """Monday of the earliest active cut date, but at least min_days back; None when disabled."""
+    if not ARCHIVE_CONFIG["hot_window"]:
+        hot_window["since"] = None
+        return None
+    today = today or date.today()
+    cur.execute(
+        "SELECT MIN(cut_date) FROM blocks_meta WHERE cut_date >= %s",
+        (today - timedelta(days=ARCHIVE_CONFIG["max_days"]),),
+    )
+    first_cut = cur.fetchone()[0]
+    since = today - timedelta(days=ARCHIVE_CONFIG["min_days"])
+    if first_cut:
+        first_cut = import_date(first_cut)  # SQLite gives MIN() of a DATE back as text
+        since = min(since, first_cut - timedelta(days=first_cut.weekday()))
+    hot_window["since"] = since
+    return since
+
+
+def in_archive(start, end=None):
+    """True if the range [start, end] (or the single day start) reaches before the days held in memory."""
+    since = hot_window["since"]
+    return since is not None and any(d is not None and d < since for d in (start, end))
+
+
+def widen_hot_window():
+    """A cut date moved before the loaded window: reload the daily domains from the new start."""
+    since = hot_window["since"]
+    if since is None:
+        return
+    floor = date.today() - timedelta(days=ARCHIVE_CONFIG["max_days"])
+    with reading("block_meta"):
+        starts = [w.first_monday for w in map(block_weeks, range(1, NUM_BLOCKS + 1)) if w]
+    if not any(floor <= d < since for d in starts):
+        return
+    for domain in HOT_DOMAINS:
+        # Same lock as ensure_loaded / imports, so two loads of a domain never overlap
+        with _load_locks[domain]:
+            if domain not in _loaded_domains:
+                continue
+            try:
+                load_domain(domain)
+            except Exception as e:
+                print(f"Failed to reload {domain} for the wider window:", e)
 
-      Balance_today = Balance_start - ΣETc + Σ(Effective Rain + Irrigation)
+
+class HistoryCache:
     """
-    today = date.today()
+    Results of on-demand archive reads, keyed by (what, range). Like the
+    dashboard sections, an entry is reused until its domain's data version
+    moves; the oldest entries are evicted beyond max_entries.
+    """
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, domain, key, build):
+        version = data_versions[domain]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1]
+            self.stats["misses"] += 1
+        # Built under the version read first: a write meanwhile rebuilds it next time
+        value = build()
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), max_entries=self.max_entries)
+
+
+history_cache = HistoryCache(ARCHIVE_CONFIG["history_entries"])
+
+
+def _read_history(reader, start, end):
+    with db_cursor() as cur:
+        return reader(cur, start, end)
+
+
+def weather_history(start, end=None):
+    """WeatherStore of the days in [start, end] read from the DB, archived days included."""
+    def build():
+        store = WeatherStore()
+        store.replace_all(_read_history(read_weather_days, start, end))
+        return store
+    return history_cache.get("weather", ("weather", start, end), build)
+
+
+def ndvi_history(start, end=None):
+    """NDVI records in [start, end] from the DB (date order)."""
+    return history_cache.get("ndvi", ("ndvi", start, end), lambda: _read_history(read_ndvi_records, start, end))
+
+
+def pest_history(start, end=None):
+    """PestIndex over the pest records in [start, end] read from the DB."""
+    return history_cache.get(
+        "pests", ("pests", start, end), lambda: PestIndex(_read_history(read_pest_records, start, end))
+    )
+
+
+def archive_block_totals(domain, table, column):
+    """
+    {block_id: (sum, count)} of `column` over the rows before the loaded
+    window, read from the DB; {} when all of it is loaded or the read fails.
+    """
+    since = hot_window["since"]
+    if since is None:
+        return {}
+
+    def build():
+        with db_cursor() as cur:
+            cur.execute(
+                f"SELECT block_id, SUM({column}), COUNT({column}) FROM {table} WHERE date < %s GROUP BY block_id",
+                (since,),
+            )
+            return {block_id: (safe_float(total) or 0.0, count) for block_id, total, count in cur.fetchall()}
+    try:
+        return history_cache.get(domain, (table, "totals", since), build)
+    except Exception as e:
+        print(f"Failed to read archived {table} totals:", e)
+        return {}
+
+
+def archive_range(since):
+    """(start, end) of the year just before the loaded window, for the pages' "Archive" link."""
+    return (since - timedelta(days=365)).isoformat(), (since - timedelta(days=1)).isoformat()
+
+
+# ------------ SEASONS (rollover + archived weeks) ------------
+
+SEASON_COLUMNS = ("cut_date", "end_date", "ratoon", "variety", "kc", "total_mm", "archived_at")
+IRRIGATION_ARCHIVE_COLUMNS = ("week_label", "scheduled", "actual", "eff_rain", "percent", "comment")
+AGRONOMY_ARCHIVE_COLUMNS = ("week_label", "standard_gain", "gain", "cumulative", "fertigation", "chemigation")
+
+
+def ratoon_label(ratoon):
+    return "Plant crop" if not ratoon else f"Ratoon {ratoon}"
+
+
+@timed("db")
+def block_seasons(block_id):
+    """Archived seasons of a block, newest first."""
+    def build():
+        with db_cursor() as cur:
+            cur.execute(
+                f"SELECT {', '.join(SEASON_COLUMNS)} FROM seasons WHERE block_id = %s ORDER BY cut_date DESC",
+                (block_id,),
+            )
+            return [dict(zip(SEASON_COLUMNS, r)) for r in cur.fetchall()]
+    # Rollovers bump block_meta (the cut date moves)
+    return history_cache.get("block_meta", ("seasons", block_id), build)
+
+
+@timed("db")
+def archived_season(block_id, cut_date):
+    """(irrigation weeks, agronomy weeks) of an archived season, DEFAULT_ROWS each like the active ones."""
+    def build():
+        irrigation = [IrrigationWeek(f"Week {i}") for i in range(1, DEFAULT_ROWS + 1)]
+        agronomy = [AgronomyWeek(f"Week {i}") for i in range(1, DEFAULT_ROWS + 1)]
+        with db_cursor() as cur:
+            cur.execute(
+                "SELECT week_index, week_label, scheduled, actual, eff_rain, percent, comment "
+                "FROM irrigation_weeks_archive WHERE block_id = %s AND cut_date = %s",
+                (block_id, cut_date),
+            )
+            for i, label, sched, actual, eff, pct, comment in cur.fetchall():
+                if 0 <= i < DEFAULT_ROWS:
+                    irrigation[i] = IrrigationWeek(label or irrigation[i].week, safe_float(sched), safe_float(actual),
+                                                   safe_float(eff), safe_float(pct), comment or "")
+            cur.execute(
+                "SELECT week_index, week_label, standard_gain, gain, cumulative, fertigation, chemigation "
+                "FROM agronomy_weeks_archive WHERE block_id = %s AND cut_date = %s",
+                (block_id, cut_date),
+            )
+            for i, label, std_gain, gain, cum, fert, chem in cur.fetchall():
+                if 0 <= i < DEFAULT_ROWS:
+                    agronomy[i] = AgronomyWeek(label or agronomy[i].week, safe_float(std_gain), safe_float(gain),
+                                               safe_float(cum), fert or "", chem or "")
+        return irrigation, agronomy
+    # Archived weeks never change; the key is the season itself
+    return history_cache.get("block_meta", ("season", block_id, cut_date), build)
+
+
+def rollover_season(block_id, new_cut):
+    """
+    Close the block's active season and start the next one at new_cut: its
+    weeks are copied to the archive tables under the old cut date and the
+    active weeks cleared, in one transaction. Returns the archived season
+    row; ValueError if the block can't roll over to that date.
+    """
+    weeks = block_weeks(block_id)
+    if weeks is None:
+        raise ValueError("the block has no cut date to close")
+    if new_cut <= weeks.cut_date:
+        raise ValueError(f"the new cut date must be after {weeks.cut_date.isoformat()}")
+    old_cut = weeks.cut_date
+    with writing("blocks", "agronomy", "block_meta"):
+        # Edits not written yet belong to the season being closed
+        save_block_meta_to_db(block_id)
+        save_block_irrigation_to_db(block_id)
+        save_agronomy_block_to_db(block_id)
+        meta = block_meta[block_id]
+        with db_cursor(commit=True) as cur:
+            cur.execute("SELECT COUNT(*) FROM seasons WHERE block_id = %s AND cut_date < %s", (block_id, old_cut))
+            ratoon = cur.fetchone()[0]
+            cur.execute(
+                "SELECT SUM(COALESCE(actual, 0) + COALESCE(eff_rain, 0)), COUNT(actual) + COUNT(eff_rain) "
+                "FROM irrigation_weeks WHERE block_id = %s",
+                (block_id,),
+            )
+            total, filled = cur.fetchone()
+            season = {
+                "cut_date": old_cut,
+                "end_date": new_cut - timedelta(days=1),
+                "ratoon": ratoon,
+                "variety": meta["variety"] or None,
+                "kc": safe_float(meta["kc"]),
+                "total_mm": round(float(total), 1) if filled else None,
+                "archived_at": datetime.now().replace(microsecond=0),
+            }
+            try:
+                cur.execute(
+                    f"INSERT INTO seasons (block_id, {', '.join(SEASON_COLUMNS)}) "
+                    f"VALUES ({','.join(['%s'] * (len(SEASON_COLUMNS) + 1))})",
+                    (block_id,) + tuple(season.values()),
+                )
+            except Exception as e:
+                if dialect.duplicate_key(e):
+                    raise ValueError(f"a season cut on {old_cut.isoformat()} is already archived")
+                raise
+            for table, columns in (
+                ("irrigation_weeks", IRRIGATION_ARCHIVE_COLUMNS),
+                ("agronomy_weeks", AGRONOMY_ARCHIVE_COLUMNS),
+            ):
+                cols = ", ".join(columns)
+                cur.execute(
+                    f"INSERT INTO {table}_archive (block_id, cut_date, week_index, {cols}) "
+                    f"SELECT block_id, %s, week_index, {cols} FROM {table} WHERE block_id = %s",
+                    (old_cut, block_id),
+                )
+                cur.execute(f"DELETE FROM {table} WHERE block_id = %s", (block_id,))
+            cur.execute("UPDATE blocks_meta SET cut_date = %s WHERE block_id = %s", (new_cut, block_id))
+            versions = {d: bump_shared_version(cur, d) for d in ("blocks", "agronomy", "block_meta")}
+
+        # Fresh weeks for the new season; the old lists stay with any page still rendering them
+        blocks_data[block_id] = [IrrigationWeek(f"Week {i}") for i in range(1, DEFAULT_ROWS + 1)]
+        agronomy_data[block_id] = [AgronomyWeek(f"Week {i}") for i in range(1, DEFAULT_ROWS + 1)]
+        for domain in ("blocks", "agronomy"):
+            changes[domain].take(lambda k: k[0] == block_id)
+        meta["cut_date"] = new_cut.isoformat()
+        soil_engine.invalidate(block_id)
+        bump_version("blocks")
+        bump_version("agronomy")
+        bump_version("block_meta")
+    for domain, version in versions.items():
+        note_own_write(domain, version)
+    return season
+
+
+def season_json(season):
+    return {k: v.isoformat() if isinstance(v, date) else v for k, v in season.items()}
+
+
+@app.route("/block/<int:block_id>/seasons", methods=["GET", "POST"])
+def seasons_page(block_id):
+    if block_id < 1 or block_id > NUM_BLOCKS:
+        return redirect(url_for("index"))
+    ensure_loaded("blocks", "agronomy", "block_meta")
+    error = None
+
+    if request.method == "POST":
+        try:
+            new_cut = import_date(request.form.get("new_cut_date", ""), "new cut date")
+            rollover_season(block_id, new_cut)
+        except ValueError as e:
+            error = str(e)
+        except Exception as e:
+            error = "the season could not be archived"
+            print(f"Failed to roll block {block_id} over:", e)
+        else:
+            return redirect(url_for("block_view", block_id=block_id))
+
+    seasons = block_seasons(block_id)
+    selected = date_arg("season")
+    weeks = None
+    if selected in {s["cut_date"] for s in seasons}:
+        weeks = list(zip(*archived_season(block_id, selected)))
+    else:
+        selected = None
+    with reading("block_meta"):
+        meta = dict(block_meta[block_id])
+
+    return render_template(
+        "seasons.html",
+        today=date.today(),
+        block_id=block_id,
+        block_name=BLOCK_NAMES[block_id - 1],
+        block_names=BLOCK_NAMES,
+        num_blocks=NUM_BLOCKS,
+        meta=meta,
+        active_ratoon=ratoon_label(len(seasons)),
+        seasons=seasons,
+        ratoon_label=ratoon_label,
+        selected=selected,
+        weeks=weeks,
+        error=error,
+    ), (400 if error else 200)
+
+
+@app.route("/api/v1/blocks/<int:block_id>/seasons")
+def seasons_api(block_id):
+    if block_id < 1 or block_id > NUM_BLOCKS:
+        return jsonify({"error": "no such block"}), 404
+    return jsonify([season_json(s) for s in block_seasons(block_id)])
+
+
+@app.route("/api/v1/blocks/<int:block_id>/seasons/<cut_str>")
+def season_weeks_api(block_id, cut_str):
+    if block_id < 1 or block_id > NUM_BLOCKS:
+        return jsonify({"error": "no such block"}), 404
+    try:
+        cut_date = import_date(cut_str, "cut date")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if cut_date not in {s["cut_date"] for s in block_seasons(block_id)}:
+        return jsonify({"error": "no archived season cut on that date"}), 404
+    irrigation, agronomy = archived_season(block_id, cut_date)
+    return jsonify({
+        "cut_date": cut_date.isoformat(),
+        "irrigation": [r.as_dict() for r in irrigation],
+        "agronomy": [r.as_dict() for r in agronomy],
+    })
+
+
+@app.route("/admin/archive")
+def archive_stats():
+    """This worker's loaded window and the on-demand history cache."""
+    since = hot_window["since"]
+    return jsonify({
+        "pid": os.getpid(),
+        "hot_since": since.isoformat() if since else None,
+        "history_cache": history_cache.snapshot(),
+    })
+
+
+# ---------------------------------------------------
+# CSV EXPORT (streamed from the DB in chunks)
+# ---------------------------------------------------
+
+EXPORT_CONFIG = {
+    "chunk_rows": int(os.getenv("EXPORT_CHUNK_ROWS", 2000)),   # rows per fetchmany() / response chunk
+}
+
+# dataset -> (CSV header, SELECT list, FROM, date expression for the range
+# filter, ORDER BY). Block datasets select t.block_id first; the block
+# name is added after it. Weekly rows are dated by the Monday their week
+# starts on, as in BlockWeeks ({week_start}; blank without a cut date).
+# The *_seasons datasets are the archived seasons (m = the season row).
+EXPORT_DATASETS = {
+    "weather": (
+        ("date", "tmax", "tmin", "rain", "et0"),
+        "t.date, t.tmax, t.tmin, t.rain, t.et0",
+        "weather t", "t.date", "t.date",
+    ),
+    "irrigation": (
+        ("block_id", "block", "week_start", "week", "scheduled", "actual", "eff_rain", "percent", "comment"),
+        "t.block_id, {week_start}, t.week_label, t.scheduled, t.actual, t.eff_rain, t.percent, t.comment",
+        "irrigation_weeks t LEFT JOIN blocks_meta m ON m.block_id = t.block_id",
+        "{week_start}", "t.block_id, t.week_index",
+    ),
+    "agronomy": (
+        ("block_id", "block", "week_start", "week", "standard_gain", "gain", "cumulative",
+         "fertigation", "chemigation"),
+        "t.block_id, {week_start}, t.week_label, t.standard_gain, t.gain, t.cumulative, "
+        "t.fertigation, t.chemigation",
+        "agronomy_weeks t LEFT JOIN blocks_meta m ON m.block_id = t.block_id",
+        "{week_start}", "t.block_id, t.week_index",
+    ),
+    "irrigation_seasons": (
+        ("block_id", "block", "season_cut_date", "week_start", "week", "scheduled", "actual", "eff_rain",
+         "percent", "comment"),
+        "t.block_id, t.cut_date, {week_start}, t.week_label, t.scheduled, t.actual, t.eff_rain, t.percent, "
+        "t.comment",
+        "irrigation_weeks_archive t JOIN seasons m ON m.block_id = t.block_id AND m.cut_date = t.cut_date",
+        "{week_start}", "t.block_id, t.cut_date, t.week_index",
+    ),
+    "agronomy_seasons": (
+        ("block_id", "block", "season_cut_date", "week_start", "week", "standard_gain", "gain", "cumulative",
+         "fertigation", "chemigation"),
+        "t.block_id, t.cut_date, {week_start}, t.week_label, t.standard_gain, t.gain, t.cumulative, "
+        "t.fertigation, t.chemigation",
+        "agronomy_weeks_archive t JOIN seasons m ON m.block_id = t.block_id AND m.cut_date = t.cut_date",
+        "{week_start}", "t.block_id, t.cut_date, t.week_index",
+    ),
+    "soil": (
+        ("block_id", "block", "date", "eff_rain", "irrigation"),
+        "t.block_id, t.date, t.eff, t.irr",
+        "soil_manual_entries t", "t.date", "t.block_id, t.date",
+    ),
+    "ndvi": (
+        ("block_id", "block", "date", "ndvi", "biomass"),
+        "t.block_id, t.date, t.ndvi, t.biomass",
+        "ndvi_records t", "t.date", "t.date, t.block_id, t.id",
+    ),
+    "pests": (
+        ("block_id", "block", "date", "pest", "severity", "area", "action"),
+        "t.block_id, t.date, t.pest, t.severity, t.area, t.action",
+        "pests_records t", "t.date", "t.date, t.block_id, t.id",
+    ),
+}
+
+
+def export_filters(args):
+    """(start, end, block ids) from ?start_date=&end_date=&block=; ValueError on bad input."""
+    start = end = None
+    if args.get("start_date", "").strip():
+        start = datetime.strptime(args["start_date"].strip(), "%Y-%m-%d").date()
+    if args.get("end_date", "").strip():
+        end = datetime.strptime(args["end_date"].strip(), "%Y-%m-%d").date()
+    block_ids = sorted({int(v) for v in args.getlist("block") if v.strip()})
+    if any(b < 1 or b > NUM_BLOCKS for b in block_ids):
+        raise ValueError(f"block must be between 1 and {NUM_BLOCKS}")
+    return start, end, block_ids
+
+
+def export_query(dataset, start=None, end=None, block_ids=()):
+    header, select, source, date_expr, order = EXPORT_DATASETS[dataset]
+    week_start = dialect.week_start("m.cut_date", "t.week_index")
+    where, params = [], []
+    if start is not None:
+        where.append(f"{date_expr} >= %s")
+        params.append(start)
+    if end is not None:
+        where.append(f"{date_expr} <= %s")
+        params.append(end)
+    if block_ids and header[0] == "block_id":
+        where.append(f"t.block_id IN ({','.join(['%s'] * len(block_ids))})")
+        params.extend(block_ids)
+    sql = f"SELECT {select} FROM {source}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {order}"
+    return sql.format(week_start=week_start), tuple(params)
+
+
+def export_value(v):
+    if v is None:
+        return ""
+    if isinstance(v, float):
+        return format_num(v)
+    if isinstance(v, date):
+        return v.isoformat()
+    return v
+
+
+def stream_csv(dataset, sql, params, chunk_rows=None):
+    """
+    Yield the CSV in chunks of rows read through a streaming cursor, so
+    memory stays flat however large the export. The generator runs after
+    the request has ended, so it checks out its own connection.
+    """
+    chunk_rows = chunk_rows or EXPORT_CONFIG["chunk_rows"]
+    header = EXPORT_DATASETS[dataset][0]
+    with_block = header[0] == "block_id"
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(header)
+    yield out.getvalue()
+
+    conn = db_pool.checkout()
+    try:
+        cur = dialect.stream_cursor(conn)
+        try:
+            cur.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                out.seek(0)
+                out.truncate()
+                for r in rows:
+                    values = [export_value(v) for v in r]
+                    if with_block:
+                        bid = values[0]
+                        values.insert(1, BLOCK_NAMES[bid - 1] if 1 <= bid <= len(BLOCK_NAMES) else "")
+                    writer.writerow(values)
+                yield out.getvalue()
+        finally:
+            dialect.close_stream(conn, cur)
+    finally:
+        db_pool.release(conn)
+
+
+def export_response(dataset, filename=None):
+    """Streaming CSV response for a dataset, filtered by the request args."""
+    try:
+        start, end, block_ids = export_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    sql, params = export_query(dataset, start, end, block_ids)
+    if filename is None:
+        parts = [dataset]
+        if start or end:
+            parts.append(f"{start or ''}_{end or ''}")
+        if block_ids:
+            parts.append("blocks-" + "-".join(map(str, block_ids)))
+        filename = "_".join(parts) + ".csv"
+    return Response(
+        stream_csv(dataset, sql, params),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
 
-    manual = soil_manual[block_id]
-    meta = block_meta[block_id]
 
-    # Starting balance (TAM-style value you set on the irrigation page)
-    start_balance = manual.get("start_balance", 120.0)
-    balance = float(start_balance)
+# ---------------------------------------------------
+# CSV / EXCEL IMPORT (streamed, validated, batched upserts)
+# ---------------------------------------------------
+#
+# Files use the export's column names (extra columns such as "block" or
+# "week_start" next to "week" are fine). Rows are read one at a time,
+# validated, and written in batches inside one transaction; rejected rows
+# are reported with their line number and skipped. Optional value columns
+# missing from the file are left as they are in the DB. NDVI and pest rows
+# have no natural key and are appended, so rows identical to a stored
+# record (or to an earlier row of the file) are skipped: re-importing the
+# same file adds nothing.
+
+IMPORT_CONFIG = {
+    "batch_rows": int(os.getenv("IMPORT_BATCH_ROWS", 1000)),   # rows buffered per upsert round
+    "max_errors": int(os.getenv("IMPORT_MAX_ERRORS", 100)),    # rejected rows listed in the report
+}
 
-    # Kc for this block
-    kc_val = safe_float(meta.get("kc")) or 1.0
 
-    # Optional cut date
-    cut_dt = None
-    cut_str = meta.get("cut_date") or ""
-    if cut_str:
-        try:
-            cut_dt = datetime.strptime(cut_str, "%Y-%m-%d").date()
-        except ValueError:
-            cut_dt = None
+def _cell(row, *names):
+    """First of the given columns present in the row (None if none is)."""
+    for name in names:
+        if name in row:
+            v = row[name]
+            return "" if v is None else v
+    return None
 
-    # Weather indexed by real date
-    weather_by_date = {r["date"]: r for r in weather_data}
 
-    # 📌 Same window as block page: last 7 days, but not before cut date
-    window_start = today - timedelta(days=6)
-    if cut_dt and cut_dt > window_start:
-        window_start = cut_dt
+def import_date(v, name="date"):
+    if isinstance(v, datetime):
+        return v.date()
+    if isinstance(v, date):
+        return v
+    try:
+        return datetime.strptime(str(v).strip(), "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError(f"{name}: expected YYYY-MM-DD, got {v!r}")
 
-    current = window_start
-    while current <= today:
-        r = weather_by_date.get(current)
-        if r:
-            dstr = r["date_str"]
 
-            # ETc = ET0 * Kc
-            et0_val = safe_float(r.get("et0")) or 0.0
-            etc = et0_val * kc_val
+def import_num(v, name, minimum=None, maximum=None):
+    if v is None or str(v).strip() == "":
+        return None
+    x = safe_float(str(v).strip())
+    if x is None or x != x:
+        raise ValueError(f"{name}: not a number ({v!r})")
+    if (minimum is not None and x < minimum) or (maximum is not None and x > maximum):
+        raise ValueError(f"{name}: {format_num(x)} out of range")
+    return x
+
+
+def import_block(row):
+    v = _cell(row, "block_id")
+    if v not in (None, ""):
+        bid = import_num(v, "block_id")
+        if bid is None or not bid.is_integer() or not 1 <= bid <= NUM_BLOCKS:
+            raise ValueError(f"block_id: {v!r} is not a block (1-{NUM_BLOCKS})")
+        return int(bid)
+    name = str(_cell(row, "block") or "").strip().lower()
+    for i, block_name in enumerate(BLOCK_NAMES):
+        if block_name.lower() == name:
+            return i + 1
+    raise ValueError(f"block: unknown block {name!r}" if name else "block_id or block is required")
+
+
+def import_week(row, block_id):
+    """0-based week index from "week" ("5" or "Week 5 (...)"), else from "week_start"."""
+    label = str(_cell(row, "week") or "")
+    m = re.search(r"\d+", label)
+    if m:
+        i = int(m.group()) - 1
+    elif _cell(row, "week_start"):
+        weeks = block_weeks(block_id)
+        if weeks is None:
+            raise ValueError("week_start: the block has no cut date")
+        i = weeks.index_of(import_date(row["week_start"], "week_start"))
+        if i is None:
+            raise ValueError("week_start: outside the block's season")
+    else:
+        raise ValueError("week or week_start is required")
+    if not 0 <= i < DEFAULT_ROWS:
+        raise ValueError(f"week: {label!r} out of range (1-{DEFAULT_ROWS})")
+    return i
+
+
+def parse_weather_row(row):
+    out = {"date": import_date(_cell(row, "date"))}
+    for col in ("tmax", "tmin"):
+        if col in row:
+            out[col] = import_num(row[col], col, -20, 60)
+    for col in ("rain", "et0"):
+        if col in row:
+            out[col] = import_num(row[col], col, 0, 1000)
+    if out.get("tmax") is not None and out.get("tmin") is not None and out["tmin"] > out["tmax"]:
+        raise ValueError("tmin is above tmax")
+    return out
+
+
+def parse_irrigation_row(row):
+    block_id = import_block(row)
+    i = import_week(row, block_id)
+    out = {"block_id": block_id, "week_index": i, "week_label": f"Week {i + 1}"}
+    for col, names in (("scheduled", ("scheduled",)), ("actual", ("actual",)), ("eff_rain", ("eff_rain", "eff"))):
+        v = _cell(row, *names)
+        if v is not None:
+            out[col] = import_num(v, col, 0, 1000)
+    if "comment" in row:
+        out["comment"] = str(row["comment"] or "").strip() or None
+    return out
+
+
+def parse_agronomy_row(row):
+    block_id = import_block(row)
+    i = import_week(row, block_id)
+    out = {"block_id": block_id, "week_index": i, "week_label": f"Week {i + 1}"}
+    for col in ("standard_gain", "gain"):
+        if col in row:
+            out[col] = import_num(row[col], col, 0, 100)
+    for col in ("fertigation", "chemigation"):
+        if col in row:
+            out[col] = str(row[col] or "").strip()[:100] or None
+    return out
+
+
+def parse_soil_row(row):
+    out = {"block_id": import_block(row), "date": import_date(_cell(row, "date"))}
+    out["eff"] = import_num(_cell(row, "eff_rain", "eff"), "eff_rain", 0, 1000)
+    out["irr"] = import_num(_cell(row, "irrigation", "irr"), "irrigation", 0, 1000)
+    if out["eff"] is None and out["irr"] is None:
+        raise ValueError("eff_rain or irrigation is required")
+    return out
+
+
+def parse_ndvi_row(row):
+    ndvi = import_num(_cell(row, "ndvi"), "ndvi", 0, 1)
+    if ndvi is None:
+        raise ValueError("ndvi is required")
+    biomass = import_num(_cell(row, "biomass"), "biomass", 0)
+    return {
+        "date": import_date(_cell(row, "date")),
+        "block_id": import_block(row),
+        "ndvi": ndvi,
+        "biomass": biomass if biomass is not None else 150.0 * ndvi,
+    }
 
-            # Manual soil P&L entries from irrigation page
-            manual_date = manual.get("by_date", {}).get(dstr, {})
-            eff_val = safe_float(manual_date.get("eff")) or 0.0
-            irr_val = safe_float(manual_date.get("irr")) or 0.0
 
-            # Update balance
-            balance = balance - etc + eff_val + irr_val
+def parse_pest_row(row):
+    pest = str(_cell(row, "pest") or "").strip()
+    if not pest:
+        raise ValueError("pest is required")
+    return {
+        "date": import_date(_cell(row, "date")),
+        "block_id": import_block(row),
+        "pest": pest[:100],
+        "severity": str(_cell(row, "severity") or "").strip()[:20] or None,
+        "area": import_num(_cell(row, "area"), "area", 0),
+        "action": str(_cell(row, "action") or "").strip() or None,
+    }
 
-            # Clamp within 0 – MAX_DEFICIT_BALANCE
-            if balance > MAX_DEFICIT_BALANCE:
-                balance = MAX_DEFICIT_BALANCE
-            if balance < 0:
-                balance = 0
 
-        current += timedelta(days=1)
+# dataset -> (row parser, table, upsert key columns or None to append, shared domain)
+IMPORT_DATASETS = {
+    "weather": (parse_weather_row, "weather", ("date",), "weather"),
+    "irrigation": (parse_irrigation_row, "irrigation_weeks", ("block_id", "week_index"), "blocks"),
+    "agronomy": (parse_agronomy_row, "agronomy_weeks", ("block_id", "week_index"), "agronomy"),
+    "soil": (parse_soil_row, "soil_manual_entries", ("block_id", "date"), "soil_manual"),
+    "ndvi": (parse_ndvi_row, "ndvi_records", None, "ndvi"),
+    "pests": (parse_pest_row, "pests_records", None, "pests"),
+}
 
-    return round(balance, 1)
 
-def soil_pct_color(balance, tam):
+def read_import_rows(stream, filename=""):
     """
-    Return (pct, colour_hex) based on balance/TAM * 100.
-
-    Colour bands:
-      blue       95–100%
-      light blue 90–94%
-      green      70–89%
-      orange     50–69%
-      red        <50%
+    Yield (line number, {column: value}) from a CSV or .xlsx file object,
+    one row at a time. Column names are lower-cased and stripped.
     """
-    if balance is None or tam is None or tam <= 0:
-        return 0.0, "#bdbdbd"  # grey for missing
-
-    pct = (float(balance) / float(tam)) * 100.0
-
-    if pct >= 95:
-        colour = "#1565c0"   # blue
-    elif pct >= 90:
-        colour = "#42a5f5"   # light blue
-    elif pct >= 70:
-        colour = "#2e7d32"   # green
-    elif pct >= 50:
-        colour = "#fb8c00"   # orange
+    if filename.lower().endswith(".xlsx"):
+        try:
+            import openpyxl
+        except ImportError:
+            raise ValueError("Excel import needs openpyxl (pip install openpyxl); upload CSV instead")
+        book = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+        rows = enumerate(book.active.iter_rows(values_only=True), start=1)
     else:
-        colour = "#c62828"   # red
+        text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+        rows = enumerate(csv.reader(text), start=1)
 
-    return pct, colour
+    header = None
+    for line, values in rows:
+        if header is None:
+            header = [str(v or "").strip().lower() for v in values]
+            continue
+        if not any(v not in (None, "") and str(v).strip() for v in values):
+            continue   # blank line
+        # Short rows (trailing cells left off) read as empty cells, so every
+        # row has the header's columns
+        values = list(values) + [None] * (len(header) - len(values))
+        yield line, {name: v for name, v in zip(header, values) if name}
+
+
+def recompute_import_derived(cur, dataset, block_ids):
+    """Derived columns the forms compute: irrigation % of schedule, agronomy cumulative gain."""
+    if not block_ids:
+        return
+    in_blocks = f"block_id IN ({','.join(['%s'] * len(block_ids))})"
+    if dataset == "irrigation":
+        cur.execute(
+            "UPDATE irrigation_weeks SET percent = CASE "
+            "WHEN scheduled > 0 AND (actual IS NOT NULL OR eff_rain IS NOT NULL) "
+            "THEN ROUND((COALESCE(actual, 0) + COALESCE(eff_rain, 0)) / scheduled * 100, 1) "
+            f"ELSE NULL END WHERE {in_blocks}",
+            tuple(block_ids),
+        )
+    elif dataset == "agronomy":
+        cur.execute(
+            f"SELECT block_id, week_index, gain FROM agronomy_weeks WHERE {in_blocks} "
+            "ORDER BY block_id, week_index",
+            tuple(block_ids),
+        )
+        rows, running = [], {}
+        for block_id, week_index, gain in cur.fetchall():
+            cum = None
+            if gain is not None:
+                running[block_id] = running.get(block_id, 0.0) + gain
+                cum = round(running[block_id], 1)
+            rows.append((block_id, week_index, cum))
+        upsert_rows(cur, "agronomy_weeks", ("block_id", "week_index", "cumulative"), rows,
+                    key_columns=("block_id", "week_index"))
+
+
+def stored_import_rows(cur, table, columns, batch):
+    """Rows already in `table` for the batch's blocks and date span, as tuples of `columns`."""
+    b, d = columns.index("block_id"), columns.index("date")
+    block_ids = sorted({r[b] for r in batch})
+    cur.execute(
+        f"SELECT {', '.join(columns)} FROM {table} "
+        f"WHERE block_id IN ({','.join(['%s'] * len(block_ids))}) AND date BETWEEN %s AND %s",
+        (*block_ids, min(r[d] for r in batch), max(r[d] for r in batch)),
+    )
+    return set(cur.fetchall())
 
 
+def reload_imported(domain):
+    """Bring this worker's copy up to date; other workers follow via data_versions."""
+    if domain not in _loaded_domains:
+        return
+    tracker = changes.get(domain)
+    if tracker is not None and (tracker.upserts or tracker.deletes):
+        return   # unsaved local edits: leave it to the next sync, as sync_data_versions does
+    with _load_locks[domain]:
+        load_domain(domain)
 
-# ---------------------------------------------------
-# NEW: MySQL CONFIG + LOAD/SAVE HELPERS
-# ---------------------------------------------------
-def get_db():
+
+@timed("db")
+def import_rows(dataset, rows, dry_run=False):
     """
-    Return a MySQL connection using Aiven SSL settings.
+    Validate and write (line, row dict) pairs for a dataset. Returns a report:
+    rows read, imported, rejected (with the first IMPORT_MAX_ERRORS reasons),
+    and duplicates skipped (NDVI / pests only).
+    Nothing is written if the file cannot be read to the end.
     """
-    return mysql.connect(
-        host=DB_CONFIG["host"],
-        user=DB_CONFIG["user"],
-        password=DB_CONFIG["password"],
-        database=DB_CONFIG["database"],
-        port=DB_CONFIG.get("port", 3306),
-        ssl_ca=None,         # Aiven handles SSL internally
-        ssl_disabled=False   # Force SSL on
-    )
+    parse, table, key_columns, domain = IMPORT_DATASETS[dataset]
+    started = time.perf_counter()
+    report = {"dataset": dataset, "rows": 0, "imported": 0, "rejected": 0, "duplicates": 0,
+              "errors": [], "dry_run": dry_run}
+    batch, columns, block_ids = [], None, set()
+    seen = set()   # appended rows so far, for datasets without a key
+    max_errors = IMPORT_CONFIG["max_errors"]
+
+    def flush(cur):
+        if batch and key_columns is None:
+            stored = stored_import_rows(lookup, table, columns, batch)
+            fresh = []
+            for r in batch:
+                if r in seen or r in stored:
+                    report["duplicates"] += 1
+                else:
+                    seen.add(r)
+                    fresh.append(r)
+            batch[:] = fresh
+        if batch and cur is not None:
+            upsert_rows(cur, table, columns, batch, key_columns=key_columns or ())
+        report["imported"] += len(batch)
+        batch.clear()
+
+    with ExitStack() as stack:
+        cur = None if dry_run else stack.enter_context(db_cursor(commit=True))
+        # A dry run still reads the table so its duplicate count matches a real run
+        lookup = cur if cur is not None or key_columns else stack.enter_context(db_cursor())
+        for line, row in rows:
+            report["rows"] += 1
+            try:
+                values = parse(row)
+            except ValueError as e:
+                report["rejected"] += 1
+                if len(report["errors"]) < max_errors:
+                    report["errors"].append({"line": line, "error": str(e)})
+                continue
+            if columns is None:
+                columns = tuple(values)
+            batch.append(tuple(values[c] for c in columns))
+            if "block_id" in values:
+                block_ids.add(values["block_id"])
+            if len(batch) >= IMPORT_CONFIG["batch_rows"]:
+                flush(cur)
+        flush(cur)
+        if cur is not None and report["imported"]:
+            recompute_import_derived(cur, dataset, sorted(block_ids))
+            bump_shared_version(cur, domain)
+
+    if report["rows"] and not report["imported"] and report["rejected"] == report["rows"]:
+        report["hint"] = "no row was accepted; check the column names against the export"
+    if report["imported"] and not dry_run:
+        reload_imported(domain)
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+@db_cli.command("import")
+@click.argument("dataset", type=click.Choice(sorted(IMPORT_DATASETS)))
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--dry-run", is_flag=True, help="Validate only; write nothing.")
+def db_import_command(dataset, path, dry_run):
+    """Bulk-load a CSV/.xlsx file (same columns as /export/<dataset>.csv)."""
+    ensure_loaded("block_meta")   # week_start columns are resolved against cut dates
+    with open(path, "rb") as f:
+        report = import_rows(dataset, read_import_rows(f, path), dry_run=dry_run)
+    verb = "Validated" if dry_run else "Imported"
+    print(f"{verb} {report['imported']} of {report['rows']} rows in {report['seconds']:.2f} s; "
+          f"rejected {report['rejected']}, skipped {report['duplicates']} duplicates.")
+    for err in report["errors"]:
+        print(f"  line {err['line']}: {err['error']}")
+    if report["rejected"] > len(report["errors"]):
+        print(f"  ... and {report['rejected'] - len(report['errors'])} more")
 
-def init_db():
-    """Create tables if they don't exist and auto-upgrade old schemas."""
-    conn = get_db()
-    cur = conn.cursor()
 
-    # --- WEATHER TABLE ---
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS weather (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            date DATE NOT NULL UNIQUE,
-            tmax DOUBLE NULL,
-            tmin DOUBLE NULL,
-            rain DOUBLE NULL,
-            et0 DOUBLE NULL
-        )
-    """)
-
-    # --- USERS ---
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            username VARCHAR(50) NOT NULL UNIQUE,
-            password_hash VARCHAR(255) NOT NULL,
-            role VARCHAR(20) NOT NULL DEFAULT 'user'
-        )
-    """)
-
-    # --- BLOCKS META ---
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS blocks_meta (
-            block_id INT PRIMARY KEY,
-            name  VARCHAR(50) NOT NULL,
-            cut_date DATE NULL,
-            kc DOUBLE NULL,
-            variety VARCHAR(50) NULL,
-            sm_start_balance DOUBLE NULL
-        )
-    """)
-
-    # --- IRRIGATION WEEKS ---
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS irrigation_weeks (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            block_id INT NOT NULL,
-            week_index INT NOT NULL,
-            week_label VARCHAR(100),
-            scheduled DOUBLE NULL,
-            actual DOUBLE NULL,
-            eff_rain DOUBLE NULL,
-            percent DOUBLE NULL,
-            comment TEXT,
-            UNIQUE KEY uniq_block_week (block_id, week_index)
-        )
-    """)
-
-    # --- SOIL MANUAL ENTRIES ---
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS soil_manual_entries (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            block_id INT NOT NULL,
-            date DATE NOT NULL,
-            eff DOUBLE NULL,
-            irr DOUBLE NULL,
-            UNIQUE KEY uniq_block_date (block_id, date)
-        )
-    """)
-
-    # --- AGRONOMY WEEKS (new schema) ---
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS agronomy_weeks (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            block_id INT NOT NULL,
-            week_index INT NOT NULL,
-            week_label VARCHAR(100),
-            standard_gain DOUBLE NULL,
-            gain DOUBLE NULL,
-            cumulative DOUBLE NULL,
-            fertigation VARCHAR(100),
-            chemigation VARCHAR(100),
-            UNIQUE KEY uniq_agro_block_week (block_id, week_index)
-        )
-    """)
+# ---------------------------------------------------
+# TABLE PAGES (keyset pagination + server-side filters)
+# ---------------------------------------------------
+#
+# The weather and pest tables show one page of editable rows, newest
+# first. Pages are addressed by the key of the last row shown (?before=)
+# or the first (?after=) rather than an offset, so a page costs the same
+# however deep into the history it is, and the edit forms only post the
+# rows on screen.
+
+PAGE_CONFIG = {
+    "weather_rows": int(os.getenv("WEATHER_PAGE_ROWS", 60)),
+    "pest_rows": int(os.getenv("PEST_PAGE_ROWS", 100)),
+    "max_rows": 500,   # cap for ?per_page=
+}
+
 
-    # 🔧 AUTO-UPGRADE: make sure old DBs get the standard_gain column
+def page_size(default):
     try:
-        cur.execute("ALTER TABLE agronomy_weeks ADD COLUMN standard_gain DOUBLE NULL")
-        conn.commit()
-        print("DB migration: added standard_gain column to agronomy_weeks.")
-    except Exception as e:
-        # If the column already exists, MySQL gives error 1060 (duplicate column name) – safe to ignore
-        try:
-            err_no = getattr(e, "errno", None)
-        except Exception:
-            err_no = None
-        if err_no != 1060:
-            print("Warning: could not ensure standard_gain column:", e)
-
-    # --- NDVI ---
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS ndvi_records (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            date DATE NOT NULL,
-            block_id INT NOT NULL,
-            ndvi DOUBLE NOT NULL,
-            biomass DOUBLE NULL
-        )
-    """)
-
-    # --- PESTS ---
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS pests_records (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            date DATE NOT NULL,
-            block_id INT NOT NULL,
-            pest VARCHAR(100) NOT NULL,
-            severity VARCHAR(20),
-            area DOUBLE NULL,
-            action TEXT
-        )
-    """)
+        n = int(request.args.get("per_page", default))
+    except ValueError:
+        n = default
+    return min(max(n, 1), PAGE_CONFIG["max_rows"])
 
-    conn.commit()
-    cur.close()
-    conn.close()
 
-# ------------ LOAD FROM DB INTO MEMORY ------------
+def date_arg(name):
+    """A YYYY-MM-DD query arg as a date (None if missing or invalid)."""
+    try:
+        return datetime.strptime(request.args.get(name, "").strip(), "%Y-%m-%d").date()
+    except ValueError:
+        return None
 
-def load_weather_from_db():
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT date, tmax, tmin, rain, et0 FROM weather ORDER BY date")
-    weather_data.clear()
-    for d, tmax, tmin, rain, et0 in cur.fetchall():
-        d_str = d.strftime("%Y-%m-%d")
-        weather_data.append(
-            {
-                "date": d,
-                "date_str": d_str,
-                "tmax": tmax if tmax is not None else "",
-                "tmin": tmin if tmin is not None else "",
-                "rain": rain if rain is not None else "",
-                "et0": et0 if et0 is not None else "",
-            }
-        )
-    cur.close()
-    conn.close()
-def load_blocks_from_db():
-    # ensure base structure
-    for bid in range(1, NUM_BLOCKS + 1):
-        init_block_rows(bid)
-        init_agronomy_rows(bid)
 
-    conn = get_db()
-    cur = conn.cursor()
+def page_url(endpoint, **changes):
+    """URL of this page with the current filters, some args replaced (None drops one)."""
+    args = request.args.to_dict(flat=False)
+    for name, value in changes.items():
+        args.pop(name, None)
+        if value is not None:
+            args[name] = value
+    return url_for(endpoint, **args)
 
-    # ------------------------------------
-    # LOAD BLOCK META
-    # ------------------------------------
-    cur.execute("SELECT block_id, name, cut_date, kc, variety, sm_start_balance FROM blocks_meta")
-    for block_id, name, cut_date, kc, variety, sm_start_balance in cur.fetchall():
-        if 1 <= block_id <= NUM_BLOCKS:
-            block_meta[block_id]["cut_date"] = cut_date.strftime("%Y-%m-%d") if cut_date else ""
-            block_meta[block_id]["kc"] = "" if kc is None else str(kc)
-            block_meta[block_id]["variety"] = variety or ""
-            if sm_start_balance is not None:
-                soil_manual[block_id]["start_balance"] = float(sm_start_balance)
-
-    # ------------------------------------
-    # LOAD IRRIGATION WEEKS
-    # ------------------------------------
-    cur.execute("""
-        SELECT block_id, week_index, week_label, scheduled, actual, eff_rain, percent, comment
-        FROM irrigation_weeks
-    """)
-    for block_id, week_index, week_label, scheduled, actual, eff_rain, percent, comment in cur.fetchall():
-        if 1 <= block_id <= NUM_BLOCKS and 0 <= week_index < DEFAULT_ROWS:
-            rows = blocks_data[block_id]
-            rows[week_index]["week"] = week_label or rows[week_index]["week"]
-            rows[week_index]["scheduled"] = "" if scheduled is None else str(scheduled)
-            rows[week_index]["actual"] = "" if actual is None else str(actual)
-            rows[week_index]["eff_rain"] = "" if eff_rain is None else str(eff_rain)
-            rows[week_index]["percent"] = "" if percent is None else str(percent)
-            rows[week_index]["comment"] = comment or ""
-
-    # ------------------------------------
-    # LOAD SOIL MANUAL ENTRIES
-    # ------------------------------------
-    cur.execute("SELECT block_id, date, eff, irr FROM soil_manual_entries")
-    for block_id, d, eff, irr in cur.fetchall():
-        if 1 <= block_id <= NUM_BLOCKS:
-            d_str = d.strftime("%Y-%m-%d")
-            soil_manual[block_id]["by_date"][d_str] = {
-                "eff": "" if eff is None else str(eff),
-                "irr": "" if irr is None else str(irr),
-            }
 
-    # ------------------------------------
-    # LOAD AGRONOMY WEEKS
-    # ------------------------------------
-    cur.execute("""
-        SELECT block_id, week_index, week_label, standard_gain, gain, cumulative,
-               fertigation, chemigation
-        FROM agronomy_weeks
-    """)
-
-    for block_id, week_index, week_label, std_gain, gain, cumulative, fert, chem in cur.fetchall():
-        if 1 <= block_id <= NUM_BLOCKS and 0 <= week_index < DEFAULT_ROWS:
-            rows = agronomy_data[block_id]
-            rows[week_index]["week"] = week_label or rows[week_index]["week"]
-            rows[week_index]["standard_gain"] = "" if std_gain is None else str(std_gain)
-            rows[week_index]["gain"] = "" if gain is None else str(gain)
-            rows[week_index]["cumulative"] = "" if cumulative is None else str(cumulative)
-            rows[week_index]["fertigation"] = fert or ""
-            rows[week_index]["chemigation"] = chem or ""
+def pest_cursor(rec):
+    return f"{rec['date'].isoformat()}_{rec['id']}"
 
-    cur.close()
-    conn.close()
 
+def parse_pest_cursor(value):
+    """"YYYY-MM-DD_<id>" -> (date, id) sort key, or None."""
+    d_str, _, id_str = (value or "").partition("_")
+    try:
+        return datetime.strptime(d_str, "%Y-%m-%d").date(), int(id_str)
+    except ValueError:
+        return None
 
 
-def load_ndvi_from_db():
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT date, block_id, ndvi, biomass FROM ndvi_records ORDER BY date, block_id")
-    ndvi_data.clear()
-    for d, block_id, ndvi, biomass in cur.fetchall():
-        ndvi_data.append(
-            {
-                "date": d,
-                "date_str": d.strftime("%Y-%m-%d"),
-                "block_id": block_id,
-                "ndvi": ndvi,
-                "biomass": biomass,
-            }
-        )
-    cur.close()
-    conn.close()
+class PestIndex:
+    """
+    Pest records sorted by (date, id), plus the pest and severity names in
+    use (for the filter lists). Rebuilt on the first read after the pests
+    data version changes; edits replace records, so entries never go stale
+    within a version. Given `records` (archive reads), the index is fixed.
+    """
+
+    def __init__(self, records=None):
+        self._version = None
+        self._keys = []
+        self._records = []
+        self.pests = []
+        self.severities = []
+        self._lock = threading.Lock()
+        self._fixed = records is not None
+        if self._fixed:
+            self._index(records)
+
+    def _index(self, records):
+        records = sorted(records, key=lambda r: (r["date"], r["id"]))
+        self._keys = [(r["date"], r["id"]) for r in records]
+        self._records = records
+        self.pests = sorted({r["pest"] for r in records if r["pest"]}, key=str.lower)
+        self.severities = sorted({r["severity"] for r in records if r["severity"]}, key=str.lower)
+
+    def snapshot(self):
+        with self._lock:
+            if not self._fixed and self._version != data_versions["pests"]:
+                with reading("pests"):
+                    version = data_versions["pests"]
+                    records = list(pests_data)
+                self._index(records)
+                self._version = version
+            return self._keys, self._records
+
+    def page(self, limit, start=None, end=None, block_id=None, pest="", severity="", before=None, after=None):
+        """
+        Up to `limit` records newest first matching the filters, keyset by
+        (date, id) like WeatherStore.page. Returns (records, has_older, has_newer).
+        """
+        keys, records = self.snapshot()
+        lo = bisect_left(keys, (start,)) if start is not None else 0
+        hi = bisect_left(keys, (end + timedelta(days=1),)) if end is not None else len(keys)
+        pest, severity = pest.lower(), severity.lower()
+
+        def match(r):
+            return ((block_id is None or r["block_id"] == block_id)
+                    and (not pest or r["pest"].lower() == pest)
+                    and (not severity or (r["severity"] or "").lower() == severity))
+
+        out = []
+        if after is not None:
+            # Walk up from the cursor, then show newest first
+            for i in range(max(lo, bisect_right(keys, after)), hi):
+                if match(records[i]):
+                    out.append(records[i])
+                    if len(out) > limit:
+                        break
+            has_newer = len(out) > limit
+            return list(reversed(out[:limit])), True, has_newer
+        top = min(hi, bisect_left(keys, before)) if before is not None else hi
+        for i in range(top - 1, lo - 1, -1):
+            if match(records[i]):
+                out.append(records[i])
+                if len(out) > limit:
+                    break
+        return out[:limit], len(out) > limit, before is not None
+
+
+pest_index = PestIndex()
 
 
-def load_pests_from_db():
-    conn = get_db()
-    cur = conn.cursor()
+# ---------------------------------------------------
+# ROW API (one row per call, optimistic concurrency)
+# ---------------------------------------------------
+#
+# GET returns a row with its row_version (also as the ETag). PATCH and
+# DELETE must send that version back (If-Match header, or "row_version"
+# in the JSON body) and are applied with a single-row
+# UPDATE/DELETE ... WHERE row_version = <sent>. If someone else saved the
+# row in between, nothing is written and 409 returns the current row.
+# Weeks and soil entries that were never stored have version 0; a PATCH
+# with version 0 creates them.
+
+class RowConflict(Exception):
+    def __init__(self, current):
+        super().__init__("row changed since it was read")
+        self.current = current
+
+
+def expected_row_version(body):
+    """The version the client last read, from If-Match or the body; None if not sent."""
+    tags = [t for t in request.if_match.as_set() if t.isdigit()] if request.if_match else []
+    if tags:
+        return int(tags[0])
+    v = body.get("row_version")
+    if isinstance(v, int) or (isinstance(v, str) and v.isdigit()):
+        return int(v)
+    return None
+
+
+def fetch_row(cur, table, columns, key):
+    where = " AND ".join(f"{c} = %s" for c in key)
+    cur.execute(f"SELECT {', '.join(columns)}, row_version FROM {table} WHERE {where}", tuple(key.values()))
+    r = cur.fetchone()
+    return dict(zip(tuple(columns) + ("row_version",), r)) if r else None
+
+
+def update_row(cur, table, key, values, expected):
+    """UPDATE one row at `expected` version; returns the new version, or None if it changed or is gone."""
+    sets = "".join(f"{c} = %s, " for c in values)
+    where = " AND ".join(f"{c} = %s" for c in key)
     cur.execute(
-        "SELECT date, block_id, pest, severity, area, action FROM pests_records ORDER BY date, block_id"
+        f"UPDATE {table} SET {sets}row_version = row_version + 1 WHERE {where} AND row_version = %s",
+        tuple(values.values()) + tuple(key.values()) + (expected,),
     )
-    pests_data.clear()
-    for d, block_id, pest, severity, area, action in cur.fetchall():
-        pests_data.append(
-            {
-                "date": d,
-                "date_str": d.strftime("%Y-%m-%d"),
-                "block_id": block_id,
-                "pest": pest,
-                "severity": severity,
-                "area": area,
-                "action": action,
-            }
-        )
-    cur.close()
-    conn.close()
+    return expected + 1 if cur.rowcount == 1 else None
 
 
-# ------------ SAVE / UPSERT HELPERS ------------
-
-def save_weather_to_db():
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM weather")
-    for r in weather_data:
-        d = r["date"]
-        tmax = safe_float(r.get("tmax"))
-        tmin = safe_float(r.get("tmin"))
-        rain = safe_float(r.get("rain"))
-        et0 = safe_float(r.get("et0"))
+def insert_row(cur, table, key, values):
+    """Create a row that had version 0; None if someone created it first."""
+    columns = tuple(key) + tuple(values)
+    try:
         cur.execute(
-            "INSERT INTO weather (date, tmax, tmin, rain, et0) VALUES (%s,%s,%s,%s,%s)",
-            (d, tmax, tmin, rain, et0),
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({','.join(['%s'] * len(columns))})",
+            tuple(key.values()) + tuple(values.values()),
         )
-    conn.commit()
-    cur.close()
-    conn.close()
+    except Exception as e:
+        if dialect.duplicate_key(e):
+            return None
+        raise
+    return 1
 
 
-def save_block_meta_to_db(block_id):
-    conn = get_db()
-    cur = conn.cursor()
-    meta = block_meta[block_id]
-    cut_date = meta["cut_date"] or None
-    if cut_date:
+def delete_row(cur, table, key, expected):
+    where = " AND ".join(f"{c} = %s" for c in key)
+    cur.execute(f"DELETE FROM {table} WHERE {where} AND row_version = %s", tuple(key.values()) + (expected,))
+    return cur.rowcount == 1
+
+
+def write_row(cur, table, columns, key, values, expected, create=False):
+    """
+    Apply a PATCH: single-row update (or insert from version 0 when
+    `create`). Returns the stored row; raises RowConflict or LookupError.
+    """
+    if expected == 0 and create:
+        version = insert_row(cur, table, key, values)
+    else:
+        version = update_row(cur, table, key, values, expected)
+    row = fetch_row(cur, table, columns, key)
+    if version is None:
+        if row is None and not create:
+            raise LookupError("no such row")
+        raise RowConflict(row)
+    return row
+
+
+def row_fields(row):
+    return {k: v.isoformat() if isinstance(v, date) else v for k, v in row.items()} if row else row
+
+
+def row_json(row, status=200):
+    resp = jsonify(row_fields(row))
+    resp.status_code = status
+    if row and row.get("row_version") is not None:
+        resp.set_etag(str(row["row_version"]))
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+
+def row_api(handler):
+    """Shared request plumbing: JSON body, version precondition, error mapping."""
+    @functools.wraps(handler)
+    def view(*args, **kwargs):
+        body = request.get_json(silent=True) if request.method != "GET" else {}
+        if body is None:
+            body = {}
+        if not isinstance(body, dict):
+            return jsonify({"error": "JSON object expected"}), 400
+        expected = None
+        if request.method != "GET":
+            expected = expected_row_version(body)
+            if expected is None:
+                return jsonify({"error": "send the row_version you read (If-Match or JSON row_version)"}), 428
         try:
-            cut_date = datetime.strptime(cut_date, "%Y-%m-%d").date()
-        except ValueError:
-            cut_date = None
-    kc_val = safe_float(meta["kc"])
-    variety = meta["variety"] or None
-    sm_start = soil_manual[block_id].get("start_balance", 120.0)
-    cur.execute(
-        """
-        REPLACE INTO blocks_meta (block_id, name, cut_date, kc, variety, sm_start_balance)
-        VALUES (%s,%s,%s,%s,%s,%s)
-        """,
-        (block_id, BLOCK_NAMES[block_id - 1], cut_date, kc_val, variety, sm_start),
-    )
-    conn.commit()
-    cur.close()
-    conn.close()
+            return handler(*args, body=body, expected=expected, **kwargs)
+        except RowConflict as e:
+            return jsonify({"error": "row changed since it was read", "current": row_fields(e.current)}), 409
+        except LookupError as e:
+            return jsonify({"error": str(e)}), 404
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    return view
+
+
+def patch_values(body, fields):
+    """{column: value} for the PATCH fields present in the body, validated by their parsers."""
+    unknown = set(body) - set(fields) - {"row_version"}
+    if unknown:
+        raise ValueError(f"unknown field(s): {', '.join(sorted(unknown))}")
+    return {col: parse(body[col]) for col, parse in fields.items() if col in body}
+
+
+def text_field(limit=None):
+    return lambda v: (str(v).strip()[:limit] if v is not None else "") or None
+
+
+WEATHER_COLUMNS = ("date", "tmax", "tmin", "rain", "et0")
+WEATHER_PATCH_FIELDS = {
+    "tmax": lambda v: import_num(v, "tmax", -20, 60),
+    "tmin": lambda v: import_num(v, "tmin", -20, 60),
+    "rain": lambda v: import_num(v, "rain", 0, 1000),
+    "et0": lambda v: import_num(v, "et0", 0, 1000),
+}
 
 
-def save_block_irrigation_to_db(block_id):
-    conn = get_db()
-    cur = conn.cursor()
-    rows = blocks_data[block_id]
-    for i, r in enumerate(rows):
-        week_label = r["week"]
-        scheduled = safe_float(r.get("scheduled"))
-        actual = safe_float(r.get("actual"))
-        eff_rain = safe_float(r.get("eff_rain"))
-        percent = safe_float(r.get("percent"))
-        comment = r.get("comment") or None
-        cur.execute(
-            """
-            REPLACE INTO irrigation_weeks
-            (block_id, week_index, week_label, scheduled, actual, eff_rain, percent, comment)
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-            """,
-            (block_id, i, week_label, scheduled, actual, eff_rain, percent, comment),
-        )
-    conn.commit()
-    cur.close()
-    conn.close()
+@app.route("/api/v1/weather/<d_str>", methods=["GET", "PATCH", "DELETE"])
+@row_api
+def weather_row_api(d_str, body, expected):
+    d = import_date(d_str)
+    key = {"date": d}
+    if request.method == "GET":
+        with db_cursor() as cur:
+            row = fetch_row(cur, "weather", WEATHER_COLUMNS, key)
+        if row is None:
+            raise LookupError("no weather for that date")
+        return row_json(row)
+
+    values = patch_values(body, WEATHER_PATCH_FIELDS) if request.method == "PATCH" else {}
+    ensure_loaded("weather")
+    with writing("weather"):
+        with db_cursor(commit=True) as cur:
+            if values:
+                # Check the row as it will be stored, not just the fields sent
+                merged = {**(fetch_row(cur, "weather", WEATHER_COLUMNS, key) or {}), **values}
+                if merged.get("tmax") is not None and merged.get("tmin") is not None and merged["tmin"] > merged["tmax"]:
+                    raise ValueError("tmin is above tmax")
+            if request.method == "DELETE":
+                if not delete_row(cur, "weather", key, expected):
+                    row = fetch_row(cur, "weather", WEATHER_COLUMNS, key)
+                    raise RowConflict(row) if row else LookupError("no weather for that date")
+                row = None
+            else:
+                row = write_row(cur, "weather", WEATHER_COLUMNS, key, values, expected)
+            version = bump_shared_version(cur, "weather")
+        changes["weather"].discard(d)
+        # Archived days live only in the DB (see weather_page)
+        if not in_archive(d):
+            if row is None:
+                weather_data.delete(d)
+            else:
+                weather_data.upsert(WeatherDay(d, safe_float(row["tmax"]), safe_float(row["tmin"]),
+                                               safe_float(row["rain"]), safe_float(row["et0"])))
+        weather_changed(d)
+    note_own_write("weather", version)
+    return row_json(row) if row else ("", 204)
+
+
+IRRIGATION_COLUMNS = ("block_id", "week_index", "week_label", "scheduled", "actual", "eff_rain", "percent", "comment")
+IRRIGATION_FIELDS = {
+    "scheduled": lambda v: import_num(v, "scheduled", 0, 1000),
+    "actual": lambda v: import_num(v, "actual", 0, 1000),
+    "eff_rain": lambda v: import_num(v, "eff_rain", 0, 1000),
+    "comment": text_field(),
+}
 
 
-def save_soil_manual_block_to_db(block_id):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM soil_manual_entries WHERE block_id=%s", (block_id,))
-    for d_str, vals in soil_manual[block_id]["by_date"].items():
-        try:
-            d = datetime.strptime(d_str, "%Y-%m-%d").date()
-        except ValueError:
-            continue
-        eff = safe_float(vals.get("eff"))
-        irr = safe_float(vals.get("irr"))
-        cur.execute(
-            """
-            INSERT INTO soil_manual_entries (block_id, date, eff, irr)
-            VALUES (%s,%s,%s,%s)
-            """,
-            (block_id, d, eff, irr),
-        )
-    conn.commit()
-    cur.close()
-    conn.close()
+def irrigation_percent(scheduled, actual, eff_rain):
+    """% of schedule, as the block form computes it."""
+    if not scheduled or (actual is None and eff_rain is None):
+        return None
+    return round(((actual or 0) + (eff_rain or 0)) / scheduled * 100, 1)
 
 
-def save_agronomy_block_to_db(block_id):
-    conn = get_db()
-    cur = conn.cursor()
-    rows = agronomy_data[block_id]
-    for i, r in enumerate(rows):
-        week_label = r["week"]
-        std_gain = safe_float(r.get("standard_gain"))
-        gain = safe_float(r.get("gain"))
-        cumulative = safe_float(r.get("cumulative"))
-        fert = r.get("fertigation") or None
-        chem = r.get("chemigation") or None
-        cur.execute(
-            """
-            REPLACE INTO agronomy_weeks
-            (block_id, week_index, week_label,standard_gain, gain, cumulative, fertigation, chemigation)
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-            """,
-            (block_id, i, week_label, std_gain, gain, cumulative, fert, chem),
-        )
-    conn.commit()
-    cur.close()
-    conn.close()
+@app.route("/api/v1/blocks/<int:block_id>/irrigation/<int:week>", methods=["GET", "PATCH"])
+@row_api
+def irrigation_row_api(block_id, week, body, expected):
+    """One irrigation week (week is 1-based, as on the page)."""
+    if not (1 <= block_id <= NUM_BLOCKS and 1 <= week <= DEFAULT_ROWS):
+        raise LookupError("no such block/week")
+    key = {"block_id": block_id, "week_index": week - 1}
+    ensure_loaded("blocks")
+    init_block_rows(block_id)
+    with reading("blocks"):
+        mem = blocks_data[block_id][week - 1]
+    unsaved = {"block_id": block_id, "week_index": week - 1, "week_label": mem.week, "scheduled": mem.scheduled,
+               "actual": mem.actual, "eff_rain": mem.eff_rain, "percent": mem.percent,
+               "comment": mem.comment or None, "row_version": 0}
+    if request.method == "GET":
+        with db_cursor() as cur:
+            row = fetch_row(cur, "irrigation_weeks", IRRIGATION_COLUMNS, key)
+        return row_json(row or unsaved)
+
+    values = patch_values(body, IRRIGATION_FIELDS)
+    with writing("blocks"):
+        with db_cursor(commit=True) as cur:
+            current = fetch_row(cur, "irrigation_weeks", IRRIGATION_COLUMNS, key) or unsaved
+            if current["row_version"] != expected:
+                raise RowConflict(current)
+            merged = {**current, **values}
+            if expected == 0:
+                values = {c: merged[c] for c in ("week_label", "scheduled", "actual", "eff_rain", "comment")}
+            values["percent"] = irrigation_percent(merged["scheduled"], merged["actual"], merged["eff_rain"])
+            row = write_row(cur, "irrigation_weeks", IRRIGATION_COLUMNS, key, values, expected, create=True)
+            version = bump_shared_version(cur, "blocks")
+        changes["blocks"].discard((block_id, week - 1))
+        rows = list(blocks_data[block_id])
+        rows[week - 1] = IrrigationWeek(mem.week, safe_float(row["scheduled"]), safe_float(row["actual"]),
+                                        safe_float(row["eff_rain"]), safe_float(row["percent"]), row["comment"] or "")
+        blocks_data[block_id] = rows
+        bump_version("blocks")
+    note_own_write("blocks", version)
+    return row_json(row)
 
 
-def insert_ndvi_record_to_db(rec):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO ndvi_records (date, block_id, ndvi, biomass)
-        VALUES (%s,%s,%s,%s)
-        """,
-        (rec["date"], rec["block_id"], rec["ndvi"], rec["biomass"]),
-    )
-    conn.commit()
-    cur.close()
-    conn.close()
+SOIL_COLUMNS = ("block_id", "date", "eff", "irr")
+SOIL_FIELDS = {
+    "eff": lambda v: import_num(v, "eff", 0, 1000),
+    "irr": lambda v: import_num(v, "irr", 0, 1000),
+}
 
 
-def insert_pest_record_to_db(rec):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO pests_records (date, block_id, pest, severity, area, action)
-        VALUES (%s,%s,%s,%s,%s,%s)
-        """,
-        (rec["date"], rec["block_id"], rec["pest"], rec["severity"], rec["area"], rec["action"]),
-    )
-    conn.commit()
-    cur.close()
-    conn.close()
+@app.route("/api/v1/blocks/<int:block_id>/soil/<d_str>", methods=["GET", "PATCH", "DELETE"])
+@row_api
+def soil_row_api(block_id, d_str, body, expected):
+    """One soil manual entry (effective rain / irrigation) of a block on a date."""
+    if not 1 <= block_id <= NUM_BLOCKS:
+        raise LookupError("no such block")
+    d = import_date(d_str)
+    d_str = d.isoformat()
+    key = {"block_id": block_id, "date": d}
+    if request.method == "GET":
+        with db_cursor() as cur:
+            row = fetch_row(cur, "soil_manual_entries", SOIL_COLUMNS, key)
+        return row_json(row or {"block_id": block_id, "date": d, "eff": None, "irr": None, "row_version": 0})
+
+    values = patch_values(body, SOIL_FIELDS) if request.method == "PATCH" else {}
+    ensure_loaded("block_meta")
+    with writing("block_meta"):
+        with db_cursor(commit=True) as cur:
+            if request.method == "DELETE":
+                if not delete_row(cur, "soil_manual_entries", key, expected):
+                    row = fetch_row(cur, "soil_manual_entries", SOIL_COLUMNS, key)
+                    raise RowConflict(row) if row else LookupError("no soil entry for that date")
+                row = None
+            else:
+                row = write_row(cur, "soil_manual_entries", SOIL_COLUMNS, key, values, expected, create=True)
+            version = bump_shared_version(cur, "soil_manual")
+        changes["soil_manual"].discard((block_id, d_str))
+        by_date = soil_manual[block_id]["by_date"]
+        if row is None:
+            by_date.pop(d_str, None)
+        else:
+            by_date[d_str] = {"eff": safe_float(row["eff"]), "irr": safe_float(row["irr"])}
+        invalidate_soil_from(block_id, d_str)
+        bump_version("block_meta")
+    note_own_write("soil_manual", version)
+    return row_json(row) if row else ("", 204)
 
 
-# ---------------------------------------------------
-# LOAD DATA ONCE WHEN APP STARTS
-# ---------------------------------------------------
+PEST_COLUMNS = ("id", "date", "block_id", "pest", "severity", "area", "action")
 
-# Flask 3.x compatibility: load DB once
-db_loaded = False
 
-@app.before_request
-def startup_load():
-    global db_loaded
-    if not db_loaded:
-        try:
-            init_db()
-            load_weather_from_db()
-            load_blocks_from_db()
-            load_ndvi_from_db()
-            load_pests_from_db()
-            print("MySQL data loaded into memory.")
-            db_loaded = True
-        except Exception as e:
-            print("DB init/load failed:", e)
+def _pest_block(v):
+    bid = import_num(v, "block_id", 1, NUM_BLOCKS)
+    if bid is None or not bid.is_integer():
+        raise ValueError("block_id: a block number is required")
+    return int(bid)
+
+
+def _pest_name(v):
+    name = str(v or "").strip()[:100]
+    if not name:
+        raise ValueError("pest: cannot be empty")
+    return name
+
+
+PEST_FIELDS = {
+    "date": lambda v: import_date(v),
+    "block_id": _pest_block,
+    "pest": _pest_name,
+    "severity": text_field(20),
+    "area": lambda v: import_num(v, "area", 0),
+    "action": text_field(),
+}
+
+
+@app.route("/api/v1/pests/<int:rec_id>", methods=["GET", "PATCH", "DELETE"])
+@row_api
+def pest_row_api(rec_id, body, expected):
+    key = {"id": rec_id}
+    if request.method == "GET":
+        with db_cursor() as cur:
+            row = fetch_row(cur, "pests_records", PEST_COLUMNS, key)
+        if row is None:
+            raise LookupError("no such pest record")
+        return row_json(row)
+
+    values = patch_values(body, PEST_FIELDS) if request.method == "PATCH" else {}
+    ensure_loaded("pests")
+    with writing("pests"):
+        with db_cursor(commit=True) as cur:
+            if request.method == "DELETE":
+                if not delete_row(cur, "pests_records", key, expected):
+                    row = fetch_row(cur, "pests_records", PEST_COLUMNS, key)
+                    raise RowConflict(row) if row else LookupError("no such pest record")
+                row = None
+            else:
+                row = write_row(cur, "pests_records", PEST_COLUMNS, key, values, expected)
+            version = bump_shared_version(cur, "pests")
+        changes["pests"].discard(rec_id)
+        # One slot replaced (or removed) in place; records themselves are never mutated
+        i = next((i for i, r in enumerate(pests_data) if r.get("id") == rec_id), None)
+        if row is None:
+            if i is not None:
+                del pests_data[i]
+        else:
+            rec = {
+                "id": rec_id, "date": row["date"], "date_str": row["date"].strftime("%Y-%m-%d"),
+                "block_id": row["block_id"], "pest": row["pest"], "severity": row["severity"],
+                "area": row["area"], "action": row["action"],
+            }
+            if i is None:
+                pests_data.append(rec)
+            else:
+                pests_data[i] = rec
+        bump_version("pests")
+    note_own_write("pests", version)
+    return row_json(row) if row else ("", 204)
+
 
 # ---------------------------------------------------
 # ROUTES
@@ -1069,188 +4348,100 @@ def startup_load():
 def login():
     return redirect(url_for("index"))
 
-@app.route("/")
-def index():
-    today = date.today()
-    view_mode = request.args.get("view", "week")  # "week" or "season"
-
-    # Big-screen flag (?tv=1)
-    tv_mode = request.args.get("tv", "0") == "1"
-
-    # ---------------------------
-    # 1. Latest 7 weather rows
-    # ---------------------------
-    latest_rows = sorted(weather_data, key=lambda x: x["date"], reverse=True)[:7]
-    latest_rows = list(reversed(latest_rows))
-    weather_row_count = len(latest_rows)
-
-    # ---------------------------
-    # 2. Current month summary
-    # ---------------------------
-    monthly = defaultdict(lambda: {"tmax": [], "tmin": [], "rain": [], "et0": []})
-    for r in weather_data:
-        d = r.get("date")
-        if not isinstance(d, date):
-            continue
-        if d.year == today.year and d.month == today.month:
-            for field in ["tmax", "tmin", "rain", "et0"]:
-                v = safe_float(r.get(field))
-                if v is not None:
-                    monthly[(d.year, d.month)][field].append(v)
+# ---------------------------------------------------
+# DASHBOARD SECTIONS (cached per date / view / filters)
+# ---------------------------------------------------
 
+def section_weather(today):
+    # Latest 7 weather rows + current month summary
+    latest_rows = weather_data.last(7)
     monthly_stats = []
-    vals = monthly.get((today.year, today.month))
-    if vals:
-        avg_tmax = round(sum(vals["tmax"]) / len(vals["tmax"]), 1) if vals["tmax"] else None
-        avg_tmin = round(sum(vals["tmin"]) / len(vals["tmin"]), 1) if vals["tmin"] else None
-        sum_rain = round(sum(vals["rain"]), 1) if vals["rain"] else None
-        if vals["et0"]:
-            avg_et0 = round(sum(vals["et0"]) / len(vals["et0"]), 2)
-            cum_et0 = round(sum(vals["et0"]), 2)
-        else:
-            avg_et0 = None
-            cum_et0 = None
-        monthly_stats.append(
-            {
-                "label": f"{today.year}-{today.month:02d}",
-                "avg_tmax": avg_tmax,
-                "avg_tmin": avg_tmin,
-                "sum_rain": sum_rain,
-                "avg_et0": avg_et0,
-                "cum_et0": cum_et0,
-            }
-        )
+    current_month = weather_data.month_summary(today.year, today.month)
+    if current_month is not None:
+        monthly_stats.append(current_month)
+    return {
+        "weather_rows": latest_rows,
+        "weather_row_count": len(latest_rows),
+        "monthly_stats": monthly_stats,
+    }
 
-    # ---------------------------
-    # 3. Block performance (weekly % or season total)
-    # ---------------------------
-    comparison_labels = []
-    comparison_values = []
-    comparison_colors = []
 
-    for block_id in range(1, NUM_BLOCKS + 1):
+def block_performance(block_ids, today, view_mode):
+    """(labels, values, colours) of weekly % or season totals for the given blocks."""
+    labels = []
+    values = []
+    colors = []
+    for block_id in block_ids:
         name = BLOCK_NAMES[block_id - 1]
         if view_mode == "week":
             pct = current_week_percent(block_id, today)
             if pct is None:
                 continue
-            comparison_labels.append(name)
-            comparison_values.append(pct)
-            comparison_colors.append(pct_color(pct))
+            labels.append(name)
+            values.append(pct)
+            colors.append(pct_color(pct))
         else:  # season totals
             total_mm = season_total_mm(block_id)
             if total_mm is None:
                 continue
-            comparison_labels.append(name)
-            comparison_values.append(total_mm)
-            comparison_colors.append("#2e7d32")  # green bars for totals
-    if view_mode == "week":
-        comparison_title = "Irrigation Block Performance – Weekly % of Schedule"
-        comparison_y_label = "% of scheduled water"
+            labels.append(name)
+            values.append(total_mm)
+            colors.append("#2e7d32")  # green bars for totals
+    return labels, values, colors
+
+
+def section_comparison(today, view):
+    labels, values, colors = block_performance(range(1, NUM_BLOCKS + 1), today, view)
+    if view == "week":
+        title = "Irrigation Block Performance – Weekly % of Schedule"
+        y_label = "% of scheduled water"
     else:
-        comparison_title = "Irrigation Block Performance – Season Total Applied Water (mm)"
-        comparison_y_label = "Total depth (mm)"
+        title = "Irrigation Block Performance – Season Total Applied Water (mm)"
+        y_label = "Total depth (mm)"
+    return {
+        "comparison_labels": labels,
+        "comparison_values": values,
+        "comparison_colors": colors,
+        "comparison_title": title,
+        "comparison_y_label": y_label,
+    }
 
-    # ---------------------------
-    # 3B. PREVIOUS WEEK IRRIGATION
-    # ---------------------------
-    prev_irrig_labels, prev_irrig_values, prev_irrig_colors = extract_irrigation_previous_week(today)
 
-    # ---------------------------
-    # 4. Filtered blocks chart (max 6)
-    # ---------------------------
-    selected_ids = []
+def section_filter(today, view, filters):
+    # Filtered blocks chart (max 6); default: first 6 blocks if no filter chosen
+    block_ids = filters or range(1, min(NUM_BLOCKS, 6) + 1)
+    labels, values, colors = block_performance(block_ids, today, view)
+    return {"filter_labels": labels, "filter_values": values, "filter_colors": colors}
 
-  
-    for val in request.args.getlist("filter_block"):
-        try:
-            bid = int(val)
-        except ValueError:
-            continue
-        if 1 <= bid <= NUM_BLOCKS:
-            selected_ids.append(bid)
-    selected_ids = selected_ids[:6]
-
-    filter_labels = []
-    filter_values = []
-    filter_colors = []
-
-    if selected_ids:
-        for bid in selected_ids:
-            name = BLOCK_NAMES[bid - 1]
-            if view_mode == "week":
-                pct = current_week_percent(bid, today)
-                if pct is None:
-                    continue
-                filter_labels.append(name)
-                filter_values.append(pct)
-                filter_colors.append(pct_color(pct))
-            else:
-                total_mm = season_total_mm(bid)
-                if total_mm is None:
-                    continue
-                filter_labels.append(name)
-                filter_values.append(total_mm)
-                filter_colors.append("#2e7d32")
-    else:
-        # Default: show first 6 blocks if no filter chosen
-        for bid in range(1, min(NUM_BLOCKS, 6) + 1):
-            name = BLOCK_NAMES[bid - 1]
-            if view_mode == "week":
-                pct = current_week_percent(bid, today)
-                if pct is None:
-                    continue
-                filter_labels.append(name)
-                filter_values.append(pct)
-                filter_colors.append(pct_color(pct))
-            else:
-                total_mm = season_total_mm(bid)
-                if total_mm is None:
-                    continue
-                filter_labels.append(name)
-                filter_values.append(total_mm)
-                filter_colors.append("#2e7d32")
 
-    # ---------------------------
-    # 5. 7-day forecast (with dates)
-    # ---------------------------
-    fc = fetch_forecast()
-    forecast_headers = fc["headers"]
-    forecast_rows = fc["rows"]
-    forecast_days = fc["days"]
-    forecast_chart_labels = fc["chart_labels"]
-    forecast_chart_temp = fc["chart_temp"]
-    forecast_chart_rain = fc["chart_rain"]
-    # ---------------------------
-    # 5B. PREVIOUS WEEK WEATHER (CALENDAR)
-    # ---------------------------
+def section_prev_irrigation(today):
+    labels, values, colors = extract_irrigation_previous_week(today)
+    return {"prev_irrig_labels": labels, "prev_irrig_values": values, "prev_irrig_colors": colors}
+
+
+def section_prev_weather(today):
     prev_mon, prev_sun = get_previous_week_window(today)
-    prev_weather_rows = extract_weather_range(prev_mon, prev_sun)
+    rows = extract_weather_range(prev_mon, prev_sun)
+    return {
+        "prev_weather_rows": rows,
+        "prev_weather_chart_labels": [r.date_str for r in rows],
+        "prev_weather_chart_temp": [r.tmax for r in rows],
+        "prev_weather_chart_rain": [r.rain if r.rain is not None else 0 for r in rows],
+    }
 
-    prev_weather_chart_labels = [r["date_str"] for r in prev_weather_rows]
-    prev_weather_chart_temp = [
-        safe_float(r["tmax"]) if safe_float(r["tmax"]) is not None else None
-        for r in prev_weather_rows
-    ]
-    prev_weather_chart_rain = [
-        safe_float(r["rain"]) if safe_float(r["rain"]) is not None else 0
-        for r in prev_weather_rows
-    ]
 
-        # ---------------------------
-    # 6. Agronomy snapshot arrays
-    # ---------------------------
+def section_agronomy(today):
+    # Agronomy snapshot arrays + growth snapshot
     agro_labels = []
     agro_standard = []
     agro_weekly = []
     agro_cum = []
-    agro_colors = []        # ← ADD THIS ONE
-
-
+    agro_colors = []
+    growth_by_block = {}
 
     for block_id in range(1, NUM_BLOCKS + 1):
         name = BLOCK_NAMES[block_id - 1]
-        standard_gain,weekly_gain, cum_height = agronomy_weekly_and_cum(block_id, today)
+        standard_gain, weekly_gain, cum_height = agronomy_weekly_and_cum(block_id, today)
 
         # Store values (0 if missing, so chart still draws)
         agro_labels.append(name)
@@ -1268,16 +4459,27 @@ def index():
             agro_colors.append("#1565c0")      # blue
         else:
             agro_colors.append("#c62828")      # red
-    # ---------------------------
-    # 6B. PREVIOUS WEEK AGRONOMY
-    # ---------------------------
-    prev_agro_labels, prev_agro_weekly, prev_agro_cum =  extract_agronomy_previous_week(today)
-
-    # ---------------------------
-    # 7. Latest soil moisture balance (per block)
-    # ---------------------------
-    latest_balances = {}
 
+        growth_by_block[name] = {"weekly_gain": weekly_gain, "cumulative": cum_height}
+
+    return {
+        "agro_labels": agro_labels,
+        "agro_standard": agro_standard,
+        "agro_weekly": agro_weekly,
+        "agro_cum": agro_cum,
+        "agro_colors": agro_colors,
+        "growth_by_block": growth_by_block,
+    }
+
+
+def section_prev_agronomy(today):
+    labels, weekly, cum = extract_agronomy_previous_week(today)
+    return {"prev_agro_labels": labels, "prev_agro_weekly": weekly, "prev_agro_cum": cum}
+
+
+def section_soil(today):
+    # Latest soil moisture balance (per block)
+    latest_balances = {}
     for block_id in range(1, NUM_BLOCKS + 1):
         name = BLOCK_NAMES[block_id - 1]
 
@@ -1297,12 +4499,20 @@ def index():
             "pct": round(pct, 1),
             "color": colour
         }
-    # ---------------------------
-    # 8. NDVI averages by block
-    # ---------------------------
+    return {"latest_balances": latest_balances}
+
+
+def section_ndvi(today):
+    # NDVI averages by block: archived seasons from the DB, the rest from memory
     ndvi_sum = defaultdict(float)
     ndvi_count = defaultdict(int)
+    for block_id, (total, c) in archive_block_totals("ndvi", "ndvi_records", "ndvi").items():
+        if 1 <= block_id <= NUM_BLOCKS and c:
+            ndvi_sum[BLOCK_NAMES[block_id - 1]] += total
+            ndvi_count[BLOCK_NAMES[block_id - 1]] += c
     for rec in ndvi_data:
+        if in_archive(rec["date"]):
+            continue   # counted in the archive totals
         name = BLOCK_NAMES[rec["block_id"] - 1]
         v = safe_float(rec.get("ndvi"))
         if v is not None:
@@ -1314,244 +4524,495 @@ def index():
         c = ndvi_count[name]
         if c > 0:
             avg_ndvi_by_block[name] = round(total / c, 3)
+    return {"avg_ndvi_by_block": avg_ndvi_by_block}
 
-    # ---------------------------
-    # 9. Pest counts per block
-    # ---------------------------
+
+def section_pests(today):
+    # Pest counts per block, archived seasons included
     pest_counts = defaultdict(int)
+    for block_id, (_, c) in archive_block_totals("pests", "pests_records", "id").items():
+        if 1 <= block_id <= NUM_BLOCKS and c:
+            pest_counts[BLOCK_NAMES[block_id - 1]] += c
     for rec in pests_data:
+        if in_archive(rec["date"]):
+            continue   # edited archive records; counted in the archive totals
         name = BLOCK_NAMES[rec["block_id"] - 1]
         pest_counts[name] += 1
+    return {"pest_counts": pest_counts}
+
+
+# name -> (builder, data domains it reads, request args it depends on).
+# "block_meta" covers cut date / Kc / variety and the soil start balance + manual entries.
+DASHBOARD_SECTIONS = {
+    "weather": (section_weather, ("weather",), ()),
+    "comparison": (section_comparison, ("blocks", "block_meta"), ("view",)),
+    "filter": (section_filter, ("blocks", "block_meta"), ("view", "filters")),
+    "prev_irrigation": (section_prev_irrigation, ("blocks", "block_meta"), ()),
+    "prev_weather": (section_prev_weather, ("weather",), ()),
+    "agronomy": (section_agronomy, ("agronomy", "block_meta"), ()),
+    "prev_agronomy": (section_prev_agronomy, ("agronomy", "block_meta"), ()),
+    "soil": (section_soil, ("weather", "block_meta"), ()),
+    "ndvi": (section_ndvi, ("ndvi",), ()),
+    "pests": (section_pests, ("pests",), ()),
+}
+
+
+class DashboardCache:
+    """
+    Built dashboard sections keyed by (section, date, its request args).
+    Each entry remembers data_versions of the domains it read; a write
+    that bumps one of those domains makes only the dependent sections
+    rebuild on the next hit. Oldest entries are evicted beyond max_entries.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, name, today, args):
+        return self._entry(name, today, args)[1]
+
+    def get_json(self, name, today, args):
+        """(JSON body, strong ETag) of a section, serialised once per build."""
+        entry = self._entry(name, today, args)
+        if entry[2] is None:
+            entry[2] = json_body_and_etag(entry[1])
+        return entry[2]
+
+    def _entry(self, name, today, args):
+        builder, domains, params = DASHBOARD_SECTIONS[name]
+        key = (name, today) + tuple(args[p] for p in params)
+        versions = tuple(data_versions[d] for d in domains)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == versions:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry
+            self.stats["misses"] += 1
+
+        # [versions, section dict, (json body, etag) or None until asked for]
+        ensure_loaded(*domains)
+        with reading(*domains):
+            versions = tuple(data_versions[d] for d in domains)
+            with timer("section_build", name):
+                entry = [versions, builder(today, **{p: args[p] for p in params}), None]
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), max_entries=self.max_entries)
+
+
+dashboard_cache = DashboardCache(int(os.getenv("DASHBOARD_CACHE_ENTRIES", 256)))
+
+# Seconds between chart refreshes through the JSON API on the dashboard (0 = off)
+DASHBOARD_REFRESH_SECONDS = int(os.getenv("DASHBOARD_REFRESH_SECONDS", 60))
+
+
+def _json_default(o):
+    if isinstance(o, Record):
+        return o.as_dict()
+    if isinstance(o, date):
+        return o.isoformat()
+    raise TypeError(f"{type(o).__name__} is not JSON serialisable")
+
+
+def json_body_and_etag(value):
+    """
+    Canonical JSON for an API payload plus a strong ETag from its hash.
+    Hashing the bytes (not process-local version counters) keeps ETags
+    identical across gunicorn workers holding the same data.
+    """
+    body = json.dumps(value, default=_json_default, sort_keys=True, separators=(",", ":"))
+    return body, hashlib.sha1(body.encode("utf-8")).hexdigest()
+
+
+def dashboard_args():
+    """Request args the dashboard sections depend on: view mode + filter set (max 6)."""
+    selected_ids = []
+    for val in request.args.getlist("filter_block"):
+        try:
+            bid = int(val)
+        except ValueError:
+            continue
+        if 1 <= bid <= NUM_BLOCKS:
+            selected_ids.append(bid)
+    return {"view": request.args.get("view", "week"), "filters": tuple(selected_ids[:6])}
+
+
+def dashboard_json(name, today, args):
+    if name == "forecast":
+        return json_body_and_etag(fetch_forecast())
+    return dashboard_cache.get_json(name, today, args)
+
+
+def conditional_json(body, etag):
+    """JSON response with a strong ETag; 304 when If-None-Match matches."""
+    resp = Response(body, mimetype="application/json")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"   # may be stored, must revalidate
+    return resp.make_conditional(request)
+
+
+@app.route("/api/v1/dashboard/<section>")
+def dashboard_api(section):
+    """One dashboard section as JSON (?view=, ?filter_block= as on the page)."""
+    if section != "forecast" and section not in DASHBOARD_SECTIONS:
+        return jsonify({"error": f"unknown section {section!r}"}), 404
+    body, etag = dashboard_json(section, date.today(), dashboard_args())
+    return conditional_json(body, etag)
+
+
+# ---------------------------------------------------
+# PUSH EVENTS (SSE + long-poll) – "these sections changed"
+# ---------------------------------------------------
+
+EVENTS_CONFIG = {
+    "heartbeat": float(os.getenv("SSE_HEARTBEAT", 15)),       # comment line to keep proxies from timing out
+    "max_stream": float(os.getenv("SSE_MAX_SECONDS", 300)),   # streams end; EventSource reconnects itself
+    "backlog": int(os.getenv("SSE_BACKLOG", 256)),            # events kept for Last-Event-ID catch-up
+}
+
+
+class EventBus:
+    """
+    In-process change notifications for push clients. Each publish()
+    names the data domains that changed and the dashboard sections fed
+    by them; subscribers block in wait() until something newer arrives.
+
+    Event ids are "<epoch>-<seq>", epoch being random per process. A
+    client reconnecting with an id from another worker/process, or one
+    too old for the backlog, gets a single "resync" event listing every
+    section (refetching is cheap: unchanged sections answer 304).
+    """
+
+    def __init__(self, backlog=256):
+        self.epoch = os.urandom(4).hex()
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=backlog)   # (seq, payload)
+        self.seq = 0
+        self.stats = {"published": 0, "subscribers": 0}
+
+    def event_id(self, seq):
+        return f"{self.epoch}-{seq}"
+
+    def publish(self, domains):
+        sections = sorted(
+            name for name, (_, deps, _) in DASHBOARD_SECTIONS.items() if set(deps) & set(domains)
+        )
+        with self._cond:
+            self.seq += 1
+            payload = {"id": self.event_id(self.seq), "domains": sorted(domains), "sections": sections}
+            self._events.append((self.seq, payload))
+            self.stats["published"] += 1
+            self._cond.notify_all()
+
+    def cursor(self, last_id):
+        """Sequence to continue from for a client's last event id; None means it must resync."""
+        if not last_id:
+            return self.seq
+        epoch, _, seq = last_id.partition("-")
+        try:
+            seq = int(seq)
+        except ValueError:
+            return None
+        if epoch != self.epoch or seq > self.seq:
+            return None
+        return seq
+
+    def wait(self, seq, timeout):
+        """(events after seq, new seq), blocking up to timeout for the first one."""
+        with self._cond:
+            if seq is None:
+                return [self._resync()], self.seq
+            self._cond.wait_for(lambda: self.seq > seq, timeout)
+            if self.seq == seq:
+                return [], seq
+            oldest = self._events[0][0] if self._events else self.seq + 1
+            if seq + 1 < oldest:
+                return [self._resync()], self.seq
+            return [p for s, p in self._events if s > seq], self.seq
+
+    def _resync(self):
+        sections = sorted(DASHBOARD_SECTIONS) + ["forecast"]
+        return {"id": self.event_id(self.seq), "domains": [], "sections": sections, "resync": True}
+
+    def subscribe(self, delta):
+        with self._cond:
+            self.stats["subscribers"] += delta
+
+    def snapshot(self):
+        with self._cond:
+            return dict(self.stats, seq=self.seq, epoch=self.epoch)
 
-    # ---------------------------
-    # 10. Growth snapshot (optional)
-    # ---------------------------
-    growth_by_block = {}
-    for block_id in range(1, NUM_BLOCKS + 1):
-        # agronomy_weekly_and_cum now returns (standard, weekly, cumulative)
-        _, weekly_gain, cum_height = agronomy_weekly_and_cum(block_id, today)
-        growth_by_block[BLOCK_NAMES[block_id - 1]] = {
-            "weekly_gain": weekly_gain,
-            "cumulative": cum_height,
-        }
 
-    # ----------------------------------------------------
-    # RETURN TEMPLATE
-    # ----------------------------------------------------
+event_bus = EventBus(EVENTS_CONFIG["backlog"])
+
+
+@app.after_request
+def announce_changes(response):
+    domains = g.pop("changed_domains", None)
+    if domains:
+        event_bus.publish(domains)
+    return response
+
+
+def sse_stream(seq):
+    heartbeat = EVENTS_CONFIG["heartbeat"]
+    deadline = time.monotonic() + EVENTS_CONFIG["max_stream"]
+    event_bus.subscribe(+1)
+    try:
+        yield "retry: 3000\n\n"
+        last_sent = time.monotonic()
+        while time.monotonic() < deadline:
+            # A worker serving only streams sees no requests; check for
+            # other workers' writes here (throttled, one stream does it).
+            sync_data_versions()
+            events, seq = event_bus.wait(seq, min(heartbeat, DATA_SYNC_CONFIG["interval"]))
+            for ev in events:
+                yield f"id: {ev['id']}\nevent: changed\ndata: {json.dumps(ev)}\n\n"
+            if events:
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= heartbeat:
+                yield ": ping\n\n"
+                last_sent = time.monotonic()
+    finally:
+        event_bus.subscribe(-1)
+
+
+@app.route("/api/v1/events")
+def events_stream():
+    """
+    Server-Sent Events: one "changed" event per write naming the dashboard
+    sections to refetch. Idle streams only wait on a condition, so run
+    gunicorn with gevent (see gunicorn.conf.py) to hold many per worker.
+    """
+    seq = event_bus.cursor(request.headers.get("Last-Event-ID") or request.args.get("last_id"))
+    resp = Response(sse_stream(seq), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"   # nginx: don't buffer the stream
+    return resp
+
+
+@app.route("/api/v1/events/poll")
+def events_poll():
+    """Long-poll fallback: ?since=<event id>; waits up to ?timeout= seconds (max 30) for changes."""
+    since = request.args.get("since", "")
+    try:
+        timeout = min(max(float(request.args.get("timeout", 25)), 0.0), 30.0)
+    except ValueError:
+        timeout = 25.0
+    if not since:
+        # First call only learns where the stream is
+        return jsonify({"id": event_bus.event_id(event_bus.seq), "events": []})
+    events, seq = event_bus.wait(event_bus.cursor(since), timeout)
+    resp = jsonify({"id": event_bus.event_id(seq), "events": events})
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+
+@app.route("/admin/events")
+def events_stats():
+    return jsonify(event_bus.snapshot())
+
+
+@app.route("/admin/dashboard-cache")
+def dashboard_cache_stats():
+    return jsonify(dashboard_cache.snapshot())
+
+
+@app.route("/")
+def index():
+    today = date.today()
+    view_mode = request.args.get("view", "week")  # "week" or "season"
+
+    # Big-screen flag (?tv=1)
+    tv_mode = request.args.get("tv", "0") == "1"
+
+    args = dashboard_args()
+    context = {}
+    for name in DASHBOARD_SECTIONS:
+        with timer("section", name):
+            context.update(dashboard_cache.get(name, today, args))
+
+    # 7-day forecast has its own background-refreshed cache
+    fc = fetch_forecast()
+
+    # Starting ETags so the page's refresh loop only downloads what changed
+    section_etags = {}
+    if DASHBOARD_REFRESH_SECONDS:
+        section_etags = {name: dashboard_json(name, today, args)[1] for name in DASHBOARD_SECTIONS}
+        section_etags["forecast"] = json_body_and_etag(fc)[1]
+
     return render_template(
         "index.html",
         today=today,
-        weather_rows=latest_rows,
-        weather_row_count=weather_row_count,
-        monthly_stats=monthly_stats,
         block_names=BLOCK_NAMES,
-        comparison_labels=comparison_labels,
-        comparison_values=comparison_values,
-        comparison_title=comparison_title,
-        comparison_y_label=comparison_y_label,
-        comparison_colors=comparison_colors,
         view_mode=view_mode,
-        forecast_headers=forecast_headers,
-        forecast_rows=forecast_rows,
-        forecast_days=forecast_days,
-        forecast_chart_labels=forecast_chart_labels,
-        forecast_chart_temp=forecast_chart_temp,
-        forecast_chart_rain=forecast_chart_rain,
-        filter_labels=filter_labels,
-        filter_values=filter_values,
-        filter_colors=filter_colors,
-        filter_selected_ids=selected_ids,
-        agro_labels=agro_labels,
-        agro_standard=agro_standard,
-        agro_weekly=agro_weekly,
-        agro_cum=agro_cum,
-        agro_colors=agro_colors,
+        forecast_headers=fc["headers"],
+        forecast_rows=fc["rows"],
+        forecast_days=fc["days"],
+        forecast_chart_labels=fc["chart_labels"],
+        forecast_chart_temp=fc["chart_temp"],
+        forecast_chart_rain=fc["chart_rain"],
+        filter_selected_ids=list(args["filters"]),
         num_blocks=NUM_BLOCKS,
-        latest_balances=latest_balances,
-        avg_ndvi_by_block=avg_ndvi_by_block,
-        pest_counts=pest_counts,
-        growth_by_block=growth_by_block,
-        # Previous week irrigation
-        prev_irrig_labels=prev_irrig_labels,
-        prev_irrig_values=prev_irrig_values,
-        prev_irrig_colors=prev_irrig_colors,
-        # Previous week weather
-        prev_weather_rows=prev_weather_rows,
-        prev_weather_chart_labels=prev_weather_chart_labels,
-        prev_weather_chart_temp=prev_weather_chart_temp,
-        prev_weather_chart_rain=prev_weather_chart_rain,
-        # Previous week agronomy
-        prev_agro_labels=prev_agro_labels,
-        prev_agro_weekly=prev_agro_weekly,
-        prev_agro_cum=prev_agro_cum,
         tv_mode=tv_mode,
+        refresh_seconds=DASHBOARD_REFRESH_SECONDS,
+        section_etags=section_etags,
+        **context,
     )
+
+
 # --------- WEATHER DATA MANAGEMENT PAGE ---------
 @app.route("/weather", methods=["GET", "POST"])
 def weather_page():
     today = date.today()
+    ensure_loaded("weather")
 
     # -------------------------
     # 1. Handle POST (add/edit)
     # -------------------------
     if request.method == "POST":
         action = request.form.get("action")
-
-        if action == "add_weather":
-            d_str = request.form.get("weather_date", "").strip()
-            tmax = request.form.get("tmax", "").strip()
-            tmin = request.form.get("tmin", "").strip()
-            rain = request.form.get("rain", "").strip()
-            et0 = request.form.get("et0", "").strip()
-
-            if d_str:
-                try:
-                    d_obj = datetime.strptime(d_str, "%Y-%m-%d").date()
-                except ValueError:
-                    d_obj = None
-
-                if d_obj is not None:
-                    weather_data.append(
-                        {
-                            "date": d_obj,
-                            "date_str": d_str,
-                            "tmax": tmax,
-                            "tmin": tmin,
-                            "rain": rain,
-                            "et0": et0,
-                        }
-                    )
-
-        elif action == "edit_weather":
-            # Build a dict of ALL existing rows keyed by date_str
-            existing = {r["date_str"]: r for r in weather_data}
-
-            try:
-                row_count = int(request.form.get("row_count", "0"))
-            except ValueError:
-                row_count = 0
-
-            for i in range(row_count):
-                d_str = request.form.get(f"date_{i}", "").strip()
-                tmax = request.form.get(f"tmax_{i}", "").strip()
-                tmin = request.form.get(f"tmin_{i}", "").strip()
-                rain = request.form.get(f"rain_{i}", "").strip()
-                et0 = request.form.get(f"et0_{i}", "").strip()
-                delete_flag = request.form.get(f"delete_{i}")
-
-                # If row is marked delete and exists → remove it
-                if delete_flag == "on":
-                    if d_str in existing:
-                        existing.pop(d_str, None)
-                    continue
-
-                # If date is missing, skip
-                if not d_str:
-                    continue
-
+        tracker = changes["weather"]
+        archived = {}   # days before the loaded window: written to the DB only
+
+        with writing("weather"):
+            if action == "add_weather":
+                d_str = request.form.get("weather_date", "").strip()
+                tmax = request.form.get("tmax", "").strip()
+                tmin = request.form.get("tmin", "").strip()
+                rain = request.form.get("rain", "").strip()
+                et0 = request.form.get("et0", "").strip()
+
+                if d_str:
+                    try:
+                        d_obj = datetime.strptime(d_str, "%Y-%m-%d").date()
+                    except ValueError:
+                        d_obj = None
+
+                    if d_obj is not None:
+                        row = WeatherDay(d_obj, safe_float(tmax), safe_float(tmin), safe_float(rain), safe_float(et0))
+                        if in_archive(d_obj):
+                            archived[d_obj] = row
+                        else:
+                            # One row per day: adding an existing date overwrites it
+                            weather_data.upsert(row)
+                            tracker.touch(d_obj)
+                            weather_changed(d_obj)
+
+            elif action == "edit_weather":
+                # Rows are applied to the store one by one; untouched days stay put
                 try:
-                    d_obj = datetime.strptime(d_str, "%Y-%m-%d").date()
+                    row_count = int(request.form.get("row_count", "0"))
                 except ValueError:
-                    continue
-
-                # Upsert this date into the dict
-                existing[d_str] = {
-                    "date": d_obj,
-                    "date_str": d_str,
-                    "tmax": tmax,
-                    "tmin": tmin,
-                    "rain": rain,
-                    "et0": et0,
-                }
+                    row_count = 0
 
-            # Replace global weather_data with ALL rows (edited + untouched)
-            weather_data.clear()
-            weather_data.extend(sorted(existing.values(), key=lambda x: x["date"]))
+                for i in range(row_count):
+                    d_str = request.form.get(f"date_{i}", "").strip()
+                    tmax = request.form.get(f"tmax_{i}", "").strip()
+                    tmin = request.form.get(f"tmin_{i}", "").strip()
+                    rain = request.form.get(f"rain_{i}", "").strip()
+                    et0 = request.form.get(f"et0_{i}", "").strip()
+                    delete_flag = request.form.get(f"delete_{i}")
 
-        # Persist to MySQL
-        try:
-            save_weather_to_db()
-        except Exception as e:
-            print("Failed to save weather to DB:", e)
+                    # If date is missing or invalid, skip
+                    if not d_str:
+                        continue
 
-        # After POST, go back to clean GET (no duplicate submissions)
-        return redirect(url_for("weather_page"))
+                    try:
+                        d_obj = datetime.strptime(d_str, "%Y-%m-%d").date()
+                    except ValueError:
+                        continue
+
+                    row = WeatherDay(d_obj, safe_float(tmax), safe_float(tmin), safe_float(rain), safe_float(et0))
+                    # Archived days are compared with the DB copy when saved
+                    if in_archive(d_obj):
+                        archived[d_obj] = None if delete_flag == "on" else row
+                        continue
+
+                    # If row is marked delete and exists → remove it
+                    if delete_flag == "on":
+                        if weather_data.delete(d_obj) is not None:
+                            tracker.remove(d_obj)
+                            weather_changed(d_obj)
+                        continue
+
+                    if weather_data.get(d_obj) == row:
+                        continue  # unchanged row – nothing to write
+
+                    # Upsert this date into the store
+                    weather_data.upsert(row)
+                    tracker.touch(d_obj)
+                    weather_changed(d_obj)
+
+            # Persist to MySQL (only the rows touched above)
+            try:
+                save_weather_to_db()
+            except Exception as e:
+                print("Failed to save weather to DB:", e)
+            try:
+                save_archived_weather(archived)
+            except Exception as e:
+                print("Failed to save archived weather to DB:", e)
 
-    # -------------------------
-    # 2. Base rows (sorted)
-    # -------------------------
-    rows = sorted(weather_data, key=lambda x: x["date"])
+        # After POST, go back to clean GET (same filters and page)
+        return redirect(url_for("weather_page", **request.args.to_dict(flat=False)))
 
     # -------------------------
-    # 3. Date filter (GET)
+    # 2. Date filter + page (GET)
     # -------------------------
     start_date_str = request.args.get("start_date", "").strip()
     end_date_str = request.args.get("end_date", "").strip()
-    start_dt = end_dt = None
-
-    if start_date_str:
-        try:
-            start_dt = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-        except ValueError:
-            start_dt = None
-
-    if end_date_str:
-        try:
-            end_dt = datetime.strptime(end_date_str, "%Y-%m-%d").date()
-        except ValueError:
-            end_dt = None
-
-    if start_dt:
-        rows = [r for r in rows if r["date"] >= start_dt]
-    if end_dt:
-        rows = [r for r in rows if r["date"] <= end_dt]
+    start_dt = date_arg("start_date")
+    end_dt = date_arg("end_date")
 
-    row_count = len(rows)
-
-    # -------------------------
-    # 4. Monthly stats (FROM FILTERED ROWS)
-    # -------------------------
-    monthly = defaultdict(lambda: {"tmax": [], "tmin": [], "rain": [], "et0": []})
-    for r in rows:
-        d = r["date"]
-        y, m = d.year, d.month
-        key = (y, m)
-        for field in ["tmax", "tmin", "rain", "et0"]:
-            v = safe_float(r.get(field))
-            if v is not None:
-                monthly[key][field].append(v)
-
-    monthly_stats = []
-    for (y, m), vals in monthly.items():
-        label = f"{y}-{m:02d}"
-        avg_tmax = round(sum(vals["tmax"]) / len(vals["tmax"]), 1) if vals["tmax"] else None
-        avg_tmin = round(sum(vals["tmin"]) / len(vals["tmin"]), 1) if vals["tmin"] else None
-        sum_rain = round(sum(vals["rain"]), 1) if vals["rain"] else None
-        if vals["et0"]:
-            avg_et0 = round(sum(vals["et0"]) / len(vals["et0"]), 2)
-            cum_et0 = round(sum(vals["et0"]), 2)
-        else:
-            avg_et0 = None
-            cum_et0 = None
+    # Ranges reaching before the loaded window are read from the DB
+    archived = in_archive(start_dt, end_dt)
+    store = weather_history(start_dt, end_dt) if archived else weather_data
 
-        monthly_stats.append(
-            {
-                "label": label,
-                "avg_tmax": avg_tmax,
-                "avg_tmin": avg_tmin,
-                "sum_rain": sum_rain,
-                "avg_et0": avg_et0,
-                "cum_et0": cum_et0,
-            }
+    with reading("weather"):
+        # -------------------------
+        # 3. One page of rows in range, newest first (bisected from the store)
+        # -------------------------
+        rows, has_older, has_newer = store.page(
+            page_size(PAGE_CONFIG["weather_rows"]), start_dt, end_dt,
+            before=date_arg("before"), after=date_arg("after"),
         )
+        total_count = store.count(start_dt, end_dt)
 
-    monthly_stats.sort(key=lambda x: x["label"])
+        # -------------------------
+        # 4. Monthly stats (FROM FILTERED ROWS)
+        # -------------------------
+        monthly_stats = store.monthly_stats(start_dt, end_dt)
+
+    since = hot_window["since"]
+    archive_url = None
+    if since is not None and not archived and not has_older:
+        archive_start, archive_end = archive_range(since)
+        archive_url = page_url("weather_page", start_date=archive_start, end_date=archive_end, before=None, after=None)
 
     return render_template(
         "weather.html",
         today=today,
         weather_rows=rows,
-        weather_row_count=row_count,
+        weather_row_count=len(rows),
+        weather_total_count=total_count,
+        older_url=page_url("weather_page", before=rows[-1].date_str, after=None) if has_older and rows else None,
+        newer_url=page_url("weather_page", after=rows[0].date_str, before=None) if has_newer and rows else None,
+        latest_url=page_url("weather_page", before=None, after=None) if has_newer else None,
+        archive_url=archive_url,
+        hot_since=None if archived else since,
         monthly_stats=monthly_stats,
         num_blocks=NUM_BLOCKS,
         block_id=0,
@@ -1559,25 +5020,47 @@ def weather_page():
         start_date=start_date_str,
         end_date=end_date_str,
     )
+
+
 # --------- DOWNLOAD WEATHER CSV ---------
 
 @app.route("/download_weather")
 def download_weather():
-    import io
-    import csv
+    """Weather CSV (?start_date=&end_date= as on the page), streamed from the DB."""
+    return export_response("weather", "weather_data.csv")
 
-    out = io.StringIO()
-    writer = csv.writer(out)
-    writer.writerow(["date", "tmax", "tmin", "rain", "et0"])
 
-    for r in sorted(weather_data, key=lambda x: x["date"]):
-        writer.writerow([r["date_str"], r["tmax"], r["tmin"], r["rain"], r["et0"]])
+@app.route("/import/<dataset>", methods=["POST"])
+def import_csv(dataset):
+    """
+    Bulk import: multipart field "file" (CSV, or .xlsx with openpyxl),
+    same columns as the export. ?dry_run=1 validates without writing.
+    Returns the import report as JSON.
+    """
+    if dataset not in IMPORT_DATASETS:
+        return jsonify({"error": f"unknown dataset {dataset!r}", "datasets": sorted(IMPORT_DATASETS)}), 404
+    upload = request.files.get("file")
+    if upload is None or not upload.filename:
+        return jsonify({"error": "no file uploaded (multipart field 'file')"}), 400
+    ensure_loaded("block_meta")
+    try:
+        report = import_rows(dataset, read_import_rows(upload.stream, upload.filename),
+                             dry_run=request.args.get("dry_run") == "1")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Failed to import {dataset}:", e)
+        return jsonify({"error": f"import failed, nothing was written: {e}"}), 500
+    report["file"] = upload.filename
+    return jsonify(report)
 
-    return Response(
-        out.getvalue(),
-        mimetype="text/csv",
-        headers={"Content-Disposition": "attachment; filename=weather_data.csv"},
-    )
+
+@app.route("/export/<dataset>.csv")
+def export_csv(dataset):
+    """Any dataset as CSV: ?start_date=, ?end_date=, repeat ?block= to pick blocks."""
+    if dataset not in EXPORT_DATASETS:
+        return jsonify({"error": f"unknown dataset {dataset!r}", "datasets": sorted(EXPORT_DATASETS)}), 404
+    return export_response(dataset)
 
 
 # --------- BLOCK PAGE (IRRIGATION + SOIL MOISTURE P&L) ---------
@@ -1588,165 +5071,150 @@ def block_view(block_id):
         return redirect(url_for("index"))
 
     today = date.today()
+    ensure_loaded("blocks", "block_meta", "weather")
     init_block_rows(block_id)
 
-    rows = blocks_data[block_id]
     meta = block_meta[block_id]
     manual = soil_manual[block_id]
     block_name = BLOCK_NAMES[block_id - 1]
 
     if request.method == "POST":
-        meta["cut_date"] = request.form.get("cut_date", "").strip()
-        meta["kc"] = request.form.get("kc", "").strip()
-        v = request.form.get("variety")
-        if v is not None:
-            meta["variety"] = v.strip()
-
-        updated = []
-        for i, row in enumerate(rows):
-            week = request.form.get(f"week_{i}", "").strip()
-            scheduled = request.form.get(f"scheduled_{i}", "").strip()
-            actual = request.form.get(f"actual_{i}", "").strip()
-            eff = request.form.get(f"effrain_{i}", "").strip()
-            comment = request.form.get(f"comment_{i}", "").strip()
-
-            s = safe_float(scheduled)
-            a = safe_float(actual)
-            e = safe_float(eff)
-            combined = (a or 0) + (e or 0) if (a is not None or e is not None) else None
-
-            if s and combined is not None and s != 0:
-                pct = round((combined / s) * 100, 1)
-            else:
-                pct = ""
+        with writing("blocks", "block_meta"):
+            rows = blocks_data[block_id]
+            meta_before = (dict(meta), manual.get("start_balance"))
+            meta["cut_date"] = request.form.get("cut_date", "").strip()
+            meta["kc"] = request.form.get("kc", "").strip()
+            v = request.form.get("variety")
+            if v is not None:
+                meta["variety"] = v.strip()
+
+            updated = []
+            for i, row in enumerate(rows):
+                week = request.form.get(f"week_{i}", "").strip()
+                scheduled = request.form.get(f"scheduled_{i}", "").strip()
+                actual = request.form.get(f"actual_{i}", "").strip()
+                eff = request.form.get(f"effrain_{i}", "").strip()
+                comment = request.form.get(f"comment_{i}", "").strip()
+
+                s = safe_float(scheduled)
+                a = safe_float(actual)
+                e = safe_float(eff)
+                combined = (a or 0) + (e or 0) if (a is not None or e is not None) else None
+
+                if s and combined is not None and s != 0:
+                    pct = round((combined / s) * 100, 1)
+                else:
+                    pct = None
+
+                new_row = IrrigationWeek(week, s, a, e, pct, comment)
+                if new_row != row:
+                    changes["blocks"].touch((block_id, i))
+                    updated.append(new_row)
+                else:
+                    updated.append(row)
+
+            blocks_data[block_id] = updated
+            rows = updated
+            bump_version("blocks")
+
+            sb_str = request.form.get("sm_start_balance", "").strip()
+            sb_val = safe_float(sb_str)
+            if sb_val is not None:
+                manual["start_balance"] = sb_val
+
+            # Soil entries on the form are merged in; entries outside the
+            # displayed window are kept, and a row cleared on both fields is deleted.
+            try:
+                sm_count = int(request.form.get("sm_row_count", "0"))
+            except ValueError:
+                sm_count = 0
+
+            by_date = manual["by_date"]
+            soil_changed = False
+            for i in range(sm_count):
+                d_str = request.form.get(f"sm_date_{i}", "").strip()
+                eff_str = request.form.get(f"sm_eff_{i}", "").strip()
+                irr_str = request.form.get(f"sm_irr_{i}", "").strip()
+                if not d_str:
+                    continue
+                new_entry = {"eff": safe_float(eff_str), "irr": safe_float(irr_str)}
+                old_entry = by_date.get(d_str)
+                if new_entry["eff"] is None and new_entry["irr"] is None:
+                    if old_entry is not None:
+                        del by_date[d_str]
+                        changes["soil_manual"].remove((block_id, d_str))
+                        invalidate_soil_from(block_id, d_str)
+                        soil_changed = True
+                    continue
+                if new_entry != old_entry:
+                    by_date[d_str] = new_entry
+                    changes["soil_manual"].touch((block_id, d_str))
+                    invalidate_soil_from(block_id, d_str)
+                    soil_changed = True
 
-            updated.append(
-                {
-                    "week": week,
-                    "scheduled": scheduled,
-                    "actual": actual,
-                    "eff_rain": eff,
-                    "percent": pct,
-                    "comment": comment,
-                }
-            )
+            meta_changed = (dict(meta), manual.get("start_balance")) != meta_before
+            if meta_changed or soil_changed:
+                bump_version("block_meta")
 
-        blocks_data[block_id] = updated
-        rows = updated
+            # NEW: save to MySQL (changed rows only)
+            try:
+                if meta_changed:
+                    save_block_meta_to_db(block_id)
+                save_block_irrigation_to_db(block_id)
+                save_soil_manual_block_to_db(block_id)
+            except Exception as e:
+                print(f"Failed to save block {block_id} to DB:", e)
+        if meta_changed:
+            widen_hot_window()
 
-        sb_str = request.form.get("sm_start_balance", "").strip()
-        sb_val = safe_float(sb_str)
-        if sb_val is not None:
-            manual["start_balance"] = sb_val
+    with reading("blocks", "block_meta", "weather"):
+        rows = blocks_data[block_id]
+        age_days = age_months = None
+        weeks = block_weeks(block_id)
+        cut_dt = weeks.cut_date if weeks else None
+        if cut_dt:
+            age_days = (today - cut_dt).days
+            age_months = round(age_days / 30.0, 1)
+        # Labels follow the cut date for display only; the shared rows are not touched here.
+        labels = [weeks.label(i) if cut_dt else r.week for i, r in enumerate(rows)]
+        scheduled_vals = [r.scheduled for r in rows]
+        actual_plus = []
+        for r in rows:
+            a, e = r.actual, r.eff_rain
+            actual_plus.append((a or 0) + (e or 0) if (a is not None or e is not None) else None)
 
-        manual["by_date"] = {}
-        try:
-            sm_count = int(request.form.get("sm_row_count", "0"))
-        except ValueError:
-            sm_count = 0
+        avg_pct, min_pct, max_pct = percent_stats(block_id)
 
-        for i in range(sm_count):
-            d_str = request.form.get(f"sm_date_{i}", "").strip()
-            eff_str = request.form.get(f"sm_eff_{i}", "").strip()
-            irr_str = request.form.get(f"sm_irr_{i}", "").strip()
-            if not d_str:
-                continue
-            manual["by_date"][d_str] = {"eff": eff_str, "irr": irr_str}
+        sm_rows = []
+        start_balance = manual.get("start_balance", 120.0)
+        kc_val = safe_float(meta["kc"]) or 1.0
 
-        # NEW: save to MySQL
-        try:
-            save_block_meta_to_db(block_id)
-            save_block_irrigation_to_db(block_id)
-            save_soil_manual_block_to_db(block_id)
-        except Exception as e:
-            print(f"Failed to save block {block_id} to DB:", e)
+        window_start = today - timedelta(days=6)
+        if cut_dt and cut_dt > window_start:
+            window_start = cut_dt
 
-    age_days = age_months = None
-    cut_dt = None
-    if meta["cut_date"]:
-        try:
-            cut_dt = datetime.strptime(meta["cut_date"], "%Y-%m-%d").date()
-            age_days = (today - cut_dt).days
-            age_months = round(age_days / 30.0, 1)
-        except ValueError:
-            cut_dt = None
-
-    if cut_dt:
-        first_monday = cut_dt - timedelta(days=cut_dt.weekday())
-        for i in range(len(rows)):
-            ws = first_monday + timedelta(days=7 * i)
-            we = ws + timedelta(days=6)
-            rows[i]["week"] = f"Week {i+1} ({ws.strftime('%d %b')}–{we.strftime('%d %b')})"
-
-    labels = [r["week"] for r in rows]
-    scheduled_vals = [safe_float(r["scheduled"]) for r in rows]
-    actual_plus = []
-    for r in rows:
-        a = safe_float(r["actual"])
-        e = safe_float(r["eff_rain"])
-        actual_plus.append((a or 0) + (e or 0) if (a is not None or e is not None) else None)
-
-    pcts = [safe_float(r["percent"]) for r in rows if safe_float(r["percent"]) is not None]
-    avg_pct = round(sum(pcts) / len(pcts), 1) if pcts else None
-    min_pct = round(min(pcts), 1) if pcts else None
-    max_pct = round(max(pcts), 1) if pcts else None
-
-    sm_rows = []
-    start_balance = manual.get("start_balance", 120.0)
-    balance = start_balance
-    kc_val = safe_float(meta["kc"]) or 1.0
-
-    weather_by_date = {r["date"]: r for r in weather_data}
-
-    window_start = today - timedelta(days=6)
-    if cut_dt and cut_dt > window_start:
-        window_start = cut_dt
-
-    current = window_start
-    daily_list = []
-    while current <= today:
-        r = weather_by_date.get(current)
-        if r:
-            daily_list.append(r)
-        current += timedelta(days=1)
-
-    for r in daily_list:
-        dstr = r["date_str"]
-        et0_val = safe_float(r.get("et0")) or 0.0
-        etc = round(et0_val * kc_val, 2)
-        rain_val = safe_float(r.get("rain")) or 0.0
-
-        manual_date = manual.get("by_date", {}).get(dstr, {})
-        eff_str = manual_date.get("eff", "")
-        irr_str = manual_date.get("irr", "")
-        eff_val = safe_float(eff_str) or 0.0
-        irr_val = safe_float(irr_str) or 0.0
-
-        balance = round(balance - etc + eff_val + irr_val, 1)
-        if balance > MAX_DEFICIT_BALANCE:
-            balance = MAX_DEFICIT_BALANCE
-        if balance < 0:
-            balance = 0
-
-        sm_rows.append(
-            {
-                "date_str": dstr,
-                "et0": et0_val,
-                "kc": kc_val,
-                "etc": etc,
-                "rain": rain_val,
-                "eff_rain_str": eff_str,
-                "irr_str": irr_str,
-                "balance": balance,
-            }
-        )
+        daily_list = weather_data.range(window_start, today)
 
-    # 🔹 Only show the latest 7 days in the table,
-    # but balances are still computed over full history.
-    if len(sm_rows) > 7:
-        sm_rows_display = sm_rows[-7:]
-    else:
-        sm_rows_display = sm_rows
+        for r in daily_list:
+            dstr = r.date_str
+            et0_val = r.et0 or 0.0
+            manual_date = manual.get("by_date", {}).get(dstr, {})
+            eff = manual_date.get("eff")
+            irr = manual_date.get("irr")
+
+            sm_rows.append(
+                {
+                    "date_str": dstr,
+                    "et0": et0_val,
+                    "kc": kc_val,
+                    "etc": round(et0_val * kc_val, 2),
+                    "rain": r.rain or 0.0,
+                    "eff_rain_str": format_num(eff),
+                    "irr_str": format_num(irr),
+                    # Season-long running balance, served from the engine's series
+                    "balance": soil_engine.balance_on(block_id, r.date),
+                }
+            )
 
     return render_template(
         "block.html",
@@ -1766,9 +5234,9 @@ def block_view(block_id):
         age_months=age_months,
         kc=meta["kc"],
         num_blocks=NUM_BLOCKS,
-        sm_rows=sm_rows_display,
+        sm_rows=sm_rows,
         sm_start_balance=start_balance,
-        sm_row_count=len(sm_rows_display),
+        sm_row_count=len(sm_rows),
     )
 
 # --------- AGRONOMY PAGE ---------
@@ -1779,75 +5247,74 @@ def agronomy_view(block_id):
         return redirect(url_for("index"))
 
     today = date.today()
+    ensure_loaded("agronomy", "block_meta")
     init_agronomy_rows(block_id)
 
-    rows = agronomy_data[block_id]
     meta = block_meta[block_id]
     block_name = BLOCK_NAMES[block_id - 1]
 
     if request.method == "POST":
-        meta["variety"] = request.form.get("variety", "").strip()
-        cut = request.form.get("cut_date")
-        if cut is not None:
-            meta["cut_date"] = cut.strip()
-
-        updated = []
-        running_cum = 0.0
-        for i, row in enumerate(rows):
-            week = request.form.get(f"ag_week_{i}", "").strip()
-            std_gain_str = request.form.get(f"standard_gain_{i}", "").strip()
-            gain_str = request.form.get(f"gain_{i}", "").strip()
-            fert_str = request.form.get(f"fert_{i}", "").strip()
-            chem_str = request.form.get(f"chem_{i}", "").strip()
-
-            gain_val = safe_float(gain_str)
-            if gain_val is not None:
-                running_cum += gain_val
-                cum_str = f"{running_cum:.1f}"
-            else:
-                cum_str = ""
-
-            updated.append(
-                {
-                    "week": week,
-                    "standard_gain": std_gain_str, 
-                    "gain": gain_str,
-                    "cumulative": cum_str,
-                    "fertigation": fert_str,
-                    "chemigation": chem_str,
-                }
-            )
-
-        agronomy_data[block_id] = updated
-        rows = updated
-
-        # NEW: save agronomy + meta to DB
-        try:
-            save_block_meta_to_db(block_id)
-            save_agronomy_block_to_db(block_id)
-        except Exception as e:
-            print(f"Failed to save agronomy for block {block_id}:", e)
+        with writing("agronomy", "block_meta"):
+            rows = agronomy_data[block_id]
+            meta_before = dict(meta)
+            meta["variety"] = request.form.get("variety", "").strip()
+            cut = request.form.get("cut_date")
+            if cut is not None:
+                meta["cut_date"] = cut.strip()
+
+            updated = []
+            running_cum = 0.0
+            for i, row in enumerate(rows):
+                week = request.form.get(f"ag_week_{i}", "").strip()
+                std_gain_str = request.form.get(f"standard_gain_{i}", "").strip()
+                gain_str = request.form.get(f"gain_{i}", "").strip()
+                fert_str = request.form.get(f"fert_{i}", "").strip()
+                chem_str = request.form.get(f"chem_{i}", "").strip()
+
+                gain_val = safe_float(gain_str)
+                if gain_val is not None:
+                    running_cum += gain_val
+                    cum_val = round(running_cum, 1)
+                else:
+                    cum_val = None
+
+                new_row = AgronomyWeek(week, safe_float(std_gain_str), gain_val, cum_val, fert_str, chem_str)
+                if new_row != row:
+                    changes["agronomy"].touch((block_id, i))
+                    updated.append(new_row)
+                else:
+                    updated.append(row)
+
+            agronomy_data[block_id] = updated
+            rows = updated
+            bump_version("agronomy")
+
+            meta_changed = meta != meta_before
+            if meta_changed:
+                bump_version("block_meta")
+
+            # NEW: save agronomy + meta to DB (changed rows only)
+            try:
+                if meta_changed:
+                    save_block_meta_to_db(block_id)
+                save_agronomy_block_to_db(block_id)
+            except Exception as e:
+                print(f"Failed to save agronomy for block {block_id}:", e)
+        if meta_changed:
+            widen_hot_window()
 
-    age_days = age_months = None
-    cut_dt = None
-    if meta["cut_date"]:
-        try:
-            cut_dt = datetime.strptime(meta["cut_date"], "%Y-%m-%d").date()
+    with reading("agronomy", "block_meta"):
+        rows = agronomy_data[block_id]
+        age_days = age_months = None
+        weeks = block_weeks(block_id)
+        cut_dt = weeks.cut_date if weeks else None
+        if cut_dt:
             age_days = (today - cut_dt).days
             age_months = round(age_days / 30.0, 1)
-        except ValueError:
-            cut_dt = None
-
-    if cut_dt:
-        first_monday = cut_dt - timedelta(days=cut_dt.weekday())
-        for i in range(len(rows)):
-            ws = first_monday + timedelta(days=7 * i)
-            we = ws + timedelta(days=6)
-            rows[i]["week"] = f"Week {i+1} ({ws.strftime('%d %b')}–{we.strftime('%d %b')})"
-
-    labels = [r["week"] for r in rows]
-    gains = [safe_float(r["gain"]) for r in rows]
-    cums = [safe_float(r["cumulative"]) for r in rows]
+        # Labels follow the cut date for display only; the shared rows are not touched here.
+        labels = [weeks.label(i) if cut_dt else r.week for i, r in enumerate(rows)]
+        gains = [r.gain for r in rows]
+        cums = [r.cumulative for r in rows]
 
     return render_template(
         "agronomy.html",
@@ -1872,6 +5339,7 @@ def agronomy_view(block_id):
 @app.route("/ndvi", methods=["GET", "POST"])
 def ndvi_page():
     today = date.today()
+    ensure_loaded("ndvi")
 
     if request.method == "POST":
         d_str = request.form.get("date", "").strip()
@@ -1896,13 +5364,31 @@ def ndvi_page():
                     "ndvi": ndvi_val,
                     "biomass": biomass,
                 }
-                ndvi_data.append(rec)
-                try:
-                    insert_ndvi_record_to_db(rec)
-                except Exception as e:
-                    print("Failed to save NDVI to DB:", e)
-
-    records = sorted(ndvi_data, key=lambda x: x["date"])
+                with writing("ndvi"):
+                    ndvi_data.append(rec)
+                    bump_version("ndvi")
+                    try:
+                        insert_ndvi_record_to_db(rec)
+                    except Exception as e:
+                        print("Failed to save NDVI to DB:", e)
+
+    # Optional date filter; ranges reaching before the loaded window are read from the DB
+    start_dt = date_arg("start_date")
+    end_dt = date_arg("end_date")
+    archived = in_archive(start_dt, end_dt)
+    if archived:
+        records = ndvi_history(start_dt, end_dt)
+    else:
+        with reading("ndvi"):
+            records = sorted(ndvi_data, key=lambda x: x["date"])
+        if start_dt or end_dt:
+            records = [r for r in records
+                       if (start_dt is None or r["date"] >= start_dt) and (end_dt is None or r["date"] <= end_dt)]
+    since = hot_window["since"]
+    archive_url = None
+    if since is not None and not archived:
+        archive_start, archive_end = archive_range(since)
+        archive_url = url_for("ndvi_page", start_date=archive_start, end_date=archive_end)
     ndvi_by_date = defaultdict(list)
     for r in records:
         ndvi_by_date[r["date_str"]].append(r["ndvi"])
@@ -1921,6 +5407,10 @@ def ndvi_page():
         records=records,
         chart_dates=chart_dates,
         chart_ndvi=chart_ndvi,
+        start_date=request.args.get("start_date", ""),
+        end_date=request.args.get("end_date", ""),
+        archive_url=archive_url,
+        hot_since=None if archived else since,
     )
 
 # --------- PEST & DISEASE PAGE ---------
@@ -1928,6 +5418,7 @@ def ndvi_page():
 @app.route("/pests", methods=["GET", "POST"])
 def pests_page():
     today = date.today()
+    ensure_loaded("pests")
 
     if request.method == "POST":
         action = request.form.get("action", "")
@@ -1962,86 +5453,132 @@ def pests_page():
                         "area": area_val,
                         "action": action_txt,
                     }
-                    # Update in-memory
-                    pests_data.append(rec)
-
-                    # Save to DB
-                    try:
-                        insert_pest_record_to_db(rec)
-                    except Exception as e:
-                        print("Failed to save pest record to DB:", e)
+                    with writing("pests"):
+                        # Update in-memory
+                        pests_data.append(rec)
+                        bump_version("pests")
+
+                        # Save to DB
+                        try:
+                            insert_pest_record_to_db(rec)
+                        except Exception as e:
+                            # Keep it pending under a temporary id; the next save inserts it
+                            rec["id"] = next(_temp_pest_ids)
+                            changes["pests"].touch(rec["id"])
+                            print("Failed to save pest record to DB:", e)
 
         # -------------------------
         # EDIT / DELETE EXISTING PEST RECORDS
         # -------------------------
         elif action == "edit_pests":
-            new_rows = []
-            try:
-                row_count = int(request.form.get("row_count", "0"))
-            except ValueError:
-                row_count = 0
-
-            for i in range(row_count):
-                d_str = request.form.get(f"date_{i}", "").strip()
-                blk_id_str = request.form.get(f"block_id_{i}", "").strip()
-                pest = request.form.get(f"pest_{i}", "").strip()
-                severity = request.form.get(f"severity_{i}", "").strip()
-                area_str = request.form.get(f"area_{i}", "").strip()
-                action_txt = request.form.get(f"action_{i}", "").strip()
-                delete_flag = request.form.get(f"delete_{i}")
-
-                # Skip empty or deleted rows
-                if not d_str or not blk_id_str or not pest or delete_flag == "on":
-                    continue
-
+            # Rows are matched to records by id; only changed or deleted
+            # records are touched, records not on the form are left alone.
+            with writing("pests"):
+                by_id = {r.get("id"): r for r in pests_data}
+                removed = set()
+                edited = {}
                 try:
-                    d_obj = datetime.strptime(d_str, "%Y-%m-%d").date()
-                    blk_id = int(blk_id_str)
+                    row_count = int(request.form.get("row_count", "0"))
                 except ValueError:
-                    continue
+                    row_count = 0
 
-                if not (1 <= blk_id <= NUM_BLOCKS):
-                    continue
+                # Rows from an archive page aren't in memory: read them back to compare
+                form_ids = set()
+                for i in range(row_count):
+                    try:
+                        form_ids.add(int(request.form.get(f"id_{i}", "")))
+                    except ValueError:
+                        continue
+                missing = sorted(k for k in form_ids - set(by_id) if k > 0)
+                if missing:
+                    try:
+                        with db_cursor() as cur:
+                            by_id.update((r["id"], r) for r in read_pest_records(cur, ids=missing))
+                    except Exception as e:
+                        print("Failed to read archived pest records:", e)
 
-                area_val = safe_float(area_str)
+                for i in range(row_count):
+                    try:
+                        rec_id = int(request.form.get(f"id_{i}", ""))
+                    except ValueError:
+                        continue
+                    old = by_id.get(rec_id)
+                    if old is None:
+                        continue
+
+                    d_str = request.form.get(f"date_{i}", "").strip()
+                    blk_id_str = request.form.get(f"block_id_{i}", "").strip()
+                    pest = request.form.get(f"pest_{i}", "").strip()
+                    severity = request.form.get(f"severity_{i}", "").strip()
+                    area_str = request.form.get(f"area_{i}", "").strip()
+                    action_txt = request.form.get(f"action_{i}", "").strip()
+                    delete_flag = request.form.get(f"delete_{i}")
+
+                    # Empty or ticked rows are deleted
+                    if not d_str or not blk_id_str or not pest or delete_flag == "on":
+                        removed.add(rec_id)
+                        changes["pests"].remove(rec_id)
+                        continue
 
-                new_rows.append(
-                    {
+                    try:
+                        d_obj = datetime.strptime(d_str, "%Y-%m-%d").date()
+                        blk_id = int(blk_id_str)
+                    except ValueError:
+                        continue
+
+                    if not (1 <= blk_id <= NUM_BLOCKS):
+                        continue
+
+                    new_rec = {
+                        "id": rec_id,
                         "date": d_obj,
                         "date_str": d_str,
                         "block_id": blk_id,
                         "pest": pest,
                         "severity": severity,
-                        "area": area_val,
+                        "area": safe_float(area_str),
                         "action": action_txt,
                     }
-                )
-
-            # Replace in-memory data
-            pests_data.clear()
-            pests_data.extend(new_rows)
-
-            # Replace DB table content
-            try:
-                conn = get_db()
-                cur = conn.cursor()
-                cur.execute("DELETE FROM pests_records")
-                for r in new_rows:
-                    cur.execute(
-                        """
-                        INSERT INTO pests_records (date, block_id, pest, severity, area, action)
-                        VALUES (%s,%s,%s,%s,%s,%s)
-                        """,
-                        (r["date"], r["block_id"], r["pest"], r["severity"], r["area"], r["action"]),
-                    )
-                conn.commit()
-                cur.close()
-                conn.close()
-            except Exception as e:
-                print("Failed to rewrite pests_records table:", e)
+                    if row_changed(old, new_rec, ("date", "block_id", "pest", "severity", "area", "action")):
+                        edited[rec_id] = new_rec
+                        changes["pests"].touch(rec_id)
+
+                # Edited records are replaced, not updated in place, so a page
+                # still rendering the old list never sees a half-edited record
+                if removed or edited:
+                    in_memory = {r.get("id") for r in pests_data}
+                    pests_data[:] = [edited.get(r.get("id"), r) for r in pests_data if r.get("id") not in removed]
+                    # Edited archive records are held until the next load drops them again
+                    pests_data.extend(r for k, r in edited.items() if k not in in_memory)
+                    bump_version("pests")
 
-    # Always show sorted records
-    records = sorted(pests_data, key=lambda x: x["date"])
+                try:
+                    save_pests_to_db()
+                except Exception as e:
+                    print("Failed to save pest records to DB:", e)
+
+    # One page of the filtered records, newest first
+    filters = {
+        "start": date_arg("start_date"),
+        "end": date_arg("end_date"),
+        "block_id": request.args.get("block", type=int),
+        "pest": request.args.get("pest", "").strip(),
+        "severity": request.args.get("severity", "").strip(),
+    }
+    # Ranges reaching before the loaded window are read from the DB
+    archived = in_archive(filters["start"], filters["end"])
+    index = pest_history(filters["start"], filters["end"]) if archived else pest_index
+    records, has_older, has_newer = index.page(
+        page_size(PAGE_CONFIG["pest_rows"]),
+        before=parse_pest_cursor(request.args.get("before")),
+        after=parse_pest_cursor(request.args.get("after")),
+        **filters,
+    )
+    since = hot_window["since"]
+    archive_url = None
+    if since is not None and not archived and not has_older:
+        archive_start, archive_end = archive_range(since)
+        archive_url = page_url("pests_page", start_date=archive_start, end_date=archive_end, before=None, after=None)
 
     return render_template(
         "pests.html",
@@ -2049,6 +5586,16 @@ def pests_page():
         block_names=BLOCK_NAMES,
         num_blocks=NUM_BLOCKS,
         records=records,
+        filters=filters,
+        pest_names=index.pests,
+        severities=index.severities,
+        start_date=request.args.get("start_date", ""),
+        end_date=request.args.get("end_date", ""),
+        older_url=page_url("pests_page", before=pest_cursor(records[-1]), after=None) if has_older and records else None,
+        newer_url=page_url("pests_page", after=pest_cursor(records[0]), before=None) if has_newer and records else None,
+        latest_url=page_url("pests_page", before=None, after=None) if has_newer else None,
+        archive_url=archive_url,
+        hot_since=None if archived else since,
     )
 
 # ---------------------------------------------------
@@ -2057,6 +5604,9 @@ def pests_page():
 
 @app.after_request
 def add_no_cache_headers(response):
+    # Views that manage their own caching (ETag'd API responses) keep their headers
+    if "Cache-Control" in response.headers:
+        return response
     response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
     response.headers["Pragma"] = "no-cache"
     response.headers["Expires"] = "0"
@@ -0,0 +1,191 @@
+"""
+Micro-benchmark: dict-loop statistics vs the columnar (NumPy) views.
+
+Covers the aggregations the pages recompute on every request:
+
+  * monthly weather stats over a date range (weather page)
+  * season_total_mm for all 41 blocks (dashboard)
+  * avg/min/max % of schedule for all 41 blocks (block view)
+
+Both sides are timed on warm data; the columnar side is also timed once
+cold, i.e. including the rebuild of the arrays after a change.
+
+    python benchmarks/bench_aggregations.py --years 1 5 10 --repeat 20
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import app_fixed2 as app_mod  # noqa: E402
+
+
+def make_weather(years):
+    start = date.today() - timedelta(days=365 * years)
+    rows = []
+    for i in range(365 * years):
+        d = start + timedelta(days=i)
+        rows.append({
+            "date": d,
+            "date_str": d.strftime("%Y-%m-%d"),
+            "tmax": f"{random.uniform(25, 38):.1f}",
+            "tmin": f"{random.uniform(12, 22):.1f}",
+            "rain": "" if i % 5 else f"{random.uniform(0, 30):.1f}",
+            "et0": f"{random.uniform(3, 8):.1f}",
+        })
+    return rows
+
+
+def make_blocks():
+    """Old-style dict rows of form strings per block, loaded into the app as records."""
+    f = app_mod.safe_float
+    blocks = {}
+    for block_id in range(1, app_mod.NUM_BLOCKS + 1):
+        rows = []
+        for i in range(app_mod.DEFAULT_ROWS):
+            rows.append({
+                "week": f"Week {i + 1}",
+                "scheduled": "35",
+                "actual": f"{random.uniform(20, 40):.1f}",
+                "eff_rain": "" if random.random() < 0.7 else f"{random.uniform(0, 10):.1f}",
+                "percent": f"{random.uniform(50, 120):.1f}",
+                "comment": "",
+            })
+        blocks[block_id] = rows
+        app_mod.blocks_data[block_id] = [
+            app_mod.IrrigationWeek(r["week"], f(r["scheduled"]), f(r["actual"]), f(r["eff_rain"]), f(r["percent"]))
+            for r in rows
+        ]
+    app_mod.bump_version("blocks")
+    return blocks
+
+
+def as_weather_days(rows):
+    f = app_mod.safe_float
+    return [app_mod.WeatherDay(r["date"], f(r["tmax"]), f(r["tmin"]), f(r["rain"]), f(r["et0"])) for r in rows]
+
+
+# ---- the aggregations as they were before the columnar views (dict rows of strings) ----
+
+def legacy_monthly_stats(rows, first, last):
+    by_month = {}
+    for r in rows:
+        if first <= r["date"] <= last:
+            by_month.setdefault(r["date"].strftime("%Y-%m"), []).append(r)
+    stats = []
+    for label in sorted(by_month):
+        month_rows = by_month[label]
+        tmax = [app_mod.safe_float(r["tmax"]) for r in month_rows if app_mod.safe_float(r["tmax"]) is not None]
+        tmin = [app_mod.safe_float(r["tmin"]) for r in month_rows if app_mod.safe_float(r["tmin"]) is not None]
+        rain = [app_mod.safe_float(r["rain"]) for r in month_rows if app_mod.safe_float(r["rain"]) is not None]
+        et0 = [app_mod.safe_float(r["et0"]) for r in month_rows if app_mod.safe_float(r["et0"]) is not None]
+        stats.append({
+            "label": label,
+            "avg_tmax": round(sum(tmax) / len(tmax), 1) if tmax else None,
+            "avg_tmin": round(sum(tmin) / len(tmin), 1) if tmin else None,
+            "sum_rain": round(sum(rain), 1) if rain else None,
+            "avg_et0": round(sum(et0) / len(et0), 2) if et0 else None,
+            "cum_et0": round(sum(et0), 1) if et0 else None,
+        })
+    return stats
+
+
+def legacy_season_totals(blocks):
+    out = []
+    for block_id in range(1, app_mod.NUM_BLOCKS + 1):
+        total = 0.0
+        has_data = False
+        for r in blocks[block_id]:
+            a = app_mod.safe_float(r.get("actual"))
+            e = app_mod.safe_float(r.get("eff_rain"))
+            if a is not None:
+                total += a
+                has_data = True
+            if e is not None:
+                total += e
+                has_data = True
+        out.append(round(total, 1) if has_data else None)
+    return out
+
+
+def legacy_percent_stats(blocks):
+    out = []
+    for block_id in range(1, app_mod.NUM_BLOCKS + 1):
+        rows = blocks[block_id]
+        pcts = [app_mod.safe_float(r["percent"]) for r in rows if app_mod.safe_float(r["percent"]) is not None]
+        out.append((
+            round(sum(pcts) / len(pcts), 1) if pcts else None,
+            round(min(pcts), 1) if pcts else None,
+            round(max(pcts), 1) if pcts else None,
+        ))
+    return out
+
+
+# ---- the current code paths ----
+
+def columnar_season_totals():
+    return [app_mod.season_total_mm(b) for b in range(1, app_mod.NUM_BLOCKS + 1)]
+
+
+def columnar_percent_stats():
+    return [app_mod.percent_stats(b) for b in range(1, app_mod.NUM_BLOCKS + 1)]
+
+
+def timeit(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - t0) / repeat, result
+
+
+def report(label, legacy, columnar, cold=None):
+    line = f"  {label:<22} dict {legacy * 1000:>9.3f} ms   numpy {columnar * 1000:>9.3f} ms"
+    if cold is not None:
+        line += f"   (cold {cold * 1000:.3f} ms)"
+    print(line + f"   x{legacy / columnar if columnar else float('inf'):.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 5, 10], help="weather history sizes")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per measurement")
+    args = parser.parse_args()
+    random.seed(0)
+
+    blocks = make_blocks()
+    print(f"Blocks: {app_mod.NUM_BLOCKS} x {app_mod.DEFAULT_ROWS} weeks")
+    app_mod.bump_version("blocks")
+    cold, _ = timeit(columnar_season_totals, 1)
+    legacy, expected = timeit(lambda: legacy_season_totals(blocks), args.repeat)
+    columnar, got = timeit(columnar_season_totals, args.repeat)
+    assert got == expected, "season totals differ"
+    report("season_total_mm", legacy, columnar, cold)
+
+    app_mod.bump_version("blocks")
+    cold, _ = timeit(columnar_percent_stats, 1)
+    legacy, expected = timeit(lambda: legacy_percent_stats(blocks), args.repeat)
+    columnar, got = timeit(columnar_percent_stats, args.repeat)
+    assert got == expected, "percent stats differ"
+    report("avg/min/max %", legacy, columnar, cold)
+
+    for years in args.years:
+        rows = make_weather(years)
+        store = app_mod.weather_data
+        store.replace_all(as_weather_days(rows))
+        # A range that starts and ends mid-month exercises both the running
+        # totals and the column arrays for the partial edge months.
+        first = rows[0]["date"] + timedelta(days=10)
+        last = rows[-1]["date"] - timedelta(days=10)
+        print(f"\nWeather: {years} year(s), {len(rows)} days")
+        cold, _ = timeit(lambda: store.monthly_stats(first, last), 1)
+        legacy, _ = timeit(lambda: legacy_monthly_stats(rows, first, last), args.repeat)
+        columnar, _ = timeit(lambda: store.monthly_stats(first, last), args.repeat)
+        report("monthly stats", legacy, columnar, cold)
+
+
+if __name__ == "__main__":
+    main()
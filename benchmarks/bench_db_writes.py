@@ -0,0 +1,194 @@
+"""
+Micro-benchmark: round trips and wall time for the DB writers.
+
+Compares the old per-row REPLACE/INSERT writers with the batched
+INSERT ... ON DUPLICATE KEY UPDATE writers for one block (52 weeks of
+irrigation + agronomy) and for several years of daily weather.
+
+No database is needed: statements go to a recording cursor that sleeps
+--rtt milliseconds per execute() to stand in for the network round trip
+to the managed MySQL instance.
+
+    python benchmarks/bench_db_writes.py --rtt 20 --years 1 5 10
+"""
+import argparse
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import app_fixed2 as app_mod  # noqa: E402
+
+
+class RecordingCursor:
+    def __init__(self, rtt):
+        self.rtt = rtt
+        self.statements = 0
+        self.params = 0
+        self.lastrowid = None
+
+    def execute(self, sql, params=()):
+        self.statements += 1
+        self.params += len(params)
+        if self.rtt:
+            time.sleep(self.rtt)
+
+    def close(self):
+        pass
+
+
+def make_weather(years):
+    start = date.today() - timedelta(days=365 * years)
+    rows = []
+    for i in range(365 * years):
+        d = start + timedelta(days=i)
+        rows.append({
+            "date": d,
+            "date_str": d.strftime("%Y-%m-%d"),
+            "tmax": "31.2",
+            "tmin": "17.4",
+            "rain": "" if i % 5 else "3.0",
+            "et0": "5.6",
+        })
+    return rows
+
+
+def make_weeks():
+    irrigation = []
+    agronomy = []
+    for i in range(app_mod.DEFAULT_ROWS):
+        irrigation.append({
+            "week": f"Week {i + 1}",
+            "scheduled": "35",
+            "actual": "30",
+            "eff_rain": "2",
+            "percent": "91.4",
+            "comment": "",
+        })
+        agronomy.append({
+            "week": f"Week {i + 1}",
+            "standard_gain": "3",
+            "gain": "2.8",
+            "cumulative": f"{2.8 * (i + 1):.1f}",
+            "fertigation": "",
+            "chemigation": "",
+        })
+    return irrigation, agronomy
+
+
+def as_records(weather, irrigation, agronomy):
+    """The dict/string rows above as the app's typed records."""
+    f = app_mod.safe_float
+    days = [app_mod.WeatherDay(r["date"], f(r["tmax"]), f(r["tmin"]), f(r["rain"]), f(r["et0"])) for r in weather]
+    weeks = [
+        app_mod.IrrigationWeek(r["week"], f(r["scheduled"]), f(r["actual"]), f(r["eff_rain"]),
+                               f(r["percent"]), r["comment"])
+        for r in irrigation
+    ]
+    agro = [
+        app_mod.AgronomyWeek(r["week"], f(r["standard_gain"]), f(r["gain"]), f(r["cumulative"]),
+                             r["fertigation"], r["chemigation"])
+        for r in agronomy
+    ]
+    return days, weeks, agro
+
+
+# ---- the writers as they were before batching (dict rows of strings) ----
+
+def legacy_save_weather(cur, rows):
+    cur.execute("DELETE FROM weather")
+    for r in rows:
+        cur.execute(
+            "INSERT INTO weather (date, tmax, tmin, rain, et0) VALUES (%s,%s,%s,%s,%s)",
+            (r["date"], app_mod.safe_float(r.get("tmax")), app_mod.safe_float(r.get("tmin")),
+             app_mod.safe_float(r.get("rain")), app_mod.safe_float(r.get("et0"))),
+        )
+
+
+def legacy_save_weeks(cur, block_id, irrigation, agronomy):
+    for i, r in enumerate(irrigation):
+        cur.execute(
+            "REPLACE INTO irrigation_weeks (block_id, week_index, week_label, scheduled, actual, "
+            "eff_rain, percent, comment) VALUES (%s,%s,%s,%s,%s,%s,%s,%s)",
+            (block_id, i, r["week"], app_mod.safe_float(r["scheduled"]), app_mod.safe_float(r["actual"]),
+             app_mod.safe_float(r["eff_rain"]), app_mod.safe_float(r["percent"]), r["comment"] or None),
+        )
+    for i, r in enumerate(agronomy):
+        cur.execute(
+            "REPLACE INTO agronomy_weeks (block_id, week_index, week_label, standard_gain, gain, "
+            "cumulative, fertigation, chemigation) VALUES (%s,%s,%s,%s,%s,%s,%s,%s)",
+            (block_id, i, r["week"], app_mod.safe_float(r["standard_gain"]), app_mod.safe_float(r["gain"]),
+             app_mod.safe_float(r["cumulative"]), r["fertigation"] or None, r["chemigation"] or None),
+        )
+
+
+# ---- the current writers (typed records), fed through the recording cursor ----
+
+def patched_cursor(cur):
+    @contextmanager
+    def _db_cursor(commit=False):
+        yield cur
+    return _db_cursor
+
+
+def batched_save_weather(cur, rows):
+    # Worst case for the batched writer: every day is dirty
+    app_mod.weather_data.replace_all(rows)
+    for r in rows:
+        app_mod.changes["weather"].touch(r.date)
+    app_mod.db_cursor = patched_cursor(cur)
+    app_mod.save_weather_to_db()
+
+
+def batched_save_weeks(cur, block_id, irrigation, agronomy):
+    app_mod.blocks_data[block_id] = irrigation
+    app_mod.agronomy_data[block_id] = agronomy
+    for i in range(len(irrigation)):
+        app_mod.changes["blocks"].touch((block_id, i))
+        app_mod.changes["agronomy"].touch((block_id, i))
+    app_mod.db_cursor = patched_cursor(cur)
+    app_mod.save_block_irrigation_to_db(block_id)
+    app_mod.save_agronomy_block_to_db(block_id)
+
+
+def run(label, fn, rtt, *args):
+    cur = RecordingCursor(rtt)
+    t0 = time.perf_counter()
+    fn(cur, *args)
+    elapsed = time.perf_counter() - t0
+    print(f"  {label:<10} {cur.statements:>8} round trips {elapsed * 1000:>10.1f} ms")
+    return cur.statements, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rtt", type=float, default=20.0, help="simulated round trip in ms (default 20)")
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 5, 10], help="weather history sizes")
+    args = parser.parse_args()
+    rtt = args.rtt / 1000.0
+    original_db_cursor = app_mod.db_cursor
+
+    try:
+        print(f"Simulated round trip: {args.rtt:.1f} ms, batch size {app_mod.UPSERT_BATCH_SIZE}")
+
+        irrigation, agronomy = make_weeks()
+        print(f"\nBlock save: {app_mod.DEFAULT_ROWS} irrigation + {app_mod.DEFAULT_ROWS} agronomy weeks")
+        _, weeks, agro = as_records([], irrigation, agronomy)
+        run("per-row", legacy_save_weeks, rtt, 1, irrigation, agronomy)
+        run("batched", batched_save_weeks, rtt, 1, weeks, agro)
+
+        for years in args.years:
+            rows = make_weather(years)
+            print(f"\nWeather save: {years} year(s), {len(rows)} days")
+            days, _, _ = as_records(rows, [], [])
+            run("per-row", legacy_save_weather, rtt, rows)
+            run("batched", batched_save_weather, rtt, days)
+    finally:
+        app_mod.db_cursor = original_db_cursor
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Benchmark suite: page routes and hot helpers on a synthetic estate.
+
+Runs the app through Flask's test client against a throwaway SQLite
+database (DB_BACKEND=sqlite), with the yr.no forecast stubbed out, so no
+network is involved. The estate is generated from the options:
+
+  --blocks   number of blocks (the real estate has 41; extra blocks get
+             synthetic names)
+  --years    years of daily weather
+  --records  NDVI and pest records (each)
+
+Each case reports latency percentiles over --repeat runs, plus the bytes
+and blocks allocated by one run (tracemalloc, measured in a separate
+pass so it does not skew the timings). Results go to --json as
+machine-readable JSON; --baseline compares against an earlier file.
+
+    python benchmarks/bench_suite.py --blocks 41 --years 5 --records 100000 --json base.json
+    python benchmarks/bench_suite.py --blocks 41 --years 5 --records 100000 --baseline base.json
+"""
+import argparse
+import atexit
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+_tmpdir = tempfile.mkdtemp(prefix="agric-bench-")
+atexit.register(shutil.rmtree, _tmpdir, ignore_errors=True)
+os.environ["DB_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = os.path.join(_tmpdir, "bench.db")
+os.environ.setdefault("FORECAST_COLD_WAIT", "0")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import app_fixed2 as app_mod  # noqa: E402
+
+
+# ---- estate generation ----
+
+def scale_blocks(n):
+    """Grow (or shrink) the estate to n blocks before anything is loaded."""
+    names = app_mod.BLOCK_NAMES
+    del names[n:]
+    names.extend(f"Bench {i}" for i in range(len(names) + 1, n + 1))
+    app_mod.NUM_BLOCKS = n
+    for i in range(1, n + 1):
+        app_mod.blocks_data.setdefault(i, [])
+        app_mod.agronomy_data.setdefault(i, [])
+        app_mod.block_meta.setdefault(i, {"cut_date": "", "kc": "", "variety": ""})
+        app_mod.soil_manual.setdefault(i, {"start_balance": 120.0, "by_date": {}})
+
+
+def seed_database(blocks, years, records, today):
+    """Write the synthetic estate with the app's own schema and upsert helper."""
+    app_mod.upgrade_schema()
+    start = today - timedelta(days=365 * years)
+    days = [start + timedelta(days=i) for i in range((today - start).days + 1)]
+
+    weather = [
+        (d, round(random.uniform(25, 38), 1), round(random.uniform(12, 22), 1),
+         None if i % 5 else round(random.uniform(0, 30), 1), round(random.uniform(3, 8), 1))
+        for i, d in enumerate(days)
+    ]
+    meta, irrigation, agronomy, soil = [], [], [], []
+    for block_id in range(1, blocks + 1):
+        cut = today - timedelta(days=random.randint(30, 330))
+        meta.append((block_id, app_mod.BLOCK_NAMES[block_id - 1], cut, round(random.uniform(0.8, 1.25), 2),
+                     "N14", 120.0))
+        cum = 0.0
+        for w in range(app_mod.DEFAULT_ROWS):
+            scheduled = 35.0
+            actual = round(random.uniform(20, 40), 1)
+            eff = None if random.random() < 0.7 else round(random.uniform(0, 10), 1)
+            irrigation.append((block_id, w, f"Week {w + 1}", scheduled, actual, eff,
+                               round((actual + (eff or 0)) / scheduled * 100, 1), None))
+            gain = round(random.uniform(1, 4), 1)
+            cum += gain
+            agronomy.append((block_id, w, f"Week {w + 1}", 3.0, gain, round(cum, 1), None, None))
+        for d in random.sample(days[-120:], min(30, len(days))):
+            soil.append((block_id, d, round(random.uniform(0, 10), 1), round(random.uniform(0, 30), 1)))
+
+    ndvi = [(random.choice(days), random.randint(1, blocks), round(random.uniform(0.2, 0.9), 3))
+            for _ in range(records)]
+    pests = [(random.choice(days), random.randint(1, blocks), random.choice(("Eldana", "Thrips", "Smut")),
+              random.choice(("Low", "Medium", "High")), round(random.uniform(0, 5), 1), "")
+             for _ in range(records)]
+
+    with app_mod.db_cursor(commit=True) as cur:
+        app_mod.upsert_rows(cur, "weather", ("date", "tmax", "tmin", "rain", "et0"), weather,
+                            key_columns=("date",))
+        app_mod.upsert_rows(cur, "blocks_meta",
+                            ("block_id", "name", "cut_date", "kc", "variety", "sm_start_balance"), meta,
+                            key_columns=("block_id",))
+        app_mod.upsert_rows(cur, "irrigation_weeks",
+                            ("block_id", "week_index", "week_label", "scheduled", "actual", "eff_rain",
+                             "percent", "comment"), irrigation, key_columns=("block_id", "week_index"))
+        app_mod.upsert_rows(cur, "agronomy_weeks",
+                            ("block_id", "week_index", "week_label", "standard_gain", "gain", "cumulative",
+                             "fertigation", "chemigation"), agronomy, key_columns=("block_id", "week_index"))
+        app_mod.upsert_rows(cur, "soil_manual_entries", ("block_id", "date", "eff", "irr"), soil,
+                            key_columns=("block_id", "date"))
+        cur.executemany("INSERT INTO ndvi_records (date, block_id, ndvi, biomass) VALUES (%s,%s,%s,%s)",
+                        [(d, b, v, round(150.0 * v, 1)) for d, b, v in ndvi])
+        cur.executemany(
+            "INSERT INTO pests_records (date, block_id, pest, severity, area, action) VALUES (%s,%s,%s,%s,%s,%s)",
+            pests,
+        )
+    return {"weather_days": len(weather), "irrigation_weeks": len(irrigation), "soil_entries": len(soil),
+            "ndvi_records": len(ndvi), "pest_records": len(pests)}
+
+
+def stub_forecast():
+    """Fixed 7-day forecast so the dashboard never touches the network."""
+    payload = {"days": [
+        {"date": (date.today() + timedelta(days=i)).isoformat(),
+         "temperature": {"max": 30 + i}, "precipitation": {"value": i % 3}, "symbol": {"code": "partlycloudy"}}
+        for i in range(7)
+    ]}
+    forecast = app_mod.parse_forecast(payload)
+    app_mod.fetch_forecast = lambda: forecast
+
+
+# ---- measurement ----
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def measure(fn, repeat, warmup):
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000.0)
+    times.sort()
+
+    tracemalloc.start()
+    before_size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    snap_before = tracemalloc.take_snapshot()
+    fn()
+    snap_after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = snap_after.compare_to(snap_before, "filename")
+    return {
+        "runs": repeat,
+        "mean_ms": round(sum(times) / len(times), 3),
+        "min_ms": round(times[0], 3),
+        "p50_ms": round(percentile(times, 0.50), 3),
+        "p90_ms": round(percentile(times, 0.90), 3),
+        "p99_ms": round(percentile(times, 0.99), 3),
+        "max_ms": round(times[-1], 3),
+        "alloc_peak_bytes": peak - before_size,
+        "alloc_blocks": sum(max(s.count_diff, 0) for s in stats),
+    }
+
+
+def build_cases(client, today, blocks):
+    """name -> zero-argument callable; routes assert a 200."""
+    def get(url):
+        def run():
+            resp = client.get(url)
+            assert resp.status_code == 200, (url, resp.status_code)
+            resp.get_data()
+        return run
+
+    def cold(fn, *reset):
+        def run():
+            for r in reset:
+                r()
+            return fn()
+        return run
+
+    mid = blocks // 2 or 1
+    start = (today - timedelta(days=90)).isoformat()
+    clear_cache = app_mod.dashboard_cache._entries.clear
+    return {
+        "index_week": get("/?view=week"),
+        "index_season": get("/?view=season"),
+        "index_week_cold": cold(get("/?view=week"), clear_cache),
+        "index_season_cold": cold(get("/?view=season"), clear_cache),
+        "block_view": get(f"/block/{mid}"),
+        "agronomy_view": get(f"/agronomy/{mid}"),
+        "weather_page": get("/weather"),
+        "weather_page_90d": get(f"/weather?start_date={start}&end_date={today.isoformat()}"),
+        "download_weather": get("/download_weather"),
+        "compute_soil_balance": lambda: [app_mod.compute_soil_balance(b) for b in range(1, blocks + 1)],
+        "compute_soil_balance_cold": cold(
+            lambda: [app_mod.compute_soil_balance(b) for b in range(1, blocks + 1)],
+            app_mod.soil_engine.invalidate,
+        ),
+        "extract_irrigation_previous_week": lambda: app_mod.extract_irrigation_previous_week(today),
+        "season_total_mm": lambda: [app_mod.season_total_mm(b) for b in range(1, blocks + 1)],
+        "season_total_mm_cold": cold(
+            lambda: [app_mod.season_total_mm(b) for b in range(1, blocks + 1)],
+            lambda: app_mod.bump_version("blocks"),
+        ),
+    }
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(results, baseline):
+    print(f"\nAgainst baseline ({baseline.get('meta', {}).get('commit')}, p50):")
+    for name, r in results.items():
+        base = baseline.get("cases", {}).get(name)
+        if not base or not base.get("p50_ms"):
+            continue
+        ratio = r["p50_ms"] / base["p50_ms"]
+        r["baseline_p50_ms"] = base["p50_ms"]
+        r["baseline_ratio"] = round(ratio, 3)
+        print(f"  {name:<34} {base['p50_ms']:>9.3f} -> {r['p50_ms']:>9.3f} ms   x{ratio:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--blocks", type=int, default=41, help="blocks in the estate (default 41)")
+    parser.add_argument("--years", type=int, default=5, help="years of daily weather (default 5)")
+    parser.add_argument("--records", type=int, default=10000, help="NDVI and pest records each (default 10^4)")
+    parser.add_argument("--repeat", type=int, default=30, help="timed runs per case")
+    parser.add_argument("--warmup", type=int, default=3, help="untimed runs per case")
+    parser.add_argument("--only", nargs="+", help="run only cases whose name contains one of these")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="earlier --json output to compare against")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    today = date.today()
+
+    scale_blocks(args.blocks)
+    t0 = time.perf_counter()
+    sizes = seed_database(args.blocks, args.years, args.records, today)
+    seed_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    app_mod.preload_data(list(app_mod.SHARED_LOADERS))
+    load_s = time.perf_counter() - t0
+    stub_forecast()
+    print(f"Estate: {args.blocks} blocks, {sizes['weather_days']} weather days, "
+          f"{args.records} NDVI + {args.records} pest records "
+          f"(seeded in {seed_s:.1f} s, loaded in {load_s:.2f} s)\n")
+
+    client = app_mod.app.test_client()
+    results = {}
+    for name, fn in build_cases(client, today, args.blocks).items():
+        if args.only and not any(s in name for s in args.only):
+            continue
+        r = results[name] = measure(fn, args.repeat, args.warmup)
+        print(f"  {name:<34} p50 {r['p50_ms']:>9.3f}  p90 {r['p90_ms']:>9.3f}  p99 {r['p99_ms']:>9.3f} ms"
+              f"   alloc {r['alloc_peak_bytes'] / 1024:>9.1f} KiB / {r['alloc_blocks']} blocks")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+    output = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().replace(microsecond=0).isoformat(),
+            "python": platform.python_version(),
+            "backend": app_mod.dialect.name,
+            "blocks": args.blocks,
+            "years": args.years,
+            "records": args.records,
+            "repeat": args.repeat,
+            "seed_seconds": round(seed_s, 3),
+            "load_seconds": round(load_s, 3),
+            **sizes,
+        },
+        "cases": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2, sort_keys=True)
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# Gunicorn settings for the GreenFuel Agric Monitor (read by the Procfile).
+#
+# The TV wall keeps a Server-Sent Events stream open per screen
+# (/api/v1/events). With the default sync worker every open stream would
+# pin a whole worker, so gevent is used when it is installed: idle streams
+# then cost one greenlet each. Override with GUNICORN_WORKER_CLASS
+# (sync / gthread / gevent) if needed. Under gevent the MySQL driver runs
+# in pure-Python mode (use_pure) so queries yield to other greenlets.
+import os
+
+
+def _default_worker_class():
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        return "gthread"
+    return "gevent"
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", _default_worker_class())
+
+# gthread fallback: each open stream holds one thread. Shared in-memory data
+# is guarded by per-domain reader/writer locks (state_locks in app_fixed2).
+# Threads share the DB_POOL_SIZE connections per worker. The one used for the
+# per-request version check goes back at once, so waiting streams and long
+# polls hold none and the pool can stay well below this.
+threads = int(os.getenv("GUNICORN_THREADS", 32))
+# gevent: greenlets per worker
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 1000))
+
+# Streams end themselves after SSE_MAX_SECONDS; keep the worker timeout above
+# the heartbeat so a quiet stream is never mistaken for a hung worker.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+keepalive = 5
+
+
+def post_worker_init(worker):
+    # Runs in each worker once the app is imported (after gevent patching) and
+    # before it accepts requests: load the boot domains in parallel so the
+    # first request doesn't pay for them. Schema migrations run in the release
+    # phase (see Procfile); the worker only checks the version.
+    from app_fixed2 import preload_data
+    preload_data()
@@ -0,0 +1,80 @@
+-- Tables as created by the original init_db(). IF NOT EXISTS lets
+-- databases created before migrations adopt this file unchanged.
+
+CREATE TABLE IF NOT EXISTS weather (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    date DATE NOT NULL UNIQUE,
+    tmax DOUBLE NULL,
+    tmin DOUBLE NULL,
+    rain DOUBLE NULL,
+    et0 DOUBLE NULL
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    username VARCHAR(50) NOT NULL UNIQUE,
+    password_hash VARCHAR(255) NOT NULL,
+    role VARCHAR(20) NOT NULL DEFAULT 'user'
+);
+
+CREATE TABLE IF NOT EXISTS blocks_meta (
+    block_id INT PRIMARY KEY,
+    name  VARCHAR(50) NOT NULL,
+    cut_date DATE NULL,
+    kc DOUBLE NULL,
+    variety VARCHAR(50) NULL,
+    sm_start_balance DOUBLE NULL
+);
+
+CREATE TABLE IF NOT EXISTS irrigation_weeks (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    block_id INT NOT NULL,
+    week_index INT NOT NULL,
+    week_label VARCHAR(100),
+    scheduled DOUBLE NULL,
+    actual DOUBLE NULL,
+    eff_rain DOUBLE NULL,
+    percent DOUBLE NULL,
+    comment TEXT,
+    UNIQUE KEY uniq_block_week (block_id, week_index)
+);
+
+CREATE TABLE IF NOT EXISTS soil_manual_entries (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    block_id INT NOT NULL,
+    date DATE NOT NULL,
+    eff DOUBLE NULL,
+    irr DOUBLE NULL,
+    UNIQUE KEY uniq_block_date (block_id, date)
+);
+
+-- standard_gain is added by 0002 so old databases get it too
+CREATE TABLE IF NOT EXISTS agronomy_weeks (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    block_id INT NOT NULL,
+    week_index INT NOT NULL,
+    week_label VARCHAR(100),
+    gain DOUBLE NULL,
+    cumulative DOUBLE NULL,
+    fertigation VARCHAR(100),
+    chemigation VARCHAR(100),
+    UNIQUE KEY uniq_agro_block_week (block_id, week_index)
+);
+
+CREATE TABLE IF NOT EXISTS ndvi_records (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    date DATE NOT NULL,
+    block_id INT NOT NULL,
+    ndvi DOUBLE NOT NULL,
+    biomass DOUBLE NULL
+);
+
+CREATE TABLE IF NOT EXISTS pests_records (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    date DATE NOT NULL,
+    block_id INT NOT NULL,
+    pest VARCHAR(100) NOT NULL,
+    severity VARCHAR(20),
+    area DOUBLE NULL,
+    action TEXT
+);
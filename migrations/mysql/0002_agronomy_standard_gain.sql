@@ -0,0 +1,2 @@
+-- Weekly standard (target) cane gain next to the measured gain
+ALTER TABLE agronomy_weeks ADD COLUMN standard_gain DOUBLE NULL AFTER week_label;
@@ -0,0 +1,10 @@
+-- Shared per-domain versions: every save bumps its domain so the other
+-- gunicorn workers know which in-memory data to reload.
+CREATE TABLE IF NOT EXISTS data_versions (
+    domain VARCHAR(32) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT IGNORE INTO data_versions (domain, version) VALUES
+    ('weather', 0), ('blocks', 0), ('agronomy', 0), ('block_meta', 0),
+    ('soil_manual', 0), ('ndvi', 0), ('pests', 0);
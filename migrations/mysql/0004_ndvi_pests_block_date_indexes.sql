@@ -0,0 +1,3 @@
+-- Per-block history lookups on the NDVI and pest tables
+CREATE INDEX idx_ndvi_block_date ON ndvi_records (block_id, date);
+CREATE INDEX idx_pests_block_date ON pests_records (block_id, date);
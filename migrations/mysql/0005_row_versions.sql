@@ -0,0 +1,6 @@
+-- Optimistic concurrency for the row API: every write to these rows bumps
+-- row_version; PATCH/DELETE only apply when the caller's version matches.
+ALTER TABLE weather ADD COLUMN row_version INT NOT NULL DEFAULT 1;
+ALTER TABLE irrigation_weeks ADD COLUMN row_version INT NOT NULL DEFAULT 1;
+ALTER TABLE soil_manual_entries ADD COLUMN row_version INT NOT NULL DEFAULT 1;
+ALTER TABLE pests_records ADD COLUMN row_version INT NOT NULL DEFAULT 1;
@@ -0,0 +1,48 @@
+-- Past seasons (ratoons) of each block, keyed by the cut date that started
+-- them. Rolling a block over copies its 52 active weeks here and clears
+-- irrigation_weeks / agronomy_weeks for the new season. The primary keys
+-- lead with (block_id, cut_date), so InnoDB stores each season's weeks
+-- together and reading one back is a single range scan.
+CREATE TABLE IF NOT EXISTS seasons (
+    block_id INT NOT NULL,
+    cut_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    ratoon INT NOT NULL,
+    variety VARCHAR(50) NULL,
+    kc DOUBLE NULL,
+    total_mm DOUBLE NULL,
+    archived_at DATETIME NOT NULL,
+    PRIMARY KEY (block_id, cut_date)
+);
+
+CREATE TABLE IF NOT EXISTS irrigation_weeks_archive (
+    block_id INT NOT NULL,
+    cut_date DATE NOT NULL,
+    week_index INT NOT NULL,
+    week_label VARCHAR(100),
+    scheduled DOUBLE NULL,
+    actual DOUBLE NULL,
+    eff_rain DOUBLE NULL,
+    percent DOUBLE NULL,
+    comment TEXT,
+    PRIMARY KEY (block_id, cut_date, week_index)
+);
+
+CREATE TABLE IF NOT EXISTS agronomy_weeks_archive (
+    block_id INT NOT NULL,
+    cut_date DATE NOT NULL,
+    week_index INT NOT NULL,
+    week_label VARCHAR(100),
+    standard_gain DOUBLE NULL,
+    gain DOUBLE NULL,
+    cumulative DOUBLE NULL,
+    fertigation VARCHAR(100),
+    chemigation VARCHAR(100),
+    PRIMARY KEY (block_id, cut_date, week_index)
+);
+
+-- Workers load only the active seasons' days (date >= the earliest cut
+-- date); older days are read by date range when a page asks for them.
+CREATE INDEX idx_ndvi_date ON ndvi_records (date);
+CREATE INDEX idx_pests_date ON pests_records (date);
+CREATE INDEX idx_soil_manual_date ON soil_manual_entries (date);
@@ -0,0 +1,79 @@
+-- Same tables as mysql/0001 for a local SQLite file. DATE columns are
+-- declared DATE so they come back as date objects.
+
+CREATE TABLE IF NOT EXISTS weather (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date DATE NOT NULL UNIQUE,
+    tmax DOUBLE NULL,
+    tmin DOUBLE NULL,
+    rain DOUBLE NULL,
+    et0 DOUBLE NULL
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(50) NOT NULL UNIQUE,
+    password_hash VARCHAR(255) NOT NULL,
+    role VARCHAR(20) NOT NULL DEFAULT 'user'
+);
+
+CREATE TABLE IF NOT EXISTS blocks_meta (
+    block_id INTEGER PRIMARY KEY,
+    name  VARCHAR(50) NOT NULL,
+    cut_date DATE NULL,
+    kc DOUBLE NULL,
+    variety VARCHAR(50) NULL,
+    sm_start_balance DOUBLE NULL
+);
+
+CREATE TABLE IF NOT EXISTS irrigation_weeks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    block_id INTEGER NOT NULL,
+    week_index INTEGER NOT NULL,
+    week_label VARCHAR(100),
+    scheduled DOUBLE NULL,
+    actual DOUBLE NULL,
+    eff_rain DOUBLE NULL,
+    percent DOUBLE NULL,
+    comment TEXT,
+    UNIQUE (block_id, week_index)
+);
+
+CREATE TABLE IF NOT EXISTS soil_manual_entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    block_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+    eff DOUBLE NULL,
+    irr DOUBLE NULL,
+    UNIQUE (block_id, date)
+);
+
+CREATE TABLE IF NOT EXISTS agronomy_weeks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    block_id INTEGER NOT NULL,
+    week_index INTEGER NOT NULL,
+    week_label VARCHAR(100),
+    gain DOUBLE NULL,
+    cumulative DOUBLE NULL,
+    fertigation VARCHAR(100),
+    chemigation VARCHAR(100),
+    UNIQUE (block_id, week_index)
+);
+
+CREATE TABLE IF NOT EXISTS ndvi_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date DATE NOT NULL,
+    block_id INTEGER NOT NULL,
+    ndvi DOUBLE NOT NULL,
+    biomass DOUBLE NULL
+);
+
+CREATE TABLE IF NOT EXISTS pests_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date DATE NOT NULL,
+    block_id INTEGER NOT NULL,
+    pest VARCHAR(100) NOT NULL,
+    severity VARCHAR(20),
+    area DOUBLE NULL,
+    action TEXT
+);
@@ -0,0 +1,9 @@
+-- Shared per-domain versions (see mysql/0003)
+CREATE TABLE IF NOT EXISTS data_versions (
+    domain VARCHAR(32) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO data_versions (domain, version) VALUES
+    ('weather', 0), ('blocks', 0), ('agronomy', 0), ('block_meta', 0),
+    ('soil_manual', 0), ('ndvi', 0), ('pests', 0);
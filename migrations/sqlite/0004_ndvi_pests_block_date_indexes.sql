@@ -0,0 +1,3 @@
+-- Per-block history lookups on the NDVI and pest tables
+CREATE INDEX IF NOT EXISTS idx_ndvi_block_date ON ndvi_records (block_id, date);
+CREATE INDEX IF NOT EXISTS idx_pests_block_date ON pests_records (block_id, date);
@@ -0,0 +1,5 @@
+-- Same as mysql/0005: per-row versions for the row API.
+ALTER TABLE weather ADD COLUMN row_version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE irrigation_weeks ADD COLUMN row_version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE soil_manual_entries ADD COLUMN row_version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE pests_records ADD COLUMN row_version INTEGER NOT NULL DEFAULT 1;
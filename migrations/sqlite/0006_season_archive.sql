@@ -0,0 +1,42 @@
+-- Season archive tables and date indexes (see mysql/0006)
+CREATE TABLE IF NOT EXISTS seasons (
+    block_id INTEGER NOT NULL,
+    cut_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    ratoon INTEGER NOT NULL,
+    variety VARCHAR(50) NULL,
+    kc DOUBLE NULL,
+    total_mm DOUBLE NULL,
+    archived_at DATETIME NOT NULL,
+    PRIMARY KEY (block_id, cut_date)
+);
+
+CREATE TABLE IF NOT EXISTS irrigation_weeks_archive (
+    block_id INTEGER NOT NULL,
+    cut_date DATE NOT NULL,
+    week_index INTEGER NOT NULL,
+    week_label VARCHAR(100),
+    scheduled DOUBLE NULL,
+    actual DOUBLE NULL,
+    eff_rain DOUBLE NULL,
+    percent DOUBLE NULL,
+    comment TEXT,
+    PRIMARY KEY (block_id, cut_date, week_index)
+);
+
+CREATE TABLE IF NOT EXISTS agronomy_weeks_archive (
+    block_id INTEGER NOT NULL,
+    cut_date DATE NOT NULL,
+    week_index INTEGER NOT NULL,
+    week_label VARCHAR(100),
+    standard_gain DOUBLE NULL,
+    gain DOUBLE NULL,
+    cumulative DOUBLE NULL,
+    fertigation VARCHAR(100),
+    chemigation VARCHAR(100),
+    PRIMARY KEY (block_id, cut_date, week_index)
+);
+
+CREATE INDEX IF NOT EXISTS idx_ndvi_date ON ndvi_records (date);
+CREATE INDEX IF NOT EXISTS idx_pests_date ON pests_records (date);
+CREATE INDEX IF NOT EXISTS idx_soil_manual_date ON soil_manual_entries (date);